@@ -0,0 +1,32 @@
+"""
+Benchmarks of the application hot paths.
+
+Run them from the directory containing `manage.py`, e.g.:
+```
+python -m benchmarks.email_batch
+```
+"""
+import os
+
+
+def setup_django(**environment):
+    """
+    Configure Django for a standalone benchmark script.
+
+    Parameters:
+    - `environment` (dict): Environment variables to set before the settings are loaded.
+    """
+    import django
+
+    defaults = {
+        "DJANGO_SETTINGS_MODULE": "ecommerceapp.settings",
+        "EMAIL_HOST": "localhost",
+        "EMAIL_PORT": "25",
+        "EMAIL_HOST_USER": "benchmark@example.com",
+        "EMAIL_HOST_PASSWORD": "",
+        "DEFAULT_FROM_EMAIL": "benchmark@example.com",
+    }
+    defaults.update(environment)
+    for name, value in defaults.items():
+        os.environ.setdefault(name, str(value))
+    django.setup()
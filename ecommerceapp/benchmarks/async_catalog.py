@@ -0,0 +1,186 @@
+"""
+Compare the sync catalog views served over WSGI with the async views of
+`shop.async_views` served over ASGI under many concurrent connections.
+
+Both servers are started with gunicorn, the WSGI one with a pool of threads
+(`gthread` worker) and the ASGI one with the uvicorn worker. Every request asks
+for a random product or a random search page, through the same URL path with
+or without the `/async` prefix. The response cache is disabled so every
+request reaches the database; seed it first, e.g. with
+`python manage.py seed_shop --products 20000 --orders 0`.
+
+Usage:
+```
+python -m benchmarks.async_catalog --concurrency 200 --requests 5000
+```
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from benchmarks import setup_django
+
+SERVERS = {
+    "wsgi": (
+        "ecommerceapp.wsgi:application",
+        ["--worker-class", "gthread", "--threads", "{threads}"],
+        "",
+    ),
+    "asgi": (
+        "ecommerceapp.asgi:application",
+        ["--worker-class", "uvicorn.workers.UvicornWorker"],
+        "/async",
+    ),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name, port, arguments, environment):
+    application, options, _ = SERVERS[name]
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        application,
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--workers",
+        str(arguments.workers),
+        "--log-level",
+        "warning",
+        *[option.format(threads=arguments.threads) for option in options],
+    ]
+    server = subprocess.Popen(command, env=environment)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"The {name} server did not start.")
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(response.split(b" ", 2)[1])
+
+
+async def run_load(port, paths, concurrency):
+    """
+    Request every path with `concurrency` connections open at a time.
+
+    Returns:
+    - `Tuple[float, List[float], int]`: Wall time, latencies and number of errors.
+    """
+    queue = list(reversed(paths))
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        while queue:
+            path = queue.pop()
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, path)
+            except OSError:
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            errors += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def request_paths(count, seed):
+    from shop.models import Product
+
+    rng = random.Random(seed)
+    pks = list(Product.objects.values_list("pk", flat=True))
+    # adjective and noun of the seeded names, matching a few dozen products
+    searches = sorted(
+        {
+            "+".join(name.split()[:2])
+            for name in Product.objects.values_list("name", flat=True)
+        }
+    )
+    if not pks:
+        raise SystemExit("The database has no products, run seed_shop first.")
+
+    paths = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            paths.append(f"/product/{rng.choice(pks)}/")
+        else:
+            paths.append(f"/products/?search={rng.choice(searches)}&page_size=20")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--threads", type=int, default=8, help="Threads of every WSGI worker."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    setup_django()
+    paths = request_paths(arguments.requests, arguments.seed)
+    environment = {
+        **os.environ,
+        "CACHE_BACKEND": "django.core.cache.backends.dummy.DummyCache",
+        "REQUEST_INSTRUMENTATION": "False",
+    }
+
+    print(
+        f"requests: {arguments.requests}, concurrency: {arguments.concurrency}, "
+        f"workers: {arguments.workers}, WSGI threads: {arguments.threads}",
+        flush=True,
+    )
+    for name, (_, _, prefix) in SERVERS.items():
+        port = free_port()
+        server = start_server(name, port, arguments, environment)
+        try:
+            # warm up connections and imports
+            asyncio.run(run_load(port, [prefix + path for path in paths[:50]], 10))
+            elapsed, latencies, errors = asyncio.run(
+                run_load(port, [prefix + path for path in paths], arguments.concurrency)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(
+            f"{name}: {len(latencies) / elapsed:8.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+            f"p99 {p99 * 1000:7.1f} ms, {errors} errors",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compare sending emails one connection per message (`send_mail`) with the batched
+delivery over one pooled connection (`common.mail.send_batch`).
+
+A local `aiosmtpd` server stands in for the SMTP relay. An optional delay per
+new connection simulates the TCP and TLS handshake cost of a real relay.
+
+Usage:
+```
+python -m benchmarks.email_batch --messages 500 --handshake-ms 20
+```
+"""
+import argparse
+import socket
+import time
+from benchmarks import setup_django
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument(
+        "--handshake-ms",
+        type=float,
+        default=0,
+        help="Simulated cost of opening a connection, in milliseconds.",
+    )
+    arguments = parser.parse_args()
+
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import SMTP
+    except ImportError:
+        parser.exit(1, "This benchmark requires aiosmtpd: pip install aiosmtpd\n")
+
+    port = free_port()
+    setup_django(EMAIL_HOST="127.0.0.1", EMAIL_PORT=port, EMAIL_USE_TLS="False")
+
+    from django.conf import settings
+    from django.core.mail import send_mail
+    from common.mail import send_batch
+
+    settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_USER = ""
+
+    class Handler:
+        received = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            Handler.received += 1
+            return "250 OK"
+
+    class SlowHandshakeSMTP(SMTP):
+        async def _handle_client(self):
+            if arguments.handshake_ms:
+                time.sleep(arguments.handshake_ms / 1000)
+            return await super()._handle_client()
+
+    class SlowHandshakeController(Controller):
+        def factory(self):
+            return SlowHandshakeSMTP(self.handler)
+
+    controller = SlowHandshakeController(Handler(), hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        messages = [
+            {
+                "subject": "Order Confirmation",
+                "plain_message": "Thank you for your order.",
+                "from_email": "shop@example.com",
+                "to_email": [f"customer{index}@example.com"],
+                "html_message": "<p>Thank you for your order.</p>",
+            }
+            for index in range(arguments.messages)
+        ]
+
+        start = time.perf_counter()
+        for message in messages:
+            send_mail(
+                message["subject"],
+                message["plain_message"],
+                message["from_email"],
+                message["to_email"],
+                html_message=message["html_message"],
+            )
+        per_message = time.perf_counter() - start
+
+        start = time.perf_counter()
+        failed = send_batch(messages)
+        batched = time.perf_counter() - start
+    finally:
+        controller.stop()
+
+    print(f"messages:              {arguments.messages}")
+    print(f"received by server:    {Handler.received}")
+    print(f"send_mail per message: {per_message:.3f}s")
+    print(f"send_batch:            {batched:.3f}s ({len(failed)} failed)")
+    print(f"speedup:               {per_message / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare the JSON renderers of the API and the size of their output compressed
+with the encodings of `common.compression`.
+
+Pages of the catalog endpoints are serialized once, like the views do, then
+rendered with `InstrumentedJSONRenderer` (the `json` module) and
+`ORJSONRenderer` (orjson), and compressed with every available encoding.
+Seed the database first, e.g. with `python manage.py seed_shop`.
+
+Usage:
+```
+python -m benchmarks.json_rendering --page-size 100 --repeat 200
+```
+"""
+import argparse
+import time
+from benchmarks import setup_django
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    arguments = parser.parse_args()
+
+    setup_django()
+    from common.compression import COMPRESSORS
+    from common.renderers import InstrumentedJSONRenderer, ORJSONRenderer
+    from shop.models import Order, Product
+    from shop.serializers import OrderListSerializer, ProductSerializer
+
+    def page(results):
+        return {
+            "next": "http://testserver/product/list/?cursor=cD0x",
+            "previous": None,
+            "results": results,
+        }
+
+    products = Product.objects.select_related("category").order_by("pk")
+    orders = Order.objects.prefetch_related("products").order_by("-pk")
+    size = arguments.page_size
+    pages = {
+        "product-list": page(
+            ProductSerializer(
+                products[:size], many=True, fields=ProductSerializer.list_fields
+            ).data
+        ),
+        "product-list fields=*": page(
+            ProductSerializer(products[:size], many=True).data
+        ),
+        "order-list": page(OrderListSerializer(orders[:size], many=True).data),
+    }
+    renderers = {
+        "json": InstrumentedJSONRenderer(),
+        "orjson": ORJSONRenderer(),
+    }
+
+    print(f"{size} objects per page, times per page")
+    for name, data in pages.items():
+        print(f"\n{name}")
+        rendered = {}
+        for label, renderer in renderers.items():
+            duration, rendered[label] = timed(
+                lambda: renderer.render(data), arguments.repeat
+            )
+            print(f"  render {label:<8} {duration * 1000:8.3f}ms")
+        content = rendered["orjson"]
+        print(f"  identical output  {rendered['json'] == content}")
+        print(f"  {'identity':<15} {len(content):8d} bytes")
+        for encoding, compress in COMPRESSORS.items():
+            duration, compressed = timed(lambda: compress(content), arguments.repeat)
+            ratio = len(content) / len(compressed)
+            print(
+                f"  {encoding:<15} {len(compressed):8d} bytes"
+                f" ({ratio:4.1f}x) in {duration * 1000:.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Place many orders of the same product in parallel and check that its stock is
+never oversold.
+
+Every thread places single-unit orders through `OrderService.create_order`
+until the product is sold out, retrying when the database is locked. The
+benchmark runs against the configured database with a throwaway customer and
+product, which are deleted again at the end together with their orders.
+
+Usage:
+```
+python -m benchmarks.stock_contention --threads 16 --stock 500 --shards 8
+```
+"""
+import argparse
+import threading
+import time
+from benchmarks import setup_django
+
+
+def place_orders(customer, product, counts):
+    from django.db import OperationalError, connection
+    from rest_framework.exceptions import ValidationError
+    from shop.services import OrderService
+
+    lines = [{"product": product.pk, "quantity": 1}]
+    try:
+        while True:
+            try:
+                OrderService.create_order(customer, "address", lines)
+            except ValidationError:
+                return
+            except OperationalError:
+                # SQLite refuses to upgrade a read transaction while another
+                # connection writes, instead of waiting for the lock
+                counts["retries"] += 1
+                time.sleep(0.001)
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument(
+        "--shards", type=int, default=0, help="Stock shards of the product."
+    )
+    arguments = parser.parse_args()
+
+    setup_django()
+    from shop.inventory import Inventory
+    from shop.models import Order, Product, ProductCategory
+    from users.models import UserRole
+
+    customer = UserRole.objects.create_user(
+        username=f"stock-benchmark-{time.time_ns()}", role="customer"
+    )
+    category = ProductCategory.objects.create(name="Stock benchmark")
+    product = Product.objects.create(
+        name="Stock benchmark", description="", price="1.00", category=category
+    )
+    try:
+        Inventory.set_stock(product, arguments.stock, shards=arguments.shards)
+        counts = {"retries": 0}
+        threads = [
+            threading.Thread(target=place_orders, args=(customer, product, counts))
+            for _ in range(arguments.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        orders = Order.objects.filter(customer=customer).count()
+        left = Inventory.available(product)
+        print(
+            f"threads: {arguments.threads}, stock: {arguments.stock}, "
+            f"shards: {arguments.shards}\n"
+            f"{orders} orders in {elapsed:.2f} s ({orders / elapsed:.1f} orders/s), "
+            f"{counts['retries']} retries, {left} units left"
+        )
+        if orders != arguments.stock or left != 0:
+            raise SystemExit("Oversold or undersold stock.")
+    finally:
+        Order.objects.filter(customer=customer).delete()
+        category.delete()
+        customer.delete()
+
+
+if __name__ == "__main__":
+    main()
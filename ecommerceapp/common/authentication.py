@@ -0,0 +1,119 @@
+"""
+JWT authentication classes.
+
+`StatelessJWTCookieAuthentication` is the default authentication of the API,
+the async views of `shop.async_views` use its `aauthenticate` coroutine.
+"""
+from dj_rest_auth.app_settings import api_settings
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from users.tokens import TOKEN_VERSION_CLAIM, TokenUserRole, TokenVersions
+
+
+class AsyncJWTCookieAuthentication(JWTCookieAuthentication):
+    """
+    `JWTCookieAuthentication` with an `aauthenticate` coroutine.
+
+    Reading and validating the token only uses the CPU, the user is loaded
+    with the async ORM, so no thread is blocked while the database answers.
+    """
+
+    def get_request_token(self, request):
+        """
+        Return the validated token of the header or cookie, or None without a token.
+        """
+        cookie_name = api_settings.JWT_AUTH_COOKIE
+        header = self.get_header(request)
+        if header is None:
+            if not cookie_name:
+                return None
+            raw_token = request.COOKIES.get(cookie_name)
+            if api_settings.JWT_AUTH_COOKIE_ENFORCE_CSRF_ON_UNAUTHENTICATED:
+                self.enforce_csrf(request)
+            elif raw_token is not None and api_settings.JWT_AUTH_COOKIE_USE_CSRF:
+                self.enforce_csrf(request)
+        else:
+            raw_token = self.get_raw_token(header)
+
+        if raw_token is None:
+            return None
+        return self.get_validated_token(raw_token)
+
+    def authenticate(self, request):
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        return self.get_user(validated_token), validated_token
+
+    async def aauthenticate(self, request):
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        """
+        Async variant of `get_user`, with the same checks.
+        """
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = await self.user_model.objects.aget(
+                **{jwt_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                jwt_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class StatelessJWTCookieAuthentication(AsyncJWTCookieAuthentication):
+    """
+    Authenticate role tokens (see `users.tokens`) without loading the user.
+
+    The user is a `TokenUserRole` answering permission checks from the token
+    claims. The only lookup is the current token version of the user, served
+    from the cache, which rejects tokens revoked by a version bump. Tokens
+    issued without the role claims are authenticated by loading the user.
+    """
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user = TokenUserRole(validated_token)
+        self.check_token_version(validated_token, TokenVersions.get(user.pk))
+        return user
+
+    async def aget_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return await super().aget_user(validated_token)
+        user = TokenUserRole(validated_token)
+        self.check_token_version(validated_token, await TokenVersions.aget(user.pk))
+        return user
+
+    @staticmethod
+    def check_token_version(validated_token, current_version):
+        if current_version is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if validated_token[TOKEN_VERSION_CLAIM] != current_version:
+            raise AuthenticationFailed(
+                _("The token has been revoked."), code="token_revoked"
+            )
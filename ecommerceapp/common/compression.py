@@ -0,0 +1,152 @@
+"""
+Negotiated compression of responses.
+
+`CompressionMiddleware` compresses responses with the best encoding accepted by
+the client (`Accept-Encoding`) among `COMPRESSION_ENCODINGS`, in the order of
+that setting when the client accepts several equally. gzip is always
+available, Brotli (`br`) and Zstandard (`zstd`) when the `brotli` and
+`zstandard` packages are installed. Responses smaller than
+`COMPRESSION_MIN_SIZE` bytes, already encoded, streamed or of another type
+than the JSON, JSON Lines and CSV of the API are sent as they are. HTML is
+never compressed: its CSRF tokens would be open to BREACH, which guesses a
+secret from the compressed size of responses reflecting attacker input.
+
+The levels favour speed, the responses are compressed on every request:
+gzip 6, Brotli quality 5 and Zstandard level 3.
+"""
+import gzip
+import re
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from .instrumentation import span
+
+COMPRESSORS = {"gzip": lambda data: gzip.compress(data, compresslevel=6, mtime=0)}
+
+try:
+    import brotli
+except ImportError:
+    pass
+else:
+    COMPRESSORS["br"] = lambda data: brotli.compress(data, quality=5)
+
+try:
+    import zstandard
+except ImportError:
+    pass
+else:
+    COMPRESSORS["zstd"] = lambda data: zstandard.compress(data, level=3)
+
+# media types of the API responses, not HTML (admin and account pages)
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+}
+
+_q_value = re.compile(r"^\s*q\s*=\s*([0-9.]+)\s*$")
+
+
+def media_type(content_type):
+    """
+    Return the lower case media type of a `Content-Type` header, without parameters.
+    """
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def parse_accept_encoding(header):
+    """
+    Return the quality values of the encodings of an `Accept-Encoding` header.
+
+    Parameters:
+    - `header` (str): E.g. `gzip;q=0.8, br, *;q=0.1`.
+
+    Returns:
+    - `Dict[str, float]`: Quality values by lower case encoding name.
+    """
+    qualities = {}
+    for item in header.split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            match = _q_value.match(param)
+            if match:
+                try:
+                    quality = float(match[1])
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def choose_encoding(header, encodings):
+    """
+    Return the encoding to compress with, None when the client accepts none.
+
+    Parameters:
+    - `header` (str): The `Accept-Encoding` header.
+    - `encodings` (List[str]): Available encodings, most preferred first.
+    """
+    qualities = parse_accept_encoding(header)
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with gzip, Brotli or Zstandard, negotiated with `Accept-Encoding`.
+
+    Settings:
+    - `COMPRESSION_ENCODINGS` (List[str]): Encodings to use, most preferred first.
+      Encodings whose package is not installed are skipped.
+    - `COMPRESSION_MIN_SIZE` (int): Smaller responses are not compressed.
+
+    The compression is timed as the `compress` span of `common.instrumentation`.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.encodings = [
+            encoding
+            for encoding in settings.COMPRESSION_ENCODINGS
+            if encoding in COMPRESSORS
+        ]
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < self.min_size
+            or media_type(response.get("Content-Type", "")) not in COMPRESSIBLE_TYPES
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(
+            request.META.get("HTTP_ACCEPT_ENCODING", ""), self.encodings
+        )
+        if encoding is None:
+            return response
+
+        with span("compress"):
+            compressed = COMPRESSORS[encoding](response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # the compressed bytes differ from the ones a strong ETag was made for
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
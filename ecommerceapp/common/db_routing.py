@@ -0,0 +1,190 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the `default` (primary) database. Reads go to one of the
+`DATABASE_REPLICAS` aliases only while a view using `ReplicaReadMixin` handles
+a request, so background tasks and read-after-write code paths keep reading
+from the primary. Reads also stay on the primary:
+
+- inside a transaction on the primary,
+- after the current request has written anything,
+- for `REPLICA_LAG_PIN_SECONDS` after a user's last write, so users see their
+  own writes even when the replicas lag behind (the pin is stored in the cache,
+  which is shared by all processes when it is Redis).
+
+Data read from a replica may be up to `REPLICA_LAG_PIN_SECONDS` old, caches
+filled by such reads must account for it (see `shop.cache.CatalogCache`).
+"""
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@dataclass
+class RoutingState:
+    """
+    Routing decisions of the current request.
+    """
+
+    replica: Optional[str] = None
+    wrote: bool = False
+
+
+_routing_state: ContextVar[Optional[RoutingState]] = ContextVar(
+    "routing_state", default=None
+)
+
+
+def pin_key(user_id):
+    return f"db-primary-pin:{user_id}"
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and cache.get(pin_key(user.pk)) is not None
+
+
+def pin_to_primary(user):
+    """
+    Send the reads of a user to the primary for `REPLICA_LAG_PIN_SECONDS`.
+    """
+    if user.is_authenticated:
+        cache.set(pin_key(user.pk), True, settings.REPLICA_LAG_PIN_SECONDS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router sending writes to the primary and eligible reads to a replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Track the writes of every request and pin users who wrote to the primary.
+
+    It supports both WSGI and ASGI requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = RoutingState()
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+        # DRF sets the user authenticated by the view on the Django request.
+        user = getattr(request, "user", None)
+        if state.wrote and user is not None:
+            pin_to_primary(user)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+        user = getattr(request, "user", None)
+        if state.wrote and user is not None:
+            await sync_to_async(pin_to_primary)(user)
+        return response
+
+
+async def ais_pinned_to_primary(user):
+    return user.is_authenticated and await cache.aget(pin_key(user.pk)) is not None
+
+
+def replica_candidates():
+    """
+    Return the replicas the current request may read from, if any.
+    """
+    if _routing_state.get() is None:
+        return []
+    return settings.DATABASE_REPLICAS
+
+
+def read_from_replica(replicas):
+    _routing_state.get().replica = random.choice(replicas)
+
+
+def reads_from_replica():
+    """
+    Check whether the reads of the current request go to a replica.
+    """
+    state = _routing_state.get()
+    return state is not None and state.replica is not None and not state.wrote
+
+
+class ReplicaReadMixin:
+    """
+    Let a DRF view read from a replica.
+
+    Only requests with a method in `replica_methods` are routed, and only when
+    the user is not pinned to the primary after a recent write.
+    """
+
+    replica_methods = ("GET", "HEAD", "OPTIONS")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        replicas = replica_candidates()
+        if (
+            replicas
+            and request.method in self.replica_methods
+            and not is_pinned_to_primary(request.user)
+        ):
+            read_from_replica(replicas)
+
+
+class AsyncReplicaReadMixin:
+    """
+    `ReplicaReadMixin` for the async views of `shop.async_views`.
+    """
+
+    replica_methods = ReplicaReadMixin.replica_methods
+
+    async def initial(self, request, *args, **kwargs):
+        await super().initial(request, *args, **kwargs)
+        replicas = replica_candidates()
+        if (
+            replicas
+            and request.method in self.replica_methods
+            and not await ais_pinned_to_primary(request.user)
+        ):
+            read_from_replica(replicas)
@@ -1,56 +1,80 @@
-from django.conf import settings
+from django.db import transaction
 from shop.models import Order
-from shop.tasks import send_email_task
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.utils import timezone
+from shop.reminders import PaymentReminderScheduler
+from shop.tasks import send_order_emails_task
+from .instrumentation import span
 
 
 class EmailHandler:
-    from_email = settings.EMAIL_HOST_USER
+    """
+    Schedule emails about orders.
+
+    Only the order id and the template key are sent to the Celery worker, which
+    renders and sends the email (see `shop.tasks.send_order_emails_task`).
+    Payment reminders are stored in the database until they are due (see
+    `shop.reminders.PaymentReminderScheduler`).
+    """
 
     @classmethod
-    def send_confirmation_email(cls, to_email: list, order: Order):
+    def send_confirmation_email(cls, order: Order):
         """
-        Send an order confirmation email to the user using Celery task.
+        Send an order confirmation email to the customer using Celery task.
 
         Parameters:
         - `order` (Order): The order instance.
-        - `to_email` (str): The email address of the recipient
 
         Returns:
         - None
         """
-        subject = "Order Confirmation"
-        html_message = render_to_string("confirmation_email.html", {"order": order})
-        plain_message = strip_tags(html_message)
+        cls.send_confirmation_emails([order])
+
+    @classmethod
+    def send_confirmation_emails(cls, orders: list):
+        """
+        Send confirmation emails of many orders using a single Celery task,
+        enqueued when the current transaction commits.
+
+        Parameters:
+        - `orders` (List[Order]): The order instances.
+
+        Returns:
+        - None
+        """
+        emails = [(order.id, "confirmation") for order in orders]
 
-        send_email_task.delay(
-            subject,
-            plain_message,
-            cls.from_email,
-            [to_email],
-            html_message=html_message,
-        )
+        def enqueue():
+            with span("email"):
+                send_order_emails_task.delay(emails)
+
+        # enqueued once the orders are committed, so the worker finds them
+        transaction.on_commit(enqueue)
 
     @classmethod
-    def send_payment_reminder_email(cls, to_email: str, order: Order):
+    def send_payment_reminder_email(cls, order: Order):
         """
-        Send a payment reminder email to the user using Celery task.
+        Schedule a payment reminder email sent one day before the payment due date.
 
         Parameters:
         - `order` (Order): The order instance.
-        - `to_email` (str): The email address of the recipient
 
         Returns:
         - None
         """
-        subject = "Payment reminder"
-        html_message = render_to_string("payment_reminder_email.html", {"order": order})
-        plain_message = strip_tags(html_message)
+        cls.send_payment_reminder_emails([order])
+
+    @classmethod
+    def send_payment_reminder_emails(cls, orders: list):
+        """
+        Schedule payment reminder emails of many orders.
+
+        Reminders are stored in the database and sent by the periodic
+        `send-payment-reminders` task, no task is enqueued here.
 
-        send_email_task.apply_async(
-            args=(subject, plain_message, cls.from_email, [to_email]),
-            kwargs={"html_message": html_message},
-            eta=order.payment_due_date - timezone.timedelta(days=1),
-        )
+        Parameters:
+        - `orders` (List[Order]): The order instances.
+
+        Returns:
+        - None
+        """
+        with span("email"):
+            PaymentReminderScheduler.schedule(orders)
@@ -0,0 +1,197 @@
+"""
+Per-request timing instrumentation.
+
+`RequestInstrumentationMiddleware` records the SQL queries of every request
+and the named spans opened with `span` while it is processed, adds them to the
+response as a `Server-Timing` header and logs requests slower than
+`SLOW_REQUEST_THRESHOLD` milliseconds. It is enabled with
+`REQUEST_INSTRUMENTATION`. When disabled, the middleware removes itself, no
+query wrapper is installed and `span` returns a shared no-op context manager.
+"""
+import heapq
+import json
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("ecommerceapp.requests")
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar(
+    "request_profile", default=None
+)
+_NO_SPAN = nullcontext()
+
+
+@dataclass
+class RequestProfile:
+    """
+    Timings collected while a single request is processed. Durations are in seconds.
+    """
+
+    max_slow_queries: int = 5
+    queries: int = 0
+    sql_time: float = 0.0
+    spans: Dict[str, float] = field(default_factory=dict)
+    # min-heap of (duration, sql) holding the slowest statements
+    slow_queries: List[Tuple[float, str]] = field(default_factory=list)
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if len(self.slow_queries) < self.max_slow_queries:
+            heapq.heappush(self.slow_queries, (duration, sql))
+        elif duration > self.slow_queries[0][0]:
+            heapq.heapreplace(self.slow_queries, (duration, sql))
+
+    def record_span(self, name, duration):
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(name, time.perf_counter() - started)
+
+    def server_timing(self, total):
+        """
+        Return the value of the `Server-Timing` header, with durations in milliseconds.
+        """
+        metrics = [f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"']
+        metrics += [
+            f"{name};dur={duration * 1000:.2f}" for name, duration in self.spans.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper recording queries in the profile of the current request.
+
+    The profile is looked up when the query runs, so queries executed by the
+    async ORM in a worker thread are attributed to the request that issued them.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection, **kwargs):
+    """
+    Add `record_query` to the execute wrappers of a database connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def span(name):
+    """
+    Return a context manager timing a named part of the current request.
+
+    Spans with the same name are summed. Outside of an instrumented request
+    (e.g. in Celery workers or with the instrumentation disabled) it does nothing.
+
+    Parameters:
+    - `name` (str): Name of the span, used as the `Server-Timing` metric name.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return _NO_SPAN
+    return profile.span(name)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Middleware adding a `Server-Timing` header and logging slow requests.
+
+    It supports both WSGI and ASGI requests. `record_query` is installed on every
+    database connection once, when the middleware is loaded.
+
+    Settings:
+    - `REQUEST_INSTRUMENTATION` (bool): Enables the middleware.
+    - `SLOW_REQUEST_THRESHOLD` (int): Requests taking at least this many
+      milliseconds are logged with their timings and slowest statements.
+    - `SLOW_REQUEST_LOGGED_QUERIES` (int): Number of slowest statements logged.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.SLOW_REQUEST_THRESHOLD / 1000
+        self.logged_queries = settings.SLOW_REQUEST_LOGGED_QUERIES
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all():
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        profile = RequestProfile(max_slow_queries=self.logged_queries)
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        profile = RequestProfile(max_slow_queries=self.logged_queries)
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    def finish(self, request, response, profile, started):
+        total = time.perf_counter() - started
+        response["Server-Timing"] = profile.server_timing(total)
+        if total >= self.threshold:
+            self.log_slow_request(request, response, profile, total)
+        return response
+
+    def log_slow_request(self, request, response, profile, total):
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "queries": profile.queries,
+            "sql_ms": round(profile.sql_time * 1000, 2),
+            "spans_ms": {
+                name: round(duration * 1000, 2)
+                for name, duration in profile.spans.items()
+            },
+            "slowest_queries": [
+                {"sql": sql, "ms": round(duration * 1000, 2)}
+                for duration, sql in sorted(profile.slow_queries, reverse=True)
+            ],
+        }
+        logger.warning(
+            "Slow request %s", json.dumps(record), extra={"request_profile": record}
+        )
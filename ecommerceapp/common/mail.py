@@ -0,0 +1,134 @@
+import smtplib
+from functools import lru_cache
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Prefetch
+from django.template.loader import get_template
+from django.utils.html import strip_tags
+from shop.models import Order, OrderItem
+
+# Errors after which the SMTP connection cannot be reused.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# Emails sent about an order: template key -> (subject, template name).
+ORDER_EMAIL_TEMPLATES = {
+    "confirmation": ("Order Confirmation", "confirmation_email.html"),
+    "payment_reminder": ("Payment reminder", "payment_reminder_email.html"),
+}
+
+
+@lru_cache(maxsize=None)
+def get_order_email_template(template_key):
+    """
+    Return the subject and the compiled template of an order email.
+
+    Templates are compiled once per worker process and reused for every email.
+    """
+    subject, template_name = ORDER_EMAIL_TEMPLATES[template_key]
+    return subject, get_template(template_name)
+
+
+def render_order_emails(emails):
+    """
+    Render order emails, loading all their orders with a constant number of queries.
+
+    Parameters:
+    - `emails` (List[Tuple[int, str]]): Pairs of order id and template key
+      (see `ORDER_EMAIL_TEMPLATES`).
+
+    Returns:
+    - `List[dict]`: Emails in the format accepted by `build_message`. Emails of
+      orders which no longer exist are skipped.
+    """
+    order_ids = {order_id for order_id, _ in emails}
+    orders = (
+        Order.objects.select_related("customer")
+        .prefetch_related(
+            Prefetch(
+                "orderitem_set", queryset=OrderItem.objects.select_related("product")
+            )
+        )
+        .in_bulk(order_ids)
+    )
+
+    messages = []
+    for order_id, template_key in emails:
+        order = orders.get(order_id)
+        if order is None:
+            continue
+        subject, template = get_order_email_template(template_key)
+        html_message = template.render({"order": order})
+        messages.append(
+            {
+                "subject": subject,
+                "plain_message": strip_tags(html_message),
+                "from_email": settings.EMAIL_HOST_USER,
+                "to_email": [order.customer.email],
+                "html_message": html_message,
+            }
+        )
+    return messages
+
+
+def build_message(message, connection=None):
+    """
+    Build an email from its serialized form.
+
+    Parameters:
+    - `message` (dict): {
+            "subject": (str),
+            "plain_message": (str),
+            "from_email": (str),
+            "to_email": (List[str]),
+            "html_message": (str) optional,
+        }
+    - `connection`: Optional email backend instance used to send the email.
+
+    Returns:
+    - `EmailMultiAlternatives`: The email ready to be sent.
+    """
+    email = EmailMultiAlternatives(
+        message["subject"],
+        message["plain_message"],
+        message["from_email"],
+        message["to_email"],
+        connection=connection,
+    )
+    if message.get("html_message"):
+        email.attach_alternative(message["html_message"], "text/html")
+    return email
+
+
+def send_batch(messages):
+    """
+    Send many emails over a single SMTP connection.
+
+    Every email is sent separately over the shared connection, so a failure
+    only affects its own recipients. The connection is reopened for the next
+    email when the server drops it.
+
+    Parameters:
+    - `messages` (List[dict]): Emails in the format accepted by `build_message`.
+
+    Returns:
+    - `List[Tuple[dict, Exception]]`: Emails that could not be sent with their errors.
+    """
+    failed = []
+    if not messages:
+        return failed
+
+    connection = get_connection(fail_silently=False)
+    try:
+        for message in messages:
+            try:
+                # Opening is a no-op while the connection is alive.
+                connection.open()
+                connection.send_messages([build_message(message, connection)])
+            except CONNECTION_ERRORS as e:
+                failed.append((message, e))
+                connection.close()
+            except Exception as e:
+                failed.append((message, e))
+    finally:
+        connection.close()
+    return failed
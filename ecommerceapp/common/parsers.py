@@ -0,0 +1,19 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSON parser decoding with orjson, the counterpart of `ORJSONRenderer`.
+
+    Like `JSONParser` in strict mode, it rejects `NaN` and `Infinity`. Numbers
+    with a fraction are parsed as floats, which serializer `DecimalField`s
+    turn into `Decimal`s.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
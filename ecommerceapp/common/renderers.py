@@ -0,0 +1,48 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from .instrumentation import span
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    """
+    JSON renderer timing the encoding of responses as the `serialize` span.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span("serialize"):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer encoding with orjson, several times faster than the `json` module.
+
+    The output is the one of `JSONRenderer`: compact UTF-8, line and paragraph
+    separators escaped. Types orjson does not encode natively are passed to
+    DRF's `JSONEncoder`, so `Decimal`s (e.g. the `aggregate_price` of created
+    orders) are still numbers, exact for the digits of the price fields.
+    Datetimes, dates and times are passed to it too, so they are written exactly
+    as `JSONRenderer` writes them. The encoding is timed as the `serialize` span.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        options = self.options
+        renderer_context = renderer_context or {}
+        # orjson only indents by two spaces
+        if self.get_indent(accepted_media_type, renderer_context):
+            options |= orjson.OPT_INDENT_2
+        with span("serialize"):
+            rendered = orjson.dumps(data, default=self.default, option=options)
+        # U+2028 and U+2029 end lines in JavaScript, like JSONRenderer escape them
+        if b"\xe2\x80\xa8" in rendered or b"\xe2\x80\xa9" in rendered:
+            rendered = rendered.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return rendered
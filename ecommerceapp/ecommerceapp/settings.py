@@ -9,9 +9,11 @@ https://docs.djangoproject.com/en/5.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
+
 import os
+from decimal import Decimal
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -24,7 +26,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config("SECRET_KEY", default="django_insecure")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = config("DEBUG", default=False)
+DEBUG = config("DEBUG", default=False, cast=bool)
 
 ALLOWED_HOSTS = [
     "0.0.0.0",
@@ -51,12 +53,16 @@ INSTALLED_APPS = [
     "dj_rest_auth",
     "dj_rest_auth.registration",
     "drf_spectacular",
+    "django_celery_beat",
     # local apps
     "shop",
     "users.apps.UsersConfig",
 ]
 
 MIDDLEWARE = [
+    "common.instrumentation.RequestInstrumentationMiddleware",
+    "common.compression.CompressionMiddleware",
+    "common.db_routing.DatabaseRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -95,9 +101,49 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "ecommerceapp.sqlite3",
+    },
+    # read replica of `default`, by default the same file; tests use a separate
+    # file standing in for a replica
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": config(
+            "DATABASE_REPLICA_NAME", default=str(BASE_DIR / "ecommerceapp.sqlite3")
+        ),
+        "TEST": {"NAME": BASE_DIR / "test_replica.sqlite3"},
+    },
+}
+DATABASE_ROUTERS = ["common.db_routing.PrimaryReplicaRouter"]
+# aliases read-only views may read from, empty to read everything from `default`
+DATABASE_REPLICAS = config("DATABASE_REPLICAS", default="replica", cast=Csv())
+# users read from `default` for this many seconds after their last write
+REPLICA_LAG_PIN_SECONDS = config("REPLICA_LAG_PIN_SECONDS", default=5, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# the catalog versions, the replica pins and the token versions must be seen by
+# every worker, so outside of development the cache is shared through redis,
+# the per-process LocMemCache only suits a single development server
+
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND",
+            default=(
+                "django.core.cache.backends.locmem.LocMemCache"
+                if DEBUG
+                else "django.core.cache.backends.redis.RedisCache"
+            ),
+        ),
+        "LOCATION": config(
+            "CACHE_LOCATION", default="" if DEBUG else "redis://redis:6379/1"
+        ),
     }
 }
 
+# lifetime (seconds) of cached product list and product detail responses
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", default=300, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -146,21 +192,91 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.UserRole"
 
+# API JSON is encoded and decoded with orjson, FAST_JSON=False falls back to
+# the json module
+FAST_JSON = config("FAST_JSON", default=True, cast=bool)
+JSON_RENDERER = (
+    "common.renderers.ORJSONRenderer"
+    if FAST_JSON
+    else "common.renderers.InstrumentedJSONRenderer"
+)
+JSON_PARSER = (
+    "common.parsers.ORJSONParser" if FAST_JSON else "rest_framework.parsers.JSONParser"
+)
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "dj_rest_auth.jwt_auth.JWTCookieAuthentication",
+        "common.authentication.StatelessJWTCookieAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": (
+        JSON_RENDERER,
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        JSON_PARSER,
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
 }
+# responses of at least COMPRESSION_MIN_SIZE bytes are compressed with the first of
+# COMPRESSION_ENCODINGS the client accepts (br and zstd need brotli and zstandard)
+COMPRESSION_ENCODINGS = config(
+    "COMPRESSION_ENCODINGS", default="zstd,br,gzip", cast=Csv()
+)
+COMPRESSION_MIN_SIZE = config("COMPRESSION_MIN_SIZE", default=1024, cast=int)
+
+# per-request SQL and timing instrumentation reported in the Server-Timing header,
+# requests taking at least SLOW_REQUEST_THRESHOLD milliseconds are logged
+REQUEST_INSTRUMENTATION = config("REQUEST_INSTRUMENTATION", default=False, cast=bool)
+SLOW_REQUEST_THRESHOLD = config("SLOW_REQUEST_THRESHOLD", default=500, cast=int)
+SLOW_REQUEST_LOGGED_QUERIES = config("SLOW_REQUEST_LOGGED_QUERIES", default=5, cast=int)
+
+# gives users who sign up the customer role, see `users.adapter`
+ACCOUNT_ADAPTER = "users.adapter.AccountAdapter"
 
 REST_AUTH = {
     "USE_JWT": True,
     "JWT_AUTH_COOKIE": "e-commerce-auth",
     "JWT_AUTH_REFRESH_COOKIE": "e-commerce-refresh-token",
+    # requests authenticated by the cookie must carry a CSRF token, the API views
+    # are exempt from CsrfViewMiddleware
+    "JWT_AUTH_COOKIE_USE_CSRF": True,
+    # tokens carry the role of the user, see `users.tokens`
+    "JWT_TOKEN_CLAIMS_SERIALIZER": "users.tokens.RoleTokenObtainPairSerializer",
 }
+# token versions are cached for this many seconds, revocations reach processes
+# which do not share the cache after at most this delay
+TOKEN_VERSION_CACHE_TIMEOUT = config(
+    "TOKEN_VERSION_CACHE_TIMEOUT", default=60, cast=int
+)
 
 SPECTACULAR_SETTINGS = {"TITLE": "E-commerce App"}
 
+# product image variants (name: bounding box) rendered by a Celery task after upload,
+# the "thumbnail" variant is also used as the product thumbnail
+PRODUCT_IMAGE_VARIANTS = {
+    "thumbnail": (200, 200),
+    "card": (600, 600),
+    "zoom": (1600, 1600),
+}
+# output format of the variants - "JPEG" or "WEBP"
+PRODUCT_IMAGE_FORMAT = config("PRODUCT_IMAGE_FORMAT", default="JPEG")
+# uploads above these limits are rejected before their pixel data is decoded
+PRODUCT_IMAGE_MAX_BYTES = config(
+    "PRODUCT_IMAGE_MAX_BYTES", default=20 * 1024 * 1024, cast=int
+)
+PRODUCT_IMAGE_MAX_PIXELS = config(
+    "PRODUCT_IMAGE_MAX_PIXELS", default=50_000_000, cast=int
+)
+
+# product search index - "fts5", "memory" or "auto" (FTS5 when SQLite supports it)
+PRODUCT_SEARCH_BACKEND = config("PRODUCT_SEARCH_BACKEND", default="auto")
+# a search returns its best matches only, the others are left out even when the
+# results are filtered or ordered by price
+PRODUCT_SEARCH_MAX_RESULTS = config(
+    "PRODUCT_SEARCH_MAX_RESULTS", default=1000, cast=int
+)
+
 # email smtp settings
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = config("EMAIL_HOST")
@@ -169,6 +285,9 @@ EMAIL_USE_TLS = config("EMAIL_USE_TLS", default=True)
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL")
+# failed emails are retried after EMAIL_RETRY_BACKOFF * 2^attempt seconds
+EMAIL_RETRY_BACKOFF = config("EMAIL_RETRY_BACKOFF", default=30, cast=int)
+EMAIL_MAX_RETRIES = config("EMAIL_MAX_RETRIES", default=5, cast=int)
 
 # celery and redis settings for reminder email service
 # if you want to run locally change `redis:6379` to `localhost:6379`
@@ -178,3 +297,68 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Europe/Warsaw"
+CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+
+# payment reminders are stored in the database and sent by a periodic task
+# running every PAYMENT_REMINDER_INTERVAL seconds
+PAYMENT_REMINDER_INTERVAL = config("PAYMENT_REMINDER_INTERVAL", default=60, cast=int)
+# reminders are due PAYMENT_REMINDER_LEAD_TIME seconds before the payment due date
+PAYMENT_REMINDER_LEAD_TIME = config(
+    "PAYMENT_REMINDER_LEAD_TIME", default=24 * 60 * 60, cast=int
+)
+# a run sends at most PAYMENT_REMINDER_MAX_BATCHES batches of due reminders
+PAYMENT_REMINDER_BATCH_SIZE = config(
+    "PAYMENT_REMINDER_BATCH_SIZE", default=500, cast=int
+)
+PAYMENT_REMINDER_MAX_BATCHES = config(
+    "PAYMENT_REMINDER_MAX_BATCHES", default=20, cast=int
+)
+# claims of reminders not sent within this many seconds are taken over
+PAYMENT_REMINDER_CLAIM_TIMEOUT = config(
+    "PAYMENT_REMINDER_CLAIM_TIMEOUT", default=10 * 60, cast=int
+)
+# stock reservations hold units for STOCK_RESERVATION_TTL seconds, expired ones
+# are released every STOCK_RESERVATION_SWEEP_INTERVAL seconds
+STOCK_RESERVATION_TTL = config("STOCK_RESERVATION_TTL", default=15 * 60, cast=int)
+STOCK_RESERVATION_SWEEP_INTERVAL = config(
+    "STOCK_RESERVATION_SWEEP_INTERVAL", default=60, cast=int
+)
+# a run releases at most STOCK_RESERVATION_MAX_BATCHES batches of reservation rows
+STOCK_RESERVATION_BATCH_SIZE = config(
+    "STOCK_RESERVATION_BATCH_SIZE", default=1000, cast=int
+)
+STOCK_RESERVATION_MAX_BATCHES = config(
+    "STOCK_RESERVATION_MAX_BATCHES", default=20, cast=int
+)
+# responses of requests with an Idempotency-Key header are replayed to retries
+# for IDEMPOTENCY_KEY_TTL seconds
+IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60, cast=int)
+# keys of requests not completed within this many seconds are taken over
+IDEMPOTENCY_LOCK_TIMEOUT = config("IDEMPOTENCY_LOCK_TIMEOUT", default=60, cast=int)
+# expired keys are deleted every IDEMPOTENCY_PURGE_INTERVAL seconds, in batches
+IDEMPOTENCY_PURGE_INTERVAL = config(
+    "IDEMPOTENCY_PURGE_INTERVAL", default=60 * 60, cast=int
+)
+IDEMPOTENCY_PURGE_BATCH_SIZE = config(
+    "IDEMPOTENCY_PURGE_BATCH_SIZE", default=1000, cast=int
+)
+# exports read orders and products in chunks of EXPORT_CHUNK_SIZE rows
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+# width of the price bands of the product facets histogram, unless requested
+FACET_PRICE_INTERVAL = config("FACET_PRICE_INTERVAL", default="50", cast=Decimal)
+# the price histogram has at most this many bands, wider ones are used if needed
+FACET_MAX_BANDS = config("FACET_MAX_BANDS", default=50, cast=int)
+CELERY_BEAT_SCHEDULE = {
+    "send-payment-reminders": {
+        "task": "send-payment-reminders",
+        "schedule": PAYMENT_REMINDER_INTERVAL,
+    },
+    "release-expired-stock-reservations": {
+        "task": "release-expired-stock-reservations",
+        "schedule": STOCK_RESERVATION_SWEEP_INTERVAL,
+    },
+    "purge-idempotency-keys": {
+        "task": "purge-idempotency-keys",
+        "schedule": IDEMPOTENCY_PURGE_INTERVAL,
+    },
+}
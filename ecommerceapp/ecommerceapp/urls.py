@@ -19,11 +19,23 @@ from django.urls import path, include
 from shop.views import (
     ProductListView,
     ProductDetailsView,
+    ProductFacetsView,
+    CatalogCacheStatsView,
     ProductCreateView,
+    ProductImportView,
+    ProductExportView,
     ProductRetrieveUpdateDestroyView,
     OrderCreateView,
+    OrderBatchCreateView,
     OrderProductsStatisticsView,
     OrderListView,
+    OrderExportView,
+    StockReservationView,
+)
+from shop.async_views import (
+    AsyncOrderProductsStatisticsView,
+    AsyncProductDetailsView,
+    AsyncProductListView,
 )
 from django.conf.urls.static import static
 from django.conf import settings
@@ -35,19 +47,45 @@ urlpatterns = [
     path("accounts/register/", include("dj_rest_auth.registration.urls")),
     path("products/", ProductListView.as_view(), name="product-list"),
     path("product/<int:pk>/", ProductDetailsView.as_view(), name="product-details"),
+    path("products/facets/", ProductFacetsView.as_view(), name="product-facets"),
+    path(
+        "products/cache/stats/",
+        CatalogCacheStatsView.as_view(),
+        name="catalog-cache-stats",
+    ),
     path("product/create/", ProductCreateView.as_view(), name="create-product"),
+    path("product/import/", ProductImportView.as_view(), name="import-products"),
+    path("product/export/", ProductExportView.as_view(), name="export-products"),
     path(
         "product/modify/<int:pk>/",
         ProductRetrieveUpdateDestroyView.as_view(),
         name="retrieve-update-delete-product",
     ),
     path("order/create/", OrderCreateView.as_view(), name="create-order"),
+    path(
+        "order/create/batch/",
+        OrderBatchCreateView.as_view(),
+        name="create-order-batch",
+    ),
     path(
         "order/statistics/",
         OrderProductsStatisticsView.as_view(),
         name="order-statistics",
     ),
+    path("order/reserve/", StockReservationView.as_view(), name="reserve-stock"),
     path("order/list/", OrderListView.as_view(), name="order-list"),
+    path("order/export/", OrderExportView.as_view(), name="export-orders"),
+    path("async/products/", AsyncProductListView.as_view(), name="async-product-list"),
+    path(
+        "async/product/<int:pk>/",
+        AsyncProductDetailsView.as_view(),
+        name="async-product-details",
+    ),
+    path(
+        "async/order/statistics/",
+        AsyncOrderProductsStatisticsView.as_view(),
+        name="async-order-statistics",
+    ),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/schema/docs/",
@@ -1,7 +1,28 @@
 from django.contrib import admin
-from .models import Product, ProductCategory, Order, OrderItem
+from .models import (
+    Product,
+    ProductCategory,
+    Order,
+    OrderItem,
+    ProductSalesDaily,
+    PaymentReminder,
+    ProductStockShard,
+    StockReservation,
+    IdempotencyKey,
+)
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    # changed with conditional updates only, see `shop.inventory.Inventory`
+    readonly_fields = ("stock", "stock_shards")
+
 
-admin.site.register(Product)
 admin.site.register(ProductCategory)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(ProductSalesDaily)
+admin.site.register(PaymentReminder)
+admin.site.register(ProductStockShard)
+admin.site.register(StockReservation)
+admin.site.register(IdempotencyKey)
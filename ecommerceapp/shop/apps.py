@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shop"
+
+    def ready(self):
+        """
+        Connect the signal receivers keeping the product search index up to date.
+        """
+        import shop.signals
@@ -0,0 +1,200 @@
+"""
+Async versions of the catalog read endpoints, served under `/async/`.
+
+The views are native Django async views using the async ORM (`aget`,
+`async for`), so under an ASGI server (see the `asgi` service of
+`docker-compose.yml`) a request waiting on the cache or the database does not
+hold a worker thread. They return the same data as their counterparts in
+`shop.views` and share the response cache and replica routing with them.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import filters
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    MethodNotAllowed,
+    NotAuthenticated,
+    NotFound,
+    PermissionDenied,
+)
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from common.authentication import StatelessJWTCookieAuthentication
+from common.db_routing import AsyncReplicaReadMixin
+from .cache import AsyncCachedResponseMixin, CatalogCache
+from .fieldsets import only_fields, requested_fields
+from .filters import ProductFilter, ProductSearchFilter
+from .models import Product
+from .pagination import KeysetPagination
+from .permissions import IsSellerOrAdmin
+from .serializers import ProductSerializer, ProductStatsInputSerializer
+from .views import OrderProductsStatisticsView
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's `APIView`.
+
+    The Django request is wrapped in a DRF `Request` for query parameters and
+    body parsing, the user is authenticated with `aauthenticate` and the
+    permission classes must not query the database. `APIException`s are turned
+    into responses like DRF does. As in DRF, the views are exempt from
+    `CsrfViewMiddleware`, the authentication enforces CSRF for cookie tokens.
+    """
+
+    authentication_classes = [StatelessJWTCookieAuthentication]
+    permission_classes = []
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    renderer_class = api_settings.DEFAULT_RENDERER_CLASSES[0]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # like DRF's APIView, CSRF is only enforced by the cookie authentication
+        # (JWT_AUTH_COOKIE_USE_CSRF), requests with a bearer token are not exposed
+        # to CSRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        self.request = request
+        try:
+            handler = None
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), None)
+            if handler is None:
+                raise MethodNotAllowed(request.method)
+
+            await self.initial(request, *args, **kwargs)
+            return await handler(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    async def initial(self, request, *args, **kwargs):
+        """
+        Authenticate the request and check the permissions.
+        """
+        request.user, request.auth = AnonymousUser(), None
+        for authentication_class in self.authentication_classes:
+            result = await authentication_class().aauthenticate(request)
+            if result is not None:
+                request.user, request.auth = result
+                break
+
+        for permission_class in self.permission_classes:
+            permission = permission_class()
+            if not permission.has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                raise PermissionDenied(getattr(permission, "message", None))
+
+    def render(self, data, status=200, headers=None):
+        renderer = self.renderer_class()
+        return HttpResponse(
+            renderer.render(data),
+            status=status,
+            content_type=renderer.media_type,
+            headers=headers,
+        )
+
+    def handle_exception(self, exc):
+        headers = {}
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            authenticator = self.authentication_classes[0]()
+            headers["WWW-Authenticate"] = authenticator.authenticate_header(
+                self.request
+            )
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        return self.render(data, status=exc.status_code, headers=headers)
+
+
+class AsyncProductListView(
+    AsyncReplicaReadMixin, AsyncCachedResponseMixin, AsyncAPIView
+):
+    """
+    Async version of `shop.views.ProductListView`, with the same parameters and responses.
+    """
+
+    pagination_class = KeysetPagination
+    filter_backends = [ProductSearchFilter, ProductFilter, filters.OrderingFilter]
+    ordering_fields = ["name", "category__name", "price"]
+
+    async def aget_response_cache_key(self, request):
+        return await CatalogCache.alist_key(request)
+
+    def filter_queryset(self, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    async def get_data(self, request):
+        fields = requested_fields(
+            request, ProductSerializer, ProductSerializer.list_fields
+        )
+        # ranking search results queries the search index
+        queryset = await sync_to_async(self.filter_queryset)(Product.objects.all())
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(
+            only_fields(queryset, fields), request, view=self
+        )
+        serializer = ProductSerializer(
+            page, many=True, fields=fields, context={"request": request}
+        )
+        return paginator.get_paginated_response(serializer.data).data
+
+
+class AsyncProductDetailsView(
+    AsyncReplicaReadMixin, AsyncCachedResponseMixin, AsyncAPIView
+):
+    """
+    Async version of `shop.views.ProductDetailsView`, with the same parameters and responses.
+    """
+
+    async def aget_response_cache_key(self, request):
+        self.fields = requested_fields(request, ProductSerializer)
+        return await CatalogCache.adetail_key(self.kwargs["pk"], self.fields)
+
+    async def get_data(self, request, pk):
+        try:
+            product = await only_fields(Product.objects.all(), self.fields).aget(pk=pk)
+        except Product.DoesNotExist:
+            raise NotFound()
+        return ProductSerializer(
+            product, fields=self.fields, context={"request": request}
+        ).data
+
+
+class AsyncOrderProductsStatisticsView(AsyncReplicaReadMixin, AsyncAPIView):
+    """
+    Async version of `shop.views.OrderProductsStatisticsView`, with the same parameters
+    and responses.
+    """
+
+    permission_classes = [IsSellerOrAdmin]
+    parser_classes = [MultiPartParser, FormParser]
+    replica_methods = ("POST",)
+
+    async def post(self, request):
+        input_serializer = ProductStatsInputSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        most_ordered_products = OrderProductsStatisticsView.most_ordered_products(
+            input_serializer.validated_data["start_date"],
+            input_serializer.validated_data["end_date"],
+            input_serializer.validated_data["number_of_products"],
+        )
+        result_data = [
+            {
+                "product_name": product_stat["product__name"],
+                "total_orders": product_stat["total_orders"],
+            }
+            async for product_stat in most_ordered_products
+        ]
+        return self.render(result_data)
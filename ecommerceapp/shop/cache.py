@@ -0,0 +1,238 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from common.db_routing import reads_from_replica
+
+
+class CatalogCache:
+    """
+    Versioned cache of the product catalog responses.
+
+    Every cache key embeds a version number. Instead of deleting cached entries,
+    writes bump the version (see `shop.signals`), which makes all entries built
+    from older data unreachable; they simply expire. List responses depend on
+    the catalog version, detail responses on the version of their product only.
+
+    Version counters start from the current time in milliseconds, so a counter
+    lost on cache eviction never restarts at a value used before. Methods used by
+    async views have an `a`-prefixed variant using the async cache API.
+
+    A replica may still serve the data of the previous version for up to
+    `REPLICA_LAG_PIN_SECONDS` after a bump. Responses read from a replica within
+    that delay are not stored, else the stale data would be cached under the new
+    version for `CATALOG_CACHE_TIMEOUT`.
+    """
+
+    prefix = "shop:catalog"
+    hits_key = f"{prefix}:hits"
+    misses_key = f"{prefix}:misses"
+    catalog_version_key = f"{prefix}:version"
+    # set for REPLICA_LAG_PIN_SECONDS after every bump
+    changed_key = f"{prefix}:changed"
+
+    @staticmethod
+    def _initial_version():
+        return int(time.time() * 1000)
+
+    @classmethod
+    def _get_version(cls, key):
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, cls._initial_version(), timeout=None)
+            version = cache.get(key)
+        return version
+
+    @classmethod
+    async def _aget_version(cls, key):
+        version = await cache.aget(key)
+        if version is None:
+            await cache.aadd(key, cls._initial_version(), timeout=None)
+            version = await cache.aget(key)
+        return version
+
+    @classmethod
+    def _mark_changed(cls):
+        cache.set(cls.changed_key, True, settings.REPLICA_LAG_PIN_SECONDS)
+
+    @classmethod
+    def _bump_version(cls, key):
+        cls._mark_changed()
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.set(key, cls._initial_version(), timeout=None)
+
+    @classmethod
+    def _product_version_key(cls, product_id):
+        return f"{cls.prefix}:product:{product_id}:version"
+
+    @classmethod
+    def bump_catalog_version(cls):
+        """
+        Invalidate all cached product list responses.
+        """
+        cls._bump_version(cls.catalog_version_key)
+
+    @classmethod
+    def bump_product_version(cls, product_id):
+        """
+        Invalidate the cached detail response of a single product.
+        """
+        cls._bump_version(cls._product_version_key(product_id))
+
+    @classmethod
+    def bump_product_versions(cls, product_ids):
+        """
+        Invalidate the cached detail responses of many products at once.
+
+        The version counters are deleted rather than incremented one by one; they
+        restart from the current time, above any version used before.
+        """
+        cls._mark_changed()
+        cache.delete_many([cls._product_version_key(pk) for pk in product_ids])
+
+    @classmethod
+    def catalog_version(cls):
+        return cls._get_version(cls.catalog_version_key)
+
+    @staticmethod
+    def _request_digest(request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        return hashlib.md5(
+            f"{request.get_host()}{request.path}?{query}".encode()
+        ).hexdigest()
+
+    @classmethod
+    def list_key(cls, request):
+        """
+        Build the cache key of a list response from the full query string.
+        """
+        digest = cls._request_digest(request)
+        return f"{cls.prefix}:list:{cls.catalog_version()}:{digest}"
+
+    @classmethod
+    async def alist_key(cls, request):
+        version = await cls._aget_version(cls.catalog_version_key)
+        return f"{cls.prefix}:list:{version}:{cls._request_digest(request)}"
+
+    @classmethod
+    def _detail_key(cls, product_id, version, fields):
+        key = f"{cls.prefix}:detail:{product_id}:{version}"
+        return key if fields is None else f"{key}:{','.join(fields)}"
+
+    @classmethod
+    def detail_key(cls, product_id, fields=None):
+        """
+        Build the cache key of a detail response, `fields` being its sparse fieldset.
+        """
+        version = cls._get_version(cls._product_version_key(product_id))
+        return cls._detail_key(product_id, version, fields)
+
+    @classmethod
+    async def adetail_key(cls, product_id, fields=None):
+        version = await cls._aget_version(cls._product_version_key(product_id))
+        return cls._detail_key(product_id, version, fields)
+
+    @classmethod
+    def may_store(cls):
+        """
+        Check whether the response computed by the current request may be cached.
+
+        It may not when it was read from a replica shortly after a bump.
+        """
+        return not reads_from_replica() or cache.get(cls.changed_key) is None
+
+    @classmethod
+    async def amay_store(cls):
+        return not reads_from_replica() or await cache.aget(cls.changed_key) is None
+
+    @classmethod
+    def record(cls, hit):
+        key = cls.hits_key if hit else cls.misses_key
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    @classmethod
+    async def arecord(cls, hit):
+        key = cls.hits_key if hit else cls.misses_key
+        await cache.aadd(key, 0, timeout=None)
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            pass
+
+    @classmethod
+    def stats(cls):
+        """
+        Return the hit and miss counters and the current catalog version.
+        """
+        hits = cache.get(cls.hits_key, 0)
+        misses = cache.get(cls.misses_key, 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "catalog_version": cls.catalog_version(),
+        }
+
+
+class CachedResponseMixin:
+    """
+    Serve successful GET responses of a view from `CatalogCache`.
+
+    Views define `get_response_cache_key(request)`. Cached responses carry an
+    `X-Cache: HIT` header, freshly computed ones `X-Cache: MISS`.
+    """
+
+    def get_response_cache_key(self, request):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            CatalogCache.record(hit=True)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        CatalogCache.record(hit=False)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200 and CatalogCache.may_store():
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class AsyncCachedResponseMixin:
+    """
+    `CachedResponseMixin` for the async views of `shop.async_views`.
+
+    Views define `aget_response_cache_key(request)` and `get_data(request, ...)`
+    returning the data of a fresh response. Sync and async views store the same
+    data, so they share cached detail responses.
+    """
+
+    async def aget_response_cache_key(self, request):
+        raise NotImplementedError
+
+    async def get_data(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    async def get(self, request, *args, **kwargs):
+        key = await self.aget_response_cache_key(request)
+        data = await cache.aget(key)
+        if data is not None:
+            await CatalogCache.arecord(hit=True)
+            return self.render(data, headers={"X-Cache": "HIT"})
+
+        await CatalogCache.arecord(hit=False)
+        data = await self.get_data(request, *args, **kwargs)
+        if await CatalogCache.amay_store():
+            await cache.aset(key, data, settings.CATALOG_CACHE_TIMEOUT)
+        return self.render(data, headers={"X-Cache": "MISS"})
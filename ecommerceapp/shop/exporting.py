@@ -0,0 +1,277 @@
+import csv
+import json
+import zlib
+from collections import defaultdict
+from datetime import datetime, time
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .models import Order, OrderItem, Product
+
+
+class Echo:
+    """
+    File-like object returning what is written, so `csv.writer` formats single rows.
+    """
+
+    def write(self, value):
+        return value
+
+
+class Export:
+    """
+    Streaming export of a queryset as CSV or JSON Lines.
+
+    Rows are read with `queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)`, so
+    only one chunk of rows (and the related rows loaded for it) is held in
+    memory at a time, whatever the size of the export. Rows are read as tuples
+    of `fields` instead of model instances, whose construction would cost more
+    than the encoding. The encoded rows are sent in blocks of about
+    `buffer_size` bytes as soon as a block is full, the first line at once.
+    With `gzip`, the blocks are compressed on the fly. Responses served over
+    ASGI stream `astream`: Django's ASGI handler would read a sync iterator
+    whole into memory before sending it.
+
+    Subclasses define `model`, `name`, `columns`, `fields` and `get_queryset`.
+    """
+
+    model = None
+    name = None
+    columns = ()
+    fields = ()
+    buffer_size = 64 * 1024
+    content_types = {
+        "csv": "text/csv; charset=utf-8",
+        "jsonl": "application/x-ndjson",
+    }
+
+    def __init__(self, file_format="csv", gzip=False, using=None):
+        self.file_format = file_format
+        self.gzip = gzip
+        self.using = using
+        self.chunk_size = settings.EXPORT_CHUNK_SIZE
+
+    @property
+    def content_type(self):
+        return "application/gzip" if self.gzip else self.content_types[self.file_format]
+
+    @property
+    def filename(self):
+        return f"{self.name}.{self.file_format}" + (".gz" if self.gzip else "")
+
+    @property
+    def csv_columns(self):
+        return self.columns
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def chunks(self):
+        """
+        Return the rows of the export as lists of at most `chunk_size` tuples.
+        """
+        rows = (
+            self.get_queryset()
+            .using(self.using)
+            .values_list(*self.fields)
+            .iterator(chunk_size=self.chunk_size)
+        )
+        while chunk := list(islice(rows, self.chunk_size)):
+            yield chunk
+
+    @staticmethod
+    def encode_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if value is None or isinstance(value, (int, str)):
+            return value
+        # decimals are exported as strings, like in the API responses
+        return str(value)
+
+    def as_record(self, columns, row):
+        return dict(zip(columns, map(self.encode_value, row)))
+
+    def records(self):
+        """
+        Return the rows of the export as dicts, the objects of JSON Lines files.
+        """
+        for chunk in self.chunks():
+            for row in chunk:
+                yield self.as_record(self.columns, row)
+
+    def csv_rows(self, record):
+        return [record.values()]
+
+    def lines(self):
+        """
+        Return the encoded rows of the export, one line at a time.
+        """
+        if self.file_format == "csv":
+            writer = csv.writer(Echo())
+            yield writer.writerow(self.csv_columns)
+            for record in self.records():
+                for row in self.csv_rows(record):
+                    yield writer.writerow(row)
+            return
+
+        for record in self.records():
+            yield json.dumps(record) + "\n"
+
+    def stream(self):
+        """
+        Return the content of the export in blocks of bytes.
+        """
+        # wbits of 16 + MAX_WBITS write a gzip header and trailer
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if self.gzip else None
+        buffer, size, started = [], 0, False
+        for line in self.lines():
+            buffer.append(line)
+            size += len(line)
+            # the first line goes out at once, so the download starts right away
+            if size >= self.buffer_size or not started:
+                yield self.encode(buffer, compressor, zlib.Z_SYNC_FLUSH)
+                buffer, size, started = [], 0, True
+        if buffer or compressor is not None:
+            yield self.encode(buffer, compressor, zlib.Z_FINISH)
+
+    async def astream(self):
+        """
+        Return the blocks of `stream` as an async iterator.
+
+        Every block is produced by `sync_to_async`, in the thread running the sync
+        code of the request, where the database cursor of the rows lives.
+        """
+        blocks = self.stream()
+        end = object()
+        while (block := await sync_to_async(next)(blocks, end)) is not end:
+            yield block
+
+    @staticmethod
+    def encode(lines, compressor, flush_mode):
+        data = "".join(lines).encode()
+        if compressor is None:
+            return data
+        return compressor.compress(data) + compressor.flush(flush_mode)
+
+
+class OrderExport(Export):
+    """
+    Export of orders with their line items and totals, e.g. for accounting.
+
+    CSV files have one line per order item, repeating the order columns, and one
+    line with empty item columns for an order without items; JSON Lines files
+    have one object per order with a list of `items`. The items of every chunk
+    of orders are loaded with a single query.
+
+    Parameters:
+    - `start_date` (date): Only orders placed on or after this day.
+    - `end_date` (date): Only orders placed on or before this day.
+
+    Days are calendar days in the current time zone, like in `SalesRollup`.
+    """
+
+    model = Order
+    name = "orders"
+    columns = (
+        "order_id",
+        "order_date",
+        "customer_id",
+        "delivery_address",
+        "payment_due_date",
+        "aggregate_price",
+    )
+    fields = (
+        "pk",
+        "order_date",
+        "customer_id",
+        "delivery_address",
+        "payment_due_date",
+        "aggregate_price",
+    )
+    item_columns = (
+        "product_id",
+        "sku",
+        "product_name",
+        "quantity",
+        "unit_price",
+        "line_total",
+    )
+    item_fields = (
+        "product_id",
+        "product__sku",
+        "product__name",
+        "quantity",
+        "unit_price",
+        "line_total",
+    )
+
+    def __init__(self, start_date=None, end_date=None, **options):
+        super().__init__(**options)
+        self.start_date = start_date
+        self.end_date = end_date
+
+    @property
+    def csv_columns(self):
+        return self.columns + self.item_columns
+
+    @staticmethod
+    def start_of_day(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def get_queryset(self):
+        orders = Order.objects.order_by("pk")
+        # ranges of order_date instead of order_date__date, to use order_date_idx
+        if self.start_date is not None:
+            orders = orders.filter(order_date__gte=self.start_of_day(self.start_date))
+        if self.end_date is not None:
+            orders = orders.filter(
+                order_date__lt=self.start_of_day(
+                    self.end_date + timezone.timedelta(days=1)
+                )
+            )
+        return orders
+
+    def items(self, order_ids):
+        """
+        Return the item records of orders by order primary key.
+        """
+        items = defaultdict(list)
+        for order_id, *item in (
+            OrderItem.objects.using(self.using)
+            .filter(order_id__in=order_ids)
+            .order_by("pk")
+            .values_list("order_id", *self.item_fields)
+        ):
+            items[order_id].append(self.as_record(self.item_columns, item))
+        return items
+
+    def records(self):
+        for chunk in self.chunks():
+            items = self.items([row[0] for row in chunk])
+            for row in chunk:
+                record = self.as_record(self.columns, row)
+                record["items"] = items[row[0]]
+                yield record
+
+    def csv_rows(self, record):
+        head = [record[column] for column in self.columns]
+        if not record["items"]:
+            # like the orders of the JSON Lines export, orders without items are kept
+            return [head + [""] * len(self.item_columns)]
+        return [head + list(item.values()) for item in record["items"]]
+
+
+class ProductExport(Export):
+    """
+    Export of the product catalog, with the category name and the `sku` used by
+    imports (see `shop.importing`), so an export can be edited and imported again.
+    """
+
+    model = Product
+    name = "products"
+    columns = ("id", "sku", "name", "description", "price", "category")
+    fields = ("pk", "sku", "name", "description", "price", "category__name")
+
+    def get_queryset(self):
+        return Product.objects.order_by("pk")
@@ -0,0 +1,195 @@
+"""
+Facets of the product catalog, the counts shown by the filters of product lists.
+
+`ProductFacets` counts the products of every category and builds a histogram
+of their prices. Like in the filter sidebars of shops, each facet ignores its
+own filter: the category counts are those of the selected price range in every
+category, so other categories can be picked, and the histogram covers all
+prices of the selected categories. The histogram has at most `FACET_MAX_BANDS`
+bands, the requested band width is widened when the prices span more bands.
+"""
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import (
+    CharField,
+    Count,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    IntegerField,
+    Max,
+    Min,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Cast, Greatest, Round
+from .filters import category_filter, price_filter
+from .models import ProductCategory
+
+
+class GroupSubquery(Subquery):
+    """
+    Subquery referencing only grouped columns, evaluated once per group of an
+    aggregation instead of being grouped by (which evaluates it for every row).
+    """
+
+    def get_group_by_cols(self):
+        return []
+
+
+class ProductFacets:
+    """
+    Product counts per category and per price band of a queryset of products.
+
+    Both facets are computed with a single query, the union of a count grouped
+    by category and one grouped by price band, so the number of queries does
+    not grow with the number of categories or bands. With a category or price
+    filter, each side is narrowed by the index on category and price.
+
+    Parameters:
+    - `queryset` (QuerySet): Products of the context, e.g. search results.
+    - `category` (List[int]): Primary keys of the selected categories, all when empty.
+    - `min_price` (Decimal): Lowest selected price.
+    - `max_price` (Decimal): Highest selected price.
+    - `price_interval` (Decimal): Width of the price bands, `FACET_PRICE_INTERVAL` by default.
+      It is widened when the prices would fall in more than `FACET_MAX_BANDS` bands.
+    """
+
+    def __init__(
+        self,
+        queryset,
+        category=(),
+        min_price=None,
+        max_price=None,
+        price_interval=None,
+    ):
+        self.queryset = queryset.order_by()
+        self.category = list(category)
+        self.min_price = min_price
+        self.max_price = max_price
+        self.price_interval = price_interval or settings.FACET_PRICE_INTERVAL
+        self.max_bands = settings.FACET_MAX_BANDS
+
+    @staticmethod
+    def cents():
+        """
+        Return the expression of the price of a product in cents.
+        """
+        # prices are floating point numbers in SQLite
+        return Cast(
+            Round(ExpressionWrapper(F("price") * 100, output_field=FloatField())),
+            IntegerField(),
+        )
+
+    def interval(self):
+        """
+        Return the expression of the width of the price bands in cents.
+
+        It is the requested width, or the smallest width putting the prices of
+        the histogram in at most `max_bands` bands when it is wider. The spread
+        of the prices is read by a subquery, part of the facets query.
+        """
+        spread = GroupSubquery(
+            self.queryset.filter(category_filter(self.category))
+            .annotate(facet_all=Value(1, output_field=IntegerField()))
+            .values("facet_all")
+            .annotate(spread=Max(self.cents()) - Min(self.cents()))
+            .values("spread")
+        )
+        # prices spread over `spread` cents fall in at most spread // width + 2 bands
+        return Greatest(
+            Value(int(self.price_interval * 100)),
+            spread / Value(max(self.max_bands - 1, 1)) + Value(1),
+            output_field=IntegerField(),
+        )
+
+    def band(self, interval):
+        """
+        Return the expression of the price band of a product, its index from zero.
+        """
+        # integer division of cents
+        return self.cents() / interval
+
+    def rows(self):
+        """
+        Return the grouped counts, `facet_band` and `facet_interval` are None in
+        the category rows and `facet_category` in the price band rows.
+        """
+        null = Value(None, output_field=IntegerField())
+        interval = self.interval()
+        category_name = GroupSubquery(
+            ProductCategory.objects.filter(pk=OuterRef("category_id")).values("name")
+        )
+        by_category = (
+            self.queryset.filter(price_filter(self.min_price, self.max_price))
+            .annotate(facet_category=F("category_id"), facet_band=null)
+            .values("facet_category", "facet_band")
+            # the name is read once per category, a join would read it for every product
+            .annotate(
+                count=Count("pk"),
+                facet_category_name=category_name,
+                facet_interval=null,
+            )
+        )
+        by_band = (
+            self.queryset.filter(category_filter(self.category))
+            .annotate(facet_category=null, facet_band=self.band(interval))
+            .values("facet_category", "facet_band")
+            .annotate(
+                count=Count("pk"),
+                facet_category_name=Value(None, output_field=CharField()),
+                facet_interval=interval,
+            )
+        )
+        return by_category.union(by_band, all=True)
+
+    def compute(self):
+        """
+        Return the facets.
+
+        Returns:
+        - `dict`: {
+            "count": (int) Products matching all filters,
+            "categories": (List[dict]) `id`, `name` and `count` of the categories,
+              most products first,
+            "price_interval": (Decimal) Width of the price bands, the requested
+              one or a wider one capping the number of bands,
+            "price_histogram": (List[dict]) `min`, `max` and `count` of the
+              price bands holding products, cheapest first,
+        }
+        """
+        categories, bands = [], []
+        price_interval = Decimal(self.price_interval)
+        for row in self.rows():
+            if row["facet_band"] is None:
+                categories.append(
+                    {
+                        "id": row["facet_category"],
+                        "name": row["facet_category_name"],
+                        "count": row["count"],
+                    }
+                )
+            else:
+                price_interval = Decimal(row["facet_interval"]) / 100
+                bands.append((row["facet_band"], row["count"]))
+        histogram = [
+            {
+                "min": band * price_interval,
+                "max": (band + 1) * price_interval,
+                "count": count,
+            }
+            for band, count in sorted(bands)
+        ]
+        categories.sort(key=lambda entry: (-entry["count"], entry["name"], entry["id"]))
+        selected = [
+            entry["count"]
+            for entry in categories
+            if not self.category or entry["id"] in self.category
+        ]
+        return {
+            "count": sum(selected),
+            "categories": categories,
+            "price_interval": price_interval,
+            "price_histogram": histogram,
+        }
@@ -0,0 +1,123 @@
+"""
+Sparse fieldsets of API responses.
+
+Clients choose the fields of the objects in a response with the comma separated
+query parameters `fields` (only these fields, `*` for all of them) and `omit`
+(all fields but these). The SQL is narrowed to the selected fields with
+`.only()`, so columns like long descriptions are not even read. Views may
+default to a compact set of fields, e.g. for lists.
+"""
+from functools import cache
+from rest_framework import serializers
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+@cache
+def field_names(serializer_class):
+    """
+    Return the names of the fields of a serializer class, in their declared order.
+    """
+    return tuple(serializer_class().fields)
+
+
+def parse_field_names(value, available, param):
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise serializers.ValidationError(
+            {param: [f'Unknown field "{name}".' for name in unknown]}
+        )
+    return names
+
+
+def requested_fields(request, serializer_class, default=None):
+    """
+    Return the fields of a serializer selected by the query parameters of a request.
+
+    Parameters:
+    - `request` (Request): The request, with the `fields` and `omit` parameters.
+    - `serializer_class` (type): The serializer of the response objects.
+    - `default` (Tuple[str]): Fields when neither parameter is given, None for all.
+
+    Returns:
+    - `Optional[Tuple[str]]`: The selected field names in declared order, None for all.
+
+    Raises:
+    - `ValidationError`: When a parameter names a field the serializer does not have.
+    """
+    fields_value = request.query_params.get(FIELDS_PARAM)
+    omit_value = request.query_params.get(OMIT_PARAM)
+    if fields_value is None and omit_value is None:
+        return default
+
+    available = field_names(serializer_class)
+    selected = set(available)
+    if fields_value is not None and fields_value.strip() != "*":
+        selected = set(parse_field_names(fields_value, available, FIELDS_PARAM))
+    if omit_value is not None:
+        selected -= set(parse_field_names(omit_value, available, OMIT_PARAM))
+    if selected == set(available):
+        return None
+    return tuple(name for name in available if name in selected)
+
+
+def only_fields(queryset, fields):
+    """
+    Defer the columns of a queryset which the selected serializer fields do not read.
+
+    The fields the queryset is ordered by stay loaded, keyset pagination reads
+    them from the last row of a page. Serializer fields are expected to have
+    the names of the model fields they read.
+    """
+    if fields is None:
+        return queryset
+
+    model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+    ordering = [
+        field.lstrip("-").split("__")[0]
+        for field in queryset.query.order_by
+        if isinstance(field, str)
+    ]
+    loaded = [
+        name for name in (*fields, *ordering) if name in model_fields or name == "pk"
+    ]
+    return queryset.only(*loaded)
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Let a serializer be instantiated with `fields`, the names of the fields to keep.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetMixin:
+    """
+    Select the fields of the responses of a DRF generic view with `fields` and `omit`.
+
+    Views may set `default_fields`, the fields returned without either parameter.
+    The serializer must use `SparseFieldsetSerializerMixin`.
+    """
+
+    default_fields = None
+
+    def get_fieldset(self):
+        if not hasattr(self, "_fieldset"):
+            self._fieldset = requested_fields(
+                self.request, self.get_serializer_class(), self.default_fields
+            )
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_fieldset())
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        return only_fields(super().filter_queryset(queryset), self.get_fieldset())
@@ -0,0 +1,91 @@
+from django.db.models import Q
+from rest_framework import filters
+from .search import get_search_backend
+from .serializers import ProductFilterSerializer
+
+
+def category_filter(category):
+    """
+    Return the condition of products in any of the categories, all products when empty.
+    """
+    return Q(category__in=category) if category else Q()
+
+
+def price_filter(min_price=None, max_price=None):
+    """
+    Return the condition of products priced from `min_price` to `max_price` inclusive.
+    """
+    condition = Q()
+    if min_price is not None:
+        condition &= Q(price__gte=min_price)
+    if max_price is not None:
+        condition &= Q(price__lte=max_price)
+    return condition
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Search filter backed by the product full-text index instead of `icontains` scans.
+
+    Terms, numbers included, are matched as prefixes against product name,
+    category name and description, `price:` terms select price ranges (see
+    `shop.search.parse_price_term`). Unless the client asks for a different
+    ordering, the results are sorted by relevance. Only the best
+    `PRODUCT_SEARCH_MAX_RESULTS` matches are returned.
+    """
+
+    search_description = (
+        "Terms matched as prefixes of the name, category and description, "
+        "`price:12` or `price:10-20` terms select prices."
+    )
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        return get_search_backend().search(search_terms, queryset)
+
+
+class ProductFilter(filters.BaseFilterBackend):
+    """
+    Structured product filters: `category` (comma separated primary keys),
+    `min_price` and `max_price`.
+
+    The conditions are served by the indexes on price and on category and
+    price, also combined with the price ordering.
+    """
+
+    def get_filters(self, request):
+        """
+        Return the validated filters of a request.
+
+        Raises:
+        - `ValidationError`: When a parameter is malformed.
+        """
+        serializer = ProductFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def filter_queryset(self, request, queryset, view):
+        params = self.get_filters(request)
+        return queryset.filter(
+            category_filter(params.get("category")),
+            price_filter(params.get("min_price"), params.get("max_price")),
+        )
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "description": description,
+                "schema": {"type": "string"},
+            }
+            for name, description in [
+                ("category", "Comma separated primary keys of product categories."),
+                ("min_price", "Lowest price, inclusive."),
+                ("max_price", "Highest price, inclusive."),
+            ]
+        ]
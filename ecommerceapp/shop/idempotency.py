@@ -0,0 +1,234 @@
+import hashlib
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, RawPostDataException
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being handled."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was used for a different request."
+    default_code = "idempotency_key_mismatch"
+
+
+class IdempotentRequests:
+    """
+    Storage of requests made with an `Idempotency-Key` header.
+
+    A request claims its key by inserting an `IdempotencyKey` row, a single
+    statement which concurrent duplicates can not both pass thanks to the unique
+    constraint. `IdempotentCreateMixin` claims the key, handles the request and
+    stores its response in one transaction, so the created objects are only
+    committed with the response: duplicates sent meanwhile wait for the
+    constraint and get the stored response, which is replayed for
+    `IDEMPOTENCY_KEY_TTL` seconds, and failed requests leave no key behind.
+    Expired keys and keys locked for more than `IDEMPOTENCY_LOCK_TIMEOUT` seconds
+    are taken over by the next request; a request whose key was taken over
+    meanwhile is rolled back instead of completed. Expired rows are deleted by
+    the periodic `purge-idempotency-keys` task.
+    """
+
+    @staticmethod
+    def fingerprint(request):
+        """
+        Return the SHA-256 hex digest of the method, path and body of a request.
+
+        When the body can no longer be read because the form data was parsed,
+        the parsed data is digested instead, fields and files in a fixed order.
+        """
+        digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+        try:
+            digest.update(request.body)
+        except RawPostDataException:
+            for data in (request.POST, request.FILES):
+                for key, values in sorted(data.lists()):
+                    for value in values:
+                        digest.update(f"{key}={len(str(value))}:{value}\n".encode())
+                        for chunk in getattr(value, "chunks", list)():
+                            digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def takeover(now):
+        """
+        Return the condition of keys which a new request may take over, see `can_take_over`.
+        """
+        stale = now - timezone.timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        return Q(expires_at__lte=now) | Q(status_code__isnull=True, locked_at__lt=stale)
+
+    @staticmethod
+    def can_take_over(record, now):
+        stale = now - timezone.timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        return record.expires_at <= now or (
+            record.status_code is None and record.locked_at < stale
+        )
+
+    @classmethod
+    def claim(cls, customer, key, fingerprint, now=None):
+        """
+        Claim an idempotency key for the request being handled.
+
+        Parameters:
+        - `customer` (UserRole): The authenticated user, keys are per user.
+        - `key` (str): The `Idempotency-Key` header.
+        - `fingerprint` (str): The fingerprint of the request.
+        - `now` (datetime): The current time, used in tests.
+
+        Returns:
+        - `Tuple[IdempotencyKey, bool]`: The stored key and whether it was claimed
+          for this request. An unclaimed key belongs to an earlier request.
+        """
+        now = now or timezone.now()
+        values = {
+            "fingerprint": fingerprint,
+            "locked_at": now,
+            "status_code": None,
+            "response": None,
+            "expires_at": now
+            + timezone.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+        }
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    customer_id=customer.pk, key=key, **values
+                )
+            return record, True
+        except IntegrityError:
+            pass
+
+        keys = IdempotencyKey.objects.filter(customer_id=customer.pk, key=key)
+        record = keys.first()
+        if record is None or not cls.can_take_over(record, now):
+            return record, False
+        # concurrent requests taking over the same key race on this update
+        if not keys.filter(cls.takeover(now)).update(**values):
+            return keys.first(), False
+        for field, value in values.items():
+            setattr(record, field, value)
+        return record, True
+
+    @staticmethod
+    def replay(record, fingerprint):
+        """
+        Return the stored response of an earlier request with the same key.
+
+        Raises:
+        - `IdempotencyKeyInUse`: When the earlier request is still being handled.
+        - `IdempotencyKeyMismatch`: When the earlier request was a different one.
+        """
+        if record is None or record.status_code is None:
+            raise IdempotencyKeyInUse()
+        if record.fingerprint != fingerprint:
+            raise IdempotencyKeyMismatch()
+        return HttpResponse(
+            record.response,
+            status=record.status_code,
+            content_type="application/json",
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+    @staticmethod
+    def complete(record, request, response, renderer_context):
+        """
+        Store the response of a successful request for replays.
+
+        The response is stored as rendered by the renderer negotiated for the
+        request, so replays return exactly the same bytes. The browsable API is
+        replayed as JSON, rendered by the default renderer.
+
+        Returns:
+        - `bool`: False when the key was taken over since it was claimed, the
+          request must not be completed then.
+        """
+        renderer, media_type = request.accepted_renderer, request.accepted_media_type
+        if renderer.format != "json":
+            renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+            media_type = renderer.media_type
+        body = renderer.render(response.data, media_type, renderer_context)
+        return bool(
+            IdempotencyKey.objects.filter(
+                pk=record.pk, locked_at=record.locked_at, status_code__isnull=True
+            ).update(
+                locked_at=None,
+                status_code=response.status_code,
+                response=body.decode(),
+            )
+        )
+
+    @staticmethod
+    def purge_expired(batch_size=None, now=None):
+        """
+        Delete a batch of expired keys.
+
+        Returns:
+        - int: The number of keys deleted.
+        """
+        now = now or timezone.now()
+        batch_size = batch_size or settings.IDEMPOTENCY_PURGE_BATCH_SIZE
+        expired_ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        deleted, _ = IdempotencyKey.objects.filter(
+            pk__in=expired_ids, expires_at__lte=now
+        ).delete()
+        return deleted
+
+
+class IdempotentCreateMixin:
+    """
+    Make `POST` requests of a view idempotent when they carry an `Idempotency-Key` header.
+
+    The first request with a key is handled as usual, in a transaction which
+    also stores its response; retries with the same key and body get the stored
+    response with an `Idempotent-Replayed: true` header, without handling the
+    request again. Requests without the header are not affected.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        # before the authentication: the CSRF check of cookie tokens parses form
+        # data, after which the body can not be read any more
+        if request.method == "POST" and request.headers.get(HEADER):
+            self.request_fingerprint = IdempotentRequests.fingerprint(request)
+        super().initial(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().post(request, *args, **kwargs)
+        if not key or len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            raise serializers.ValidationError(
+                {HEADER: ["Must have between 1 and 255 characters."]}
+            )
+
+        fingerprint = self.request_fingerprint
+        with transaction.atomic():
+            record, claimed = IdempotentRequests.claim(request.user, key, fingerprint)
+            if not claimed:
+                return IdempotentRequests.replay(record, fingerprint)
+
+            response = super().post(request, *args, **kwargs)
+            if not status.is_success(response.status_code):
+                # frees the key for a retry
+                transaction.set_rollback(True)
+            elif not IdempotentRequests.complete(
+                record, request, response, self.get_renderer_context()
+            ):
+                # another request took the key over and handles it again
+                raise IdempotencyKeyInUse()
+        return response
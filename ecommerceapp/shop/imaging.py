@@ -0,0 +1,250 @@
+"""
+Image processing of product uploads.
+
+Uploads are stored as they are during the request and a Celery task renders the
+configured variants (`PRODUCT_IMAGE_VARIANTS`) in the background. Uploads larger
+than `PRODUCT_IMAGE_MAX_BYTES` or `PRODUCT_IMAGE_MAX_PIXELS` are rejected before
+their pixel data is decoded.
+"""
+import os
+import uuid
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, Tuple
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+from common.instrumentation import span
+
+VARIANTS_DIRECTORY = "product_variants"
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+
+def rename_upload(upload):
+    """
+    Give an uploaded image a unique name, keeping its extension.
+
+    Parameters:
+    - `upload` (UploadedFile): The uploaded image.
+
+    Returns:
+    - `UploadedFile`: The same file object, renamed.
+    """
+    extension = os.path.splitext(upload.name)[1].lower() or ".jpg"
+    upload.name = f"image_{uuid.uuid4().hex}{extension}"
+    return upload
+
+
+def schedule_variants(product):
+    """
+    Enqueue the rendering of image variants once the current transaction commits.
+
+    Parameters:
+    - `product` (Product): The product whose image was uploaded.
+
+    Returns:
+    - None
+    """
+    from .tasks import generate_product_image_variants
+
+    product_id = product.pk
+    transaction.on_commit(lambda: generate_product_image_variants.delay(product_id))
+
+
+def delete_image_files_on_commit(product):
+    """
+    Delete the stored image, thumbnail and variant files of a product once the
+    current transaction commits.
+
+    Called before the product is saved with a new image: if the save is rolled
+    back, the product still points at its files, so they are kept.
+
+    Parameters:
+    - `product` (Product): The product, with the paths of the files to delete.
+
+    Returns:
+    - None
+    """
+    paths = [
+        path
+        for path in (
+            product.image.name,
+            product.thumbnail.name,
+            *product.image_variants.values(),
+        )
+        if path
+    ]
+
+    def delete_files():
+        for path in paths:
+            default_storage.delete(path)
+
+    transaction.on_commit(delete_files)
+
+
+class ImageTooLargeError(ValueError):
+    """
+    Raised when an image exceeds `PRODUCT_IMAGE_MAX_BYTES` or `PRODUCT_IMAGE_MAX_PIXELS`.
+    """
+
+
+@dataclass
+class ImageProcessingReport:
+    """
+    Memory usage of a single image processing operation.
+
+    `peak_bitmap_bytes` is the largest amount of decoded pixel data held at once,
+    which dominates the memory used by Pillow.
+    """
+
+    source_size: Tuple[int, int] = (0, 0)
+    decoded_size: Tuple[int, int] = (0, 0)
+    peak_bitmap_bytes: int = 0
+    variant_sizes: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+    def track(self, *images):
+        self.peak_bitmap_bytes = max(
+            self.peak_bitmap_bytes, sum(bitmap_bytes(image) for image in images)
+        )
+
+
+def bitmap_bytes(image):
+    """
+    Return the size of the decoded pixel data of an image.
+    """
+    bands = len(image.getbands())
+    return image.width * image.height * bands
+
+
+def check_limits(image, size_in_bytes=None):
+    """
+    Check an opened (not yet decoded) image against the configured limits.
+
+    Only the image header has to be read, so oversized images and decompression
+    bombs are rejected before any pixel data is allocated.
+
+    Parameters:
+    - `image` (Image): Image returned by `Image.open`.
+    - `size_in_bytes` (int): Size of the encoded file, if known.
+
+    Raises:
+    - `ImageTooLargeError`: When a limit is exceeded.
+    """
+    max_bytes = settings.PRODUCT_IMAGE_MAX_BYTES
+    if size_in_bytes is not None and size_in_bytes > max_bytes:
+        raise ImageTooLargeError(
+            f"Image file is too large ({size_in_bytes} bytes, limit {max_bytes})."
+        )
+
+    max_pixels = settings.PRODUCT_IMAGE_MAX_PIXELS
+    if image.width * image.height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is too large ({image.width}x{image.height}, "
+            f"limit {max_pixels} pixels)."
+        )
+
+
+def validate_upload(upload):
+    """
+    Validate the size of an uploaded image without decoding it.
+
+    Parameters:
+    - `upload` (UploadedFile): The uploaded image.
+
+    Raises:
+    - `ImageTooLargeError`: When a limit is exceeded.
+    """
+    position = upload.tell()
+    try:
+        with span("image"), Image.open(upload) as image:
+            check_limits(image, upload.size)
+    finally:
+        upload.seek(position)
+
+
+def fitted_size(size, bounding_box):
+    """
+    Return the size of an image of `size` scaled down to fit `bounding_box`.
+    """
+    scale = min(bounding_box[0] / size[0], bounding_box[1] / size[1], 1)
+    return max(round(size[0] * scale), 1), max(round(size[1] * scale), 1)
+
+
+def render_variants(source, variants, image_format, report=None):
+    """
+    Render resized copies of an image with bounded memory.
+
+    The image is decoded only once. JPEG images are decoded directly at a reduced
+    scale (`Image.draft`) that is still large enough for the largest variant.
+    Variants are then produced from the largest to the smallest by shrinking the
+    same bitmap in place, so the full-resolution image is never copied.
+
+    Parameters:
+    - `source` (File): The original image.
+    - `variants` (Dict[str, Tuple[int, int]]): Bounding boxes by variant name.
+    - `image_format` (str): Output format, e.g. "JPEG" or "WEBP".
+    - `report` (ImageProcessingReport): Optional report filled with memory usage.
+
+    Returns:
+    - `Iterator[Tuple[str, bytes]]`: Encoded variants by name.
+    """
+    ordered = sorted(variants.items(), key=lambda item: -(item[1][0] * item[1][1]))
+
+    with Image.open(source) as image:
+        check_limits(image)
+        if report is None:
+            report = ImageProcessingReport()
+        report.source_size = image.size
+
+        if ordered:
+            image.draft("RGB", fitted_size(image.size, ordered[0][1]))
+        image.load()
+        report.decoded_size = image.size
+        report.track(image)
+
+        working = image
+        if image.mode != "RGB":
+            working = image.convert("RGB")
+            report.track(image, working)
+            image.close()
+
+        for name, bounding_box in ordered:
+            before = bitmap_bytes(working)
+            working.thumbnail(bounding_box)
+            report.peak_bitmap_bytes = max(
+                report.peak_bitmap_bytes, before + bitmap_bytes(working)
+            )
+            report.variant_sizes[name] = working.size
+
+            buffer = BytesIO()
+            working.save(buffer, format=image_format, quality=85)
+            yield name, buffer.getvalue()
+
+
+def store_variants(product, report=None):
+    """
+    Render and store all configured variants of the product image.
+
+    Parameters:
+    - `product` (Product): A product with an uploaded image.
+    - `report` (ImageProcessingReport): Optional report filled with memory usage.
+
+    Returns:
+    - `Dict[str, str]`: Storage paths of the stored variants by name.
+    """
+    image_format = settings.PRODUCT_IMAGE_FORMAT.upper()
+    extension = FORMAT_EXTENSIONS[image_format]
+    unique_id = uuid.uuid4().hex
+
+    stored = {}
+    with product.image.open("rb") as source:
+        for name, content in render_variants(
+            source, settings.PRODUCT_IMAGE_VARIANTS, image_format, report
+        ):
+            stored[name] = default_storage.save(
+                f"{VARIANTS_DIRECTORY}/{name}_{unique_id}.{extension}",
+                ContentFile(content),
+            )
+    return stored
@@ -0,0 +1,315 @@
+import csv
+import json
+from dataclasses import dataclass, field
+from functools import partial
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List
+from django.db import connection, transaction
+from .cache import CatalogCache
+from .models import Product, ProductCategory
+from .search import get_search_backend
+
+FORMATS = ("csv", "jsonl")
+INVALID_UTF8 = "Invalid UTF-8 text."
+
+
+@dataclass
+class ImportReport:
+    """
+    Outcome of a product import.
+
+    Only the first `max_errors` row errors are kept, so the report stays small
+    for files with many invalid rows; `error_count` counts all of them.
+    """
+
+    imported: int = 0
+    error_count: int = 0
+    errors: List[Dict] = field(default_factory=list)
+    max_errors: int = 100
+
+    def add_error(self, line, messages):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": messages})
+
+    def as_dict(self):
+        return {
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def guess_format(filename):
+    """
+    Return the import format matching the extension of a file name, None if unknown.
+    """
+    extension = filename.rsplit(".", 1)[-1].lower()
+    return {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(extension)
+
+
+def decode_lines(stream, invalid_lines):
+    """
+    Decode the lines of a binary file as UTF-8, a byte order mark is skipped.
+
+    Lines which are not valid UTF-8 are decoded with replacement characters and
+    their numbers appended to `invalid_lines`, so the rows holding them can be
+    reported without stopping the import.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        encoding = "utf-8-sig" if line_number == 1 else "utf-8"
+        try:
+            yield line.decode(encoding)
+        except UnicodeDecodeError:
+            invalid_lines.append(line_number)
+            yield line.decode(encoding, errors="replace")
+
+
+def read_rows(stream, file_format):
+    """
+    Parse an uploaded file row by row, without reading it into memory.
+
+    Parameters:
+    - `stream` (BinaryIO): The file, opened in binary mode.
+    - `file_format` (str): `csv` (with a header row) or `jsonl` (one object per line).
+
+    Returns:
+    - `Iterator[Tuple[int, Dict, str]]`: Line numbers, rows and errors; rows which
+      can not be decoded or parsed are yielded as None with the error message.
+    """
+    invalid_lines = []
+    lines = decode_lines(stream, invalid_lines)
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                # the reader starts over at the next line
+                row, message = None, f"Invalid CSV row: {error}."
+            else:
+                message = None
+            # the lines read by the reader since the previous row
+            if invalid_lines:
+                row, message = None, INVALID_UTF8
+                invalid_lines.clear()
+            # DictReader only updates its line_num after a parsed row
+            yield reader.reader.line_num, row, message
+
+    for line_number, line in enumerate(lines, start=1):
+        if invalid_lines:
+            invalid_lines.clear()
+            yield line_number, None, INVALID_UTF8
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, "Invalid JSON object."
+
+
+class ProductImporter:
+    """
+    Streaming bulk import of products, keyed by their `sku`.
+
+    Rows are validated one by one and collected into batches of `batch_size`,
+    each upserted with one `INSERT ... ON CONFLICT (sku) DO UPDATE` statement run
+    with `executemany` (like `SalesRollup.record_order_items`, building model
+    instances would cost more than the database work): products with a new SKU
+    are created, the name, description, price and category of existing ones are
+    replaced. Category names are resolved through a map loaded once, missing
+    categories are created. Invalid rows, including rows which are not valid
+    UTF-8 or have unknown fields, are reported and skipped, the other rows are
+    still imported.
+
+    Imported products are reindexed for search batch by batch. The cached list
+    responses are invalidated once at the end, the cached details of the
+    imported products per batch. Memory use does not depend on the file size.
+    """
+
+    imported_fields = ("sku", "name", "description", "price", "category")
+    # the ids of exported files, products are matched by sku
+    ignored_fields = ("id",)
+    max_price = Decimal(10) ** (
+        Product._meta.get_field("price").max_digits
+        - Product._meta.get_field("price").decimal_places
+    )
+
+    def __init__(self, batch_size=1000, max_errors=100):
+        self.batch_size = batch_size
+        self.report = ImportReport(max_errors=max_errors)
+        self.upsert_sql, self.default_values = self.build_upsert()
+        self.categories = {}
+        for pk, name in ProductCategory.objects.order_by("-pk").values_list(
+            "pk", "name"
+        ):
+            self.categories[name] = pk
+
+    @classmethod
+    def build_upsert(cls):
+        """
+        Build the upsert statement of a product row, with the model defaults of
+        the fields which are not imported.
+
+        Returns:
+        - `Tuple[str, List]`: The SQL and the values of the default columns.
+        """
+        meta = Product._meta
+        imported = [meta.get_field(name) for name in cls.imported_fields]
+        defaulted = [
+            field
+            for field in meta.concrete_fields
+            if not field.primary_key and field not in imported
+        ]
+        quote = connection.ops.quote_name
+        columns = [quote(field.column) for field in imported + defaulted]
+        # everything but the conflicting sku is replaced
+        updates = [
+            f"{quote(field.column)} = excluded.{quote(field.column)}"
+            for field in imported[1:]
+        ]
+        sql = (
+            f"INSERT INTO {quote(meta.db_table)} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({columns[0]}) DO UPDATE SET {', '.join(updates)}"
+        )
+        default_values = [
+            field.get_db_prep_save(field.get_default(), connection)
+            for field in defaulted
+        ]
+        return sql, default_values
+
+    def run(self, stream, file_format):
+        """
+        Import the products of a CSV or JSON Lines file.
+
+        Parameters:
+        - `stream` (BinaryIO): The file, opened in binary mode.
+        - `file_format` (str): One of `FORMATS`.
+
+        Returns:
+        - `ImportReport`: Number of imported rows and the row errors.
+        """
+        batch = {}
+        for line, row, error in read_rows(stream, file_format):
+            if error:
+                self.report.add_error(line, {"row": [error]})
+                continue
+            values, errors = self.clean(row)
+            if errors:
+                self.report.add_error(line, errors)
+                continue
+            # the last row of a SKU wins, like in consecutive imports
+            batch[values["sku"]] = values
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = {}
+        self.flush(batch)
+
+        if self.report.imported:
+            transaction.on_commit(CatalogCache.bump_catalog_version)
+        return self.report
+
+    def clean(self, row):
+        """
+        Validate and normalize a row.
+
+        Returns:
+        - `Tuple[Dict, Dict[str, List[str]]]`: The values and the errors by field.
+        """
+        errors = {}
+        values = {}
+        # DictReader collects the values of a CSV row beyond the header under None
+        if None in row:
+            errors["row"] = ["The row has more values than the header has columns."]
+        unknown = [
+            name
+            for name in row
+            if name is not None
+            and name not in self.imported_fields
+            and name not in self.ignored_fields
+        ]
+        if unknown:
+            errors.setdefault("row", []).append(
+                f"Unknown fields: {', '.join(json.dumps(name) for name in unknown)}."
+            )
+        for name, max_length in (("sku", 64), ("name", 64), ("category", 255)):
+            value = str(row.get(name) or "").strip()
+            if not value:
+                errors[name] = ["This field is required."]
+            elif len(value) > max_length:
+                errors[name] = [
+                    f"Ensure this field has no more than {max_length} characters."
+                ]
+            values[name] = value
+        values["description"] = str(row.get("description") or "")
+
+        try:
+            price = Decimal(str(row.get("price", "")).strip())
+            if not price.is_finite() or price.as_tuple().exponent < -2:
+                raise InvalidOperation
+            if not 0 <= price < self.max_price:
+                errors["price"] = [
+                    f"Ensure this value is between 0 and {self.max_price}."
+                ]
+            values["price"] = price
+        except InvalidOperation:
+            errors["price"] = [
+                "A valid number with at most 2 decimal places is required."
+            ]
+        return values, errors
+
+    def resolve_categories(self, names):
+        """
+        Return the primary keys of categories by name, creating the missing ones.
+        """
+        missing = {name for name in names if name not in self.categories}
+        if missing:
+            for category in ProductCategory.objects.bulk_create(
+                [ProductCategory(name=name) for name in sorted(missing)]
+            ):
+                self.categories[category.name] = category.pk
+        return self.categories
+
+    def flush(self, batch):
+        """
+        Upsert a batch of cleaned rows by SKU and reindex them.
+        """
+        if not batch:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            categories = self.resolve_categories(
+                {values["category"] for values in batch.values()}
+            )
+            cursor.executemany(
+                self.upsert_sql,
+                [
+                    (
+                        sku,
+                        values["name"],
+                        values["description"],
+                        values["price"],
+                        categories[values["category"]],
+                        *self.default_values,
+                    )
+                    for sku, values in batch.items()
+                ],
+            )
+            # the upsert does not return the ids of updated rows
+            product_ids = list(
+                Product.objects.filter(sku__in=batch).values_list("pk", flat=True)
+            )
+            get_search_backend().index_products(product_ids)
+            # once committed, cached details of the old rows must not be served
+            transaction.on_commit(
+                partial(CatalogCache.bump_product_versions, product_ids)
+            )
+
+        self.report.imported += len(batch)
@@ -0,0 +1,366 @@
+import random
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+from .models import Product, ProductStockShard, StockReservation
+
+
+class Inventory:
+    """
+    Contention-safe stock levels.
+
+    Stock is never read, changed in Python and written back: every change is a
+    conditional `UPDATE ... SET stock = stock - n WHERE stock >= n`, so concurrent
+    orders can not sell the same units twice and the row is locked only for the
+    duration of the statement. All plain products of an order are decremented
+    with a single statement.
+
+    Products with `stock_shards` keep their stock in that many
+    `ProductStockShard` rows. An order takes its units from a random shard and
+    tries the others when it runs short, so concurrent orders of a very hot
+    product rarely wait for each other (on databases locking rows; SQLite locks
+    the whole database for every write anyway).
+
+    Products with a `stock` of None and no shards are not tracked and never run
+    out of stock.
+    """
+
+    product_fields = ("id", "stock", "stock_shards")
+
+    @staticmethod
+    def is_tracked(product):
+        return bool(product.stock_shards) or product.stock is not None
+
+    @staticmethod
+    def count_units(lines):
+        """
+        Sum up the quantities of order lines by product.
+
+        Parameters:
+        - `lines` (Iterable[Dict[str, int]]): Lines with `product` and `quantity`.
+
+        Returns:
+        - `Counter`: Quantities by product primary key.
+        """
+        units = Counter()
+        for line in lines:
+            units[line["product"]] += line["quantity"]
+        return units
+
+    @staticmethod
+    def quantity_by_product(quantities):
+        """
+        Return an expression evaluating to the quantity of the product of each row.
+        """
+        return Case(
+            *[
+                When(pk=product_id, then=Value(quantity))
+                for product_id, quantity in quantities.items()
+            ],
+            output_field=PositiveIntegerField(),
+        )
+
+    @classmethod
+    def take(cls, quantities, products):
+        """
+        Take units of the tracked products out of stock.
+
+        Must be called inside a transaction, which has to be rolled back when
+        the units are not available (the `ValidationError` does that when it
+        leaves `transaction.atomic`).
+
+        Parameters:
+        - `quantities` (Dict[int, int]): Units by product primary key.
+        - `products` (Dict[int, Product]): The products, with `product_fields` loaded.
+
+        Returns:
+        - None
+
+        Raises:
+        - `ValidationError`: When any of the products has not enough units in stock.
+        """
+        plain, sharded = {}, {}
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            if product.stock_shards:
+                sharded[product_id] = quantity
+            elif product.stock is not None:
+                plain[product_id] = quantity
+
+        sold_out = cls.take_plain(plain) if plain else []
+        for product_id, quantity in sharded.items():
+            if not cls.take_sharded(products[product_id], quantity):
+                sold_out.append(product_id)
+
+        if sold_out:
+            raise serializers.ValidationError(
+                {
+                    "products": [
+                        f'Product "{product_id}" is out of stock.'
+                        for product_id in sorted(sold_out)
+                    ]
+                }
+            )
+
+    @classmethod
+    def take_plain(cls, quantities):
+        """
+        Decrement the `stock` of products with a single conditional `UPDATE`.
+
+        Returns:
+        - `List[int]`: The products without enough units, nothing is taken then.
+        """
+        with transaction.atomic():
+            needed = cls.quantity_by_product(quantities)
+            updated = Product.objects.filter(
+                pk__in=quantities, stock__gte=needed
+            ).update(stock=F("stock") - needed)
+            if updated == len(quantities):
+                return []
+            # undo the decrements of the other products to tell which ran short
+            transaction.set_rollback(True)
+
+        return [
+            product_id
+            for product_id, stock in Product.objects.filter(
+                pk__in=quantities
+            ).values_list("pk", "stock")
+            if stock is None or stock < quantities[product_id]
+        ]
+
+    @staticmethod
+    def take_sharded(product, quantity):
+        """
+        Take units of a product with sharded stock.
+
+        The units are taken from one shard when possible, starting at a random
+        one, otherwise they are collected from all shards.
+
+        Returns:
+        - bool: Whether the units were available.
+        """
+        shards = ProductStockShard.objects.filter(product_id=product.pk)
+        first = random.randrange(product.stock_shards)
+        for offset in range(product.stock_shards):
+            shard = (first + offset) % product.stock_shards
+            if shards.filter(shard=shard, stock__gte=quantity).update(
+                stock=F("stock") - quantity
+            ):
+                return True
+
+        with transaction.atomic():
+            remaining = quantity
+            for shard in shards.select_for_update().filter(stock__gt=0):
+                taken = min(shard.stock, remaining)
+                # the shard may have been decremented since it was read
+                remaining -= taken * shards.filter(
+                    pk=shard.pk, stock__gte=taken
+                ).update(stock=F("stock") - taken)
+                if not remaining:
+                    return True
+            transaction.set_rollback(True)
+        return False
+
+    @classmethod
+    def restock(cls, quantities):
+        """
+        Put units of products back into stock, e.g. of released reservations.
+
+        Parameters:
+        - `quantities` (Dict[int, int]): Units by product primary key.
+
+        Returns:
+        - None
+        """
+        products = Product.objects.only(*cls.product_fields).in_bulk(quantities)
+        plain = {
+            product_id: quantity
+            for product_id, quantity in quantities.items()
+            if product_id in products and not products[product_id].stock_shards
+        }
+        if plain:
+            Product.objects.filter(pk__in=plain, stock__isnull=False).update(
+                stock=F("stock") + cls.quantity_by_product(plain)
+            )
+        for product_id, quantity in quantities.items():
+            if product_id in products and products[product_id].stock_shards:
+                ProductStockShard.objects.filter(
+                    product_id=product_id,
+                    shard=random.randrange(products[product_id].stock_shards),
+                ).update(stock=F("stock") + quantity)
+
+    @staticmethod
+    def available(product):
+        """
+        Return the units of a product in stock, None when its stock is not tracked.
+        """
+        if not product.stock_shards:
+            return Product.objects.filter(pk=product.pk).values_list(
+                "stock", flat=True
+            )[0]
+        return sum(
+            ProductStockShard.objects.filter(product_id=product.pk).values_list(
+                "stock", flat=True
+            )
+        )
+
+    @staticmethod
+    def split(stock, shards):
+        """
+        Split a stock level evenly over a number of shards.
+        """
+        base, extra = divmod(stock, shards)
+        return [base + (shard < extra) for shard in range(shards)]
+
+    @classmethod
+    def set_stock(cls, product, stock, shards=None):
+        """
+        Replace the stock level of a product, optionally changing its number of shards.
+
+        Parameters:
+        - `product` (Product): The product.
+        - `stock` (int): Units in stock, None to stop tracking the stock.
+        - `shards` (int): Number of stock shards, 0 to keep the stock on the
+          product row. Defaults to the current number.
+
+        Returns:
+        - None
+        """
+        shards = product.stock_shards if shards is None else shards
+        if stock is None:
+            shards = 0
+
+        with transaction.atomic():
+            ProductStockShard.objects.filter(product_id=product.pk).delete()
+            if shards:
+                ProductStockShard.objects.bulk_create(
+                    ProductStockShard(product_id=product.pk, shard=shard, stock=units)
+                    for shard, units in enumerate(cls.split(stock, shards))
+                )
+            product.stock = None if shards else stock
+            product.stock_shards = shards
+            Product.objects.filter(pk=product.pk).update(
+                stock=product.stock, stock_shards=shards
+            )
+
+
+class StockReservations:
+    """
+    Time-limited holds on stock during checkout.
+
+    Reserved units are taken out of stock right away (see `Inventory.take`) and
+    stored as `StockReservation` rows sharing a token. An order created with the
+    token consumes the rows instead of taking the units again. Reservations not
+    used within `STOCK_RESERVATION_TTL` seconds are put back into stock by the
+    periodic `release-expired-stock-reservations` task, in batches claimed with
+    a single conditional `UPDATE` like `PaymentReminderScheduler.claim_due`.
+    """
+
+    @staticmethod
+    def hold(customer, quantities, ttl=None):
+        """
+        Store the reservation of units already taken out of stock.
+
+        Parameters:
+        - `customer` (UserRole): The customer the units are held for.
+        - `quantities` (Dict[int, int]): Units by product primary key.
+        - `ttl` (int): Lifetime in seconds, defaults to `STOCK_RESERVATION_TTL`.
+
+        Returns:
+        - `Tuple[UUID, datetime]`: The token and the expiry time of the reservation.
+        """
+        token = uuid.uuid4()
+        expires_at = timezone.now() + timezone.timedelta(
+            seconds=ttl or settings.STOCK_RESERVATION_TTL
+        )
+        StockReservation.objects.bulk_create(
+            StockReservation(
+                token=token,
+                customer_id=customer.pk,
+                product_id=product_id,
+                quantity=quantity,
+                expires_at=expires_at,
+            )
+            for product_id, quantity in quantities.items()
+        )
+        return token, expires_at
+
+    @staticmethod
+    def consume(token, customer):
+        """
+        Delete the live rows of a reservation, handing their units over to the caller.
+
+        Expired or released reservations hold nothing, the units are then taken
+        from the stock like without a reservation.
+
+        Returns:
+        - `Counter`: Reserved units by product primary key.
+        """
+        rows = list(
+            StockReservation.objects.filter(
+                token=token,
+                customer_id=customer.pk,
+                release_token__isnull=True,
+                expires_at__gt=timezone.now(),
+            ).values_list("pk", "product_id", "quantity")
+        )
+        if not rows:
+            return Counter()
+
+        deleted, _ = StockReservation.objects.filter(
+            pk__in=[pk for pk, _, _ in rows], release_token__isnull=True
+        ).delete()
+        if deleted != len(rows):
+            raise serializers.ValidationError(
+                {"reservation": ["The reservation was released meanwhile."]}
+            )
+
+        held = Counter()
+        for _, product_id, quantity in rows:
+            held[product_id] += quantity
+        return held
+
+    @staticmethod
+    def expired(now):
+        return StockReservation.objects.filter(
+            release_token__isnull=True, expires_at__lte=now
+        )
+
+    @classmethod
+    def release_expired(cls, batch_size=None, now=None):
+        """
+        Put the units of a batch of expired reservations back into stock.
+
+        Parameters:
+        - `batch_size` (int): Maximum number of reservation rows, defaults to
+          `STOCK_RESERVATION_BATCH_SIZE`.
+        - `now` (datetime): The current time, used in tests.
+
+        Returns:
+        - int: The number of reservation rows released.
+        """
+        now = now or timezone.now()
+        batch_size = batch_size or settings.STOCK_RESERVATION_BATCH_SIZE
+        token = uuid.uuid4()
+
+        with transaction.atomic():
+            candidate_ids = list(
+                cls.expired(now)
+                .order_by("expires_at")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not candidate_ids:
+                return 0
+            cls.expired(now).filter(pk__in=candidate_ids).update(release_token=token)
+
+            released = StockReservation.objects.filter(release_token=token)
+            units = Counter()
+            for product_id, quantity in released.values_list("product_id", "quantity"):
+                units[product_id] += quantity
+            Inventory.restock(units)
+            count, _ = released.delete()
+        return count
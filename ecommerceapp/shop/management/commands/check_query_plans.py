@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.query_plans import QueryPlanChecker
+
+
+class Command(BaseCommand):
+    """
+    Explain the queries of the hot paths and fail on full table scans.
+
+    Every hot path (see `shop.query_plans.get_hot_paths`) is executed in a
+    rolled back transaction and each of its queries is explained with
+    `EXPLAIN QUERY PLAN`. The command fails when a query scans a table with
+    more than `--max-scan-rows` rows, so run it against a database of
+    realistic size (e.g. filled by `seed_shop`).
+
+    Usage:
+    ```
+    python manage.py check_query_plans --max-scan-rows 1000
+    ```
+    """
+
+    help = "Fail when a hot query scans a table above a row threshold."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-scan-rows",
+            type=int,
+            default=1000,
+            help="Largest table which may be scanned in full.",
+        )
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        checker = QueryPlanChecker(options["database"], options["max_scan_rows"])
+        try:
+            reports = checker.check()
+        except NotImplementedError as e:
+            raise CommandError(str(e))
+
+        failures = 0
+        for report in reports:
+            self.stdout.write(f"[{report.path}] {report.sql}")
+            for detail in report.plan:
+                self.stdout.write(f"    {detail}")
+            for table, rows in report.scans:
+                failures += 1
+                self.stdout.write(
+                    self.style.ERROR(f"    full scan of {table} ({rows} rows)")
+                )
+
+        if failures:
+            raise CommandError(f"{failures} full table scans in hot queries.")
+        self.stdout.write(self.style.SUCCESS(f"{len(reports)} queries use indexes."))
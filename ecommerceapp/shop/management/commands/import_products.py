@@ -0,0 +1,50 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from shop.importing import FORMATS, ProductImporter, guess_format
+
+
+class Command(BaseCommand):
+    """
+    Import products from a CSV or JSON Lines file, keyed by SKU.
+
+    The file needs `sku`, `name`, `price` and `category` (name) columns and may
+    have a `description`. Existing products with the same SKU are updated.
+
+    Usage:
+    ```
+    python manage.py import_products catalog.csv --batch-size 2000
+    ```
+    """
+
+    help = "Create or update products from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Format of the file, guessed from its extension by default.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or guess_format(options["path"])
+        if file_format is None:
+            raise CommandError("Unknown file format, pass --format.")
+
+        started = time.perf_counter()
+        importer = ProductImporter(batch_size=options["batch_size"])
+        with open(options["path"], "rb") as stream:
+            report = importer.run(stream, file_format)
+        elapsed = time.perf_counter() - started
+
+        for error in report.errors:
+            self.stderr.write(f"Line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.imported} products in {elapsed:.1f} s "
+                f"({report.imported / max(elapsed, 1e-9):.0f} rows/s), "
+                f"{report.error_count} invalid rows skipped."
+            )
+        )
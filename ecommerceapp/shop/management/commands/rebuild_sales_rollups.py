@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from shop.rollups import SalesRollup
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the `ProductSalesDaily` rollup table from the order history.
+
+    Usage:
+    ```
+    python manage.py rebuild_sales_rollups
+    ```
+    """
+
+    help = "Rebuild the daily product sales rollups from all orders."
+
+    def handle(self, *args, **options):
+        written = SalesRollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily sales rows."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the product search index from the `Product` table.
+
+    Usage:
+    ```
+    python manage.py rebuild_search_index
+    ```
+    """
+
+    help = "Rebuild the product full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Database alias to rebuild the index for.",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild(using=options["database"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Search index rebuilt ({type(backend).__name__}).")
+        )
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from shop.cache import CatalogCache
+from shop.rollups import SalesRollup
+from shop.search import get_search_backend
+from shop.seeding import SeedOptions, ShopSeeder
+
+
+class Command(BaseCommand):
+    """
+    Generate synthetic categories, products, customers and orders for load testing.
+
+    Product popularity follows a Zipf distribution and order dates are spread
+    over the last `--days` days with a growth trend and weekly and daily
+    seasonality. The search index and, unless `--skip-rollups` is given, the
+    daily sales rollups are rebuilt afterwards.
+
+    Usage:
+    ```
+    python manage.py seed_shop --products 100000 --orders 3000000 --seed 42
+    ```
+    """
+
+    help = "Generate synthetic shop data in batches."
+
+    def add_arguments(self, parser):
+        defaults = SeedOptions()
+        parser.add_argument("--categories", type=int, default=defaults.categories)
+        parser.add_argument("--products", type=int, default=defaults.products)
+        parser.add_argument("--customers", type=int, default=defaults.customers)
+        parser.add_argument("--orders", type=int, default=defaults.orders)
+        parser.add_argument(
+            "--max-lines",
+            type=int,
+            default=defaults.max_lines,
+            help="Maximum number of lines of an order, the mean is about half of it.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=defaults.days,
+            help="Number of days the order dates are spread over.",
+        )
+        parser.add_argument(
+            "--growth",
+            type=float,
+            default=defaults.growth,
+            help="Growth of the daily order volume over the period, 1 doubles it.",
+        )
+        parser.add_argument(
+            "--zipf-exponent",
+            type=float,
+            default=defaults.zipf_exponent,
+            help="Skew of the product popularity, 0 makes it uniform.",
+        )
+        parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+        parser.add_argument(
+            "--images",
+            action="store_true",
+            help="Give products a placeholder image, one per category.",
+        )
+        parser.add_argument(
+            "--skip-rollups",
+            action="store_true",
+            help="Do not rebuild the daily sales rollups (see rebuild_sales_rollups).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=defaults.seed,
+            help="Random seed, the same seed generates the same data.",
+        )
+
+    def handle(self, *args, **options):
+        seed_options = SeedOptions(
+            **{
+                name: options[name]
+                for name in SeedOptions.__dataclass_fields__
+                if name in options
+            }
+        )
+        counts = ShopSeeder(seed_options, log=self.stdout.write).run()
+
+        self.stdout.write("Rebuilding the search index.")
+        get_search_backend().rebuild()
+        CatalogCache.bump_catalog_version()
+        if not options["skip_rollups"]:
+            self.stdout.write("Rebuilding the daily sales rollups.")
+            SalesRollup.rebuild()
+
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}."))
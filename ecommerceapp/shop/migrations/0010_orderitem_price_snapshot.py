@@ -0,0 +1,54 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_price_snapshots(apps, schema_editor):
+    """
+    Fill in the price snapshot of existing order items.
+
+    The price at the time of the order was not stored, the current price of the
+    product is the best estimate.
+    """
+    OrderItem = apps.get_model("shop", "OrderItem")
+    Product = apps.get_model("shop", "Product")
+    order_items = OrderItem.objects.using(schema_editor.connection.alias)
+
+    order_items.filter(unit_price__isnull=True).update(
+        unit_price=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+        )
+    )
+    order_items.filter(line_total__isnull=True).update(
+        line_total=F("unit_price") * F("quantity")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0009_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="line_total",
+            field=models.DecimalField(decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.RunPython(backfill_price_snapshots, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="line_total",
+            field=models.DecimalField(decimal_places=2, max_digits=14),
+        ),
+    ]
@@ -0,0 +1,57 @@
+import sqlite3
+
+from django.db import migrations
+
+
+# the DDL is a copy of `shop.search.SQLiteFTSBackend.create_index` at the time of
+# this migration, later changes of the backend need their own migration
+TABLE = "shop_product_fts"
+
+
+def sqlite_supports_fts5():
+    try:
+        with sqlite3.connect(":memory:") as probe:
+            probe.execute("CREATE VIRTUAL TABLE probe USING fts5(content)")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Create and populate the FTS5 table of the product search.
+
+    Searches used to create it on first use, also on replicas; a table created
+    that way is replaced.
+    """
+    # other databases use the in-memory index
+    if schema_editor.connection.vendor != "sqlite" or not sqlite_supports_fts5():
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "name, category, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, name, category, description) "
+            "SELECT p.id, p.name, c.name, p.description "
+            "FROM shop_product p JOIN shop_productcategory c ON c.id = p.category_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0011_product_sku"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
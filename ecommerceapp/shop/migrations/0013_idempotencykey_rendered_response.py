@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0012_product_search_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="idempotencykey",
+            name="response",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -21,6 +21,8 @@ class Product(models.Model):
     """
 
     name = models.CharField(max_length=64)
+    # stock keeping unit of the seller, the key of bulk imports (`shop.importing`)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE)
@@ -28,10 +30,49 @@ class Product(models.Model):
     thumbnail = models.ImageField(
         upload_to="product_thumbnails/", null=True, blank=True
     )
+    # storage paths of the resized copies of `image` by variant name,
+    # filled in by the `generate-product-image-variants` Celery task
+    image_variants = models.JSONField(default=dict, blank=True)
+    # units in stock, None when the stock is not tracked; products with
+    # `stock_shards` keep their stock in `ProductStockShard` rows instead
+    # (see `shop.inventory.Inventory`)
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # price ordering of the product list (the rowid tiebreaker is implicit)
+            models.Index(fields=["price"], name="product_price_idx"),
+            models.Index(fields=["name"], name="product_name_idx"),
+            # category filter combined with price ordering or range
+            models.Index(
+                fields=["category", "price"], name="product_category_price_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Save the product without its stock fields, unless it is new or they are
+        listed in `update_fields`.
+
+        The stock is only changed by `shop.inventory.Inventory` with conditional
+        updates, writing back a stock level loaded earlier would undo the orders
+        placed in the meantime.
+        """
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.attname not in ("stock", "stock_shards")
+            ]
+        super().save(*args, **kwargs)
+
 
 class Order(models.Model):
     """
@@ -47,6 +88,9 @@ class Order(models.Model):
         max_digits=10, decimal_places=2, null=True, blank=True
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["order_date"], name="order_date_idx")]
+
     def __str__(self):
         return f"Order {self.id} - Customer {self.customer}"
 
@@ -59,6 +103,179 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # price of the product when the order was placed, and times the quantity,
+    # so totals and revenue do not change with later price changes
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    line_total = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            # covers the product lookups of order items loaded by order
+            models.Index(
+                fields=["order", "product"], name="orderitem_order_product_idx"
+            )
+        ]
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
+
+    def save(self, *args, **kwargs):
+        """
+        Save the order item, taking the price snapshot from the product if it is not set.
+        """
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        if self.line_total is None:
+            self.line_total = self.unit_price * self.quantity
+        super().save(*args, **kwargs)
+
+
+class ProductSalesDaily(models.Model):
+    """
+    Model representing the sales of a single product on a single day.
+
+    Rows are maintained incrementally by `shop.rollups.SalesRollup` when orders
+    are created and can be rebuilt from the order history with the
+    `rebuild_sales_rollups` management command.
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "product"], name="unique_product_sales_day"
+            )
+        ]
+        indexes = [
+            # covers the statistics query, which only reads these columns
+            models.Index(
+                fields=["day", "product", "order_count"],
+                name="sales_daily_statistics_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.day}: {self.units}"
+
+
+class PaymentReminder(models.Model):
+    """
+    Model representing a pending payment reminder email of an order.
+
+    Reminders are stored when orders are created and sent by the periodic
+    `send-payment-reminders` Celery beat task once `due_at` has passed (see
+    `shop.reminders.PaymentReminderScheduler`).
+    """
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE)
+    due_at = models.DateTimeField()
+    # set while a worker is sending the reminder, stale claims are taken over
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.UUIDField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["due_at"],
+                condition=models.Q(sent_at__isnull=True),
+                name="payment_reminder_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"Payment reminder of order {self.order_id} - {self.due_at}"
+
+
+class ProductStockShard(models.Model):
+    """
+    Model representing a part of the stock of a product.
+
+    The stock of very frequently ordered products is split over several rows, so
+    concurrent orders decrement different rows instead of all waiting for the
+    lock of the product row.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_shard_set"
+    )
+    shard = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "shard"], name="unique_product_stock_shard"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - shard {self.shard}: {self.stock}"
+
+
+class StockReservation(models.Model):
+    """
+    Model representing units of a product held for a customer's checkout.
+
+    The units are taken from the stock when the reservation is made and either
+    become part of the order created with the reservation `token`, or are put
+    back by the periodic `release-expired-stock-reservations` Celery beat task
+    once `expires_at` has passed (see `shop.inventory.StockReservations`).
+    """
+
+    token = models.UUIDField()
+    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    # set by the sweeper releasing the reservation
+    release_token = models.UUIDField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["token"], name="stock_reservation_token_idx"),
+            models.Index(fields=["expires_at"], name="stock_reservation_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} until {self.expires_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Model representing a request made with an `Idempotency-Key` header.
+
+    The row is inserted before the request is handled, so concurrent duplicates
+    collide on the unique constraint, and completed with the response replayed
+    to later duplicates until `expires_at` (see
+    `shop.idempotency.IdempotentCreateMixin`).
+    """
+
+    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # SHA-256 of the method, path and body of the request
+    fingerprint = models.CharField(max_length=64)
+    # set while the request is handled, stale locks are taken over
+    locked_at = models.DateTimeField(null=True, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # rendered body of the response, replayed as is
+    response = models.TextField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["customer", "key"], name="unique_customer_idempotency_key"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_key_expiry_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id} - {self.key}"
@@ -0,0 +1,255 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination with opaque cursors.
+
+    Instead of `COUNT(*)` and `OFFSET`, every page is selected with a
+    `WHERE (a, b, pk) > (...)` condition built from the last row of the previous
+    page, so deep pages cost the same as the first one. The ordering of the
+    queryset (e.g. the one applied by `OrderingFilter` or by the search filter)
+    is followed and the primary key is appended as a tiebreaker (in the
+    direction of the last ordering field), which makes the order total and the
+    pages stable.
+
+    Query parameters:
+    - `cursor` (str): Opaque cursor taken from the `next` or `previous` link.
+    - `page_size` (int): Number of results per page, capped at `max_page_size`.
+
+    Returns:
+    - `Response`: {"next": (str) URL, "previous": (str) URL, "results": (list) page}
+    """
+
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    # Used when neither the view nor the filters ordered the queryset.
+    default_ordering = ("pk",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async variant of `paginate_queryset` for views using the async ORM.
+        """
+        page_queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([instance async for instance in page_queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Return the unevaluated queryset of the requested page plus one row.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        # values of related fields are selected with the page, reading them from
+        # the relation would cost a query, which async views cannot even make
+        self.annotations = {
+            field.lstrip("-"): f"cursor_value_{index}"
+            for index, field in enumerate(self.ordering)
+            if "__" in field
+        }
+        if self.annotations:
+            queryset = queryset.annotate(
+                **{alias: F(name) for name, alias in self.annotations.items()}
+            )
+
+        self.fields = self.get_ordering_fields(queryset)
+        cursor = self.decode_cursor(request)
+        self.reverse = False
+        self.has_cursor = cursor is not None
+        if cursor is not None:
+            values, self.reverse = cursor
+            queryset = queryset.filter(self.build_seek_filter(values, self.reverse))
+
+        order_by = self.ordering if not self.reverse else self.invert(self.ordering)
+        return queryset.order_by(*order_by)[: self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        Return the ordering of the queryset with the primary key as a tiebreaker.
+        """
+        ordering = [
+            field
+            for field in queryset.query.order_by
+            if isinstance(field, str) and field != "?"
+        ] or list(self.default_ordering)
+
+        pk_names = {"pk", "id", queryset.model._meta.pk.name}
+        if not any(field.lstrip("-") in pk_names for field in ordering):
+            # Following the direction of the last field lets a descending
+            # ordering be served by reading an index backwards.
+            ordering.append("-pk" if ordering[-1].startswith("-") else "pk")
+        return ordering
+
+    def get_ordering_fields(self, queryset):
+        """
+        Return the model fields (or annotation output fields) of the ordering.
+        """
+        fields = []
+        for field in self.ordering:
+            name = field.lstrip("-")
+            if name in queryset.query.annotations:
+                fields.append(queryset.query.annotations[name].output_field)
+                continue
+            model = queryset.model
+            for part in name.split("__"):
+                model_field = (
+                    model._meta.pk if part == "pk" else model._meta.get_field(part)
+                )
+                model = model_field.related_model
+            fields.append(model_field)
+        return fields
+
+    @staticmethod
+    def invert(ordering):
+        return [
+            field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+        ]
+
+    def build_seek_filter(self, values, reverse):
+        """
+        Build the condition selecting rows after (or, in reverse, before) `values`.
+
+        For ordering `(a, -b, pk)` this is
+        `a > va OR (a = va AND b < vb) OR (a = va AND b = vb AND pk > vpk)`.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            lookup = "lt" if descending != reverse else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_value(self, instance, field):
+        """
+        Read an ordering value from an instance, related ones from their annotation.
+        """
+        name = field.lstrip("-")
+        if name in self.annotations:
+            return getattr(instance, self.annotations[name])
+        return getattr(instance, name)
+
+    @staticmethod
+    def serialize_value(value):
+        if isinstance(value, Decimal):
+            return str(value)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+
+    def encode_cursor(self, instance, reverse):
+        payload = {
+            "o": self.ordering,
+            "v": [
+                self.serialize_value(self.get_value(instance, field))
+                for field in self.ordering
+            ],
+            "r": reverse,
+        }
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode()
+        ).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        """
+        Return `(values, reverse)` from the request cursor or None without a cursor.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            ordering, values, reverse = payload["o"], payload["v"], bool(payload["r"])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only valid for the ordering it was issued for.
+        if ordering != self.ordering or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # the values reach the ORM, they must be valid values of their fields
+        try:
+            values = [
+                field.to_python(value) for field, value in zip(self.fields, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None for value in values):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
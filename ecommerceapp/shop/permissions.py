@@ -4,6 +4,9 @@ from rest_framework.permissions import BasePermission
 class IsSellerOrAdmin(BasePermission):
     """
     Custom permission to only allow seller or superuser to access certain endpoints.
+
+    It only reads attributes of the authenticated user and never queries the
+    database, so the async views of `shop.async_views` can call it directly.
     """
 
     def has_permission(self, request, view):
@@ -0,0 +1,305 @@
+"""
+Query plan checks of the hot paths, see the `check_query_plans` management command.
+
+Every hot path is executed for real (views through `APIRequestFactory`, inside
+a transaction which is rolled back) and each captured `SELECT` is explained with
+`EXPLAIN QUERY PLAN`. Following the views themselves instead of hand-written
+copies of their queries keeps the check meaningful as the views change.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from common.mail import render_order_emails
+from users.models import UserRole
+from .models import Order, Product, ProductCategory
+from .reminders import PaymentReminderScheduler
+from .views import (
+    OrderListView,
+    OrderProductsStatisticsView,
+    ProductDetailsView,
+    ProductFacetsView,
+    ProductListView,
+)
+
+# `SCAN table`, `SCAN table AS alias` or `SCAN table USING [COVERING] INDEX name`
+SCAN_PATTERN = re.compile(r"^SCAN (?P<table>\w+)(?: AS \w+)?(?P<index> USING .*)?$")
+INDEX_PATTERN = re.compile(r" USING (?:COVERING )?INDEX (?P<index>\w+)")
+# tables of subqueries are aliased (`"shop_product" U0`), plans name the alias
+ALIAS_PATTERN = re.compile(r'"(?P<table>\w+)" (?:AS )?(?P<alias>U\d+)\b')
+# hot paths run without the response cache and accept the test client host
+CHECK_SETTINGS = {
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+    "ALLOWED_HOSTS": ["*"],
+}
+
+
+@dataclass
+class HotPath:
+    """
+    A code path whose queries have to be served by indexes.
+
+    - `run`: Executes the code path, its queries are captured.
+    - `allowed_scans`: Tables the path may scan regardless of their size, for
+      queries no index can serve (e.g. ordering by a column of a joined table).
+    """
+
+    name: str
+    run: Callable[[], object]
+    allowed_scans: Tuple[str, ...] = ()
+
+
+@dataclass
+class PlanReport:
+    """
+    Plan of a single captured query and the unbounded scans found in it.
+    """
+
+    path: str
+    sql: str
+    plan: List[str]
+    scans: List[Tuple[str, int]] = field(default_factory=list)
+
+
+def call_view(view_class, method="get", data=None, format=None, url_kwargs=None):
+    """
+    Call a view as a superuser and return the response.
+    """
+    factory = APIRequestFactory()
+    request = getattr(factory, method)("/", data, format=format)
+    force_authenticate(request, UserRole(username="plan-check", is_superuser=True))
+    return view_class.as_view()(request, **(url_kwargs or {}))
+
+
+def follow_next_page(view_class, params):
+    """
+    Call a paginated view and then its second page, exercising the seek filter.
+    """
+    response = call_view(view_class, data=params)
+    next_link = response.data.get("next")
+    if next_link:
+        cursor = re.search(r"cursor=([^&]+)", next_link).group(1)
+        call_view(view_class, data={**params, "cursor": cursor})
+
+
+def any_pk(model):
+    return model.objects.values_list("pk", flat=True).first() or 0
+
+
+def any_product_word():
+    name = Product.objects.values_list("name", flat=True).first() or "product"
+    return name.split()[0]
+
+
+def get_hot_paths():
+    """
+    Return the hot paths of the shop.
+    """
+    today = timezone.localdate()
+    page = {"page_size": 2}
+    return [
+        HotPath("product list", lambda: follow_next_page(ProductListView, page)),
+        HotPath(
+            "product list by price",
+            lambda: follow_next_page(ProductListView, {**page, "ordering": "-price"}),
+        ),
+        HotPath(
+            "product list by name",
+            lambda: follow_next_page(ProductListView, {**page, "ordering": "name"}),
+        ),
+        HotPath(
+            "product list by category name",
+            lambda: follow_next_page(
+                ProductListView, {**page, "ordering": "category__name"}
+            ),
+            # sorting by a joined column cannot be served by an index
+            allowed_scans=("shop_product", "shop_productcategory"),
+        ),
+        HotPath(
+            "product search",
+            lambda: follow_next_page(
+                ProductListView, {**page, "search": any_product_word()}
+            ),
+        ),
+        HotPath(
+            "product list by category and price",
+            lambda: follow_next_page(
+                ProductListView,
+                {
+                    **page,
+                    "category": any_pk(ProductCategory),
+                    "min_price": 1,
+                    "max_price": 100,
+                    "ordering": "price",
+                },
+            ),
+        ),
+        HotPath(
+            "product facets",
+            lambda: call_view(ProductFacetsView),
+            # the facets of the whole catalog count every product (from an index)
+            allowed_scans=("shop_product",),
+        ),
+        HotPath(
+            "product facets of a category",
+            lambda: call_view(
+                ProductFacetsView,
+                data={"category": any_pk(ProductCategory), "max_price": 100},
+            ),
+            # the category counts cover all categories
+            allowed_scans=("shop_product",),
+        ),
+        HotPath(
+            "product details",
+            lambda: call_view(ProductDetailsView, url_kwargs={"pk": any_pk(Product)}),
+        ),
+        HotPath("order list", lambda: follow_next_page(OrderListView, page)),
+        HotPath(
+            "order statistics",
+            lambda: call_view(
+                OrderProductsStatisticsView,
+                "post",
+                {
+                    "start_date": today - timezone.timedelta(days=30),
+                    "end_date": today,
+                    "number_of_products": 10,
+                },
+                format="multipart",
+            ),
+        ),
+        HotPath(
+            "order email rendering",
+            lambda: render_order_emails([(any_pk(Order), "confirmation")]),
+        ),
+        HotPath("payment reminder claim", PaymentReminderScheduler.claim_due),
+    ]
+
+
+class QueryPlanChecker:
+    """
+    Explain the queries of hot paths and find full table scans.
+
+    A scan is reported when the scanned table has more than `max_scan_rows`
+    rows. Scans which stop early are not reported: when the query is limited
+    and its rows come out in index order (no temporary B-tree is used for
+    sorting or grouping), only the first rows of the table are read.
+
+    Only SQLite plans are supported.
+    """
+
+    def __init__(self, using="default", max_scan_rows=1000):
+        self.connection = connections[using]
+        self.max_scan_rows = max_scan_rows
+        self.row_counts: Dict[str, int] = {}
+
+    def capture(self, hot_path):
+        """
+        Run a hot path in a rolled back transaction and return its `SELECT` queries.
+        """
+        with transaction.atomic(using=self.connection.alias), override_settings(
+            **CHECK_SETTINGS
+        ), CaptureQueriesContext(self.connection) as context:
+            hot_path.run()
+            transaction.set_rollback(True, using=self.connection.alias)
+        return [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].lstrip().upper().startswith("SELECT")
+        ]
+
+    def explain(self, sql):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def row_count(self, table):
+        if table not in self.row_counts:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+                self.row_counts[table] = cursor.fetchone()[0]
+        return self.row_counts[table]
+
+    @staticmethod
+    def stops_early(sql, plan):
+        limited = re.search(r"\bLIMIT\b", sql, re.IGNORECASE) is not None
+        return limited and not any("TEMP B-TREE" in detail for detail in plan)
+
+    def index_table(self, index):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = %s",
+                [index],
+            )
+            row = cursor.fetchone()
+        return row and row[0]
+
+    def scanned_tables(self, scan, aliases):
+        """
+        Return the tables a `SCAN` of a plan may read.
+
+        Subqueries reuse the same aliases, so an alias may name several tables;
+        the index of the scan, if any, tells which one.
+        """
+        name = scan["table"]
+        if name not in aliases:
+            return [name]
+        index = INDEX_PATTERN.match(scan["index"] or "")
+        table = index and self.index_table(index["index"])
+        return [table] if table else sorted(aliases[name])
+
+    def unbounded_scans(self, sql, plan, allowed_scans=()):
+        """
+        Return the tables scanned by a plan with their row counts.
+
+        A scanned alias naming several tables counts as a scan of the largest one
+        which is not allowed.
+        """
+        if self.stops_early(sql, plan):
+            return []
+        aliases = {}
+        for match in ALIAS_PATTERN.finditer(sql):
+            aliases.setdefault(match["alias"], set()).add(match["table"])
+        scans = []
+        for detail in plan:
+            match = SCAN_PATTERN.match(detail)
+            if not match:
+                continue
+            tables = [
+                table
+                for table in self.scanned_tables(match, aliases)
+                # the schema table is tiny and cached by SQLite
+                if table not in allowed_scans and not table.startswith("sqlite_")
+            ]
+            if not tables:
+                continue
+            rows, table = max((self.row_count(table), table) for table in tables)
+            if rows > self.max_scan_rows:
+                scans.append((table, rows))
+        return scans
+
+    def check(self, hot_paths=None):
+        """
+        Explain every query of the hot paths.
+
+        Returns:
+        - `List[PlanReport]`: Plans of all captured queries.
+        """
+        if self.connection.vendor != "sqlite":
+            raise NotImplementedError("Only SQLite query plans can be checked.")
+
+        reports = []
+        for hot_path in hot_paths or get_hot_paths():
+            for sql in self.capture(hot_path):
+                plan = self.explain(sql)
+                reports.append(
+                    PlanReport(
+                        path=hot_path.name,
+                        sql=sql,
+                        plan=plan,
+                        scans=self.unbounded_scans(sql, plan, hot_path.allowed_scans),
+                    )
+                )
+        return reports
@@ -0,0 +1,109 @@
+import uuid
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import PaymentReminder
+
+
+class PaymentReminderScheduler:
+    """
+    Database-backed scheduling of payment reminder emails.
+
+    Instead of parking one far-future ETA task per order in the broker, every
+    reminder is stored as a `PaymentReminder` row. The periodic
+    `send-payment-reminders` task claims due reminders in batches with a single
+    conditional `UPDATE`, sends them and marks them as sent, so the broker only
+    ever holds the periodic task itself. A claim which was not completed within
+    `PAYMENT_REMINDER_CLAIM_TIMEOUT` seconds (e.g. the worker died) is taken
+    over by the next run.
+    """
+
+    @staticmethod
+    def due_at(order):
+        """
+        Return the time at which the payment reminder of an order is due.
+        """
+        return order.payment_due_date - timezone.timedelta(
+            seconds=settings.PAYMENT_REMINDER_LEAD_TIME
+        )
+
+    @classmethod
+    def schedule(cls, orders):
+        """
+        Store payment reminders of orders. Orders which already have one are skipped.
+
+        Parameters:
+        - `orders` (List[Order]): The created orders.
+
+        Returns:
+        - None
+        """
+        PaymentReminder.objects.bulk_create(
+            [
+                PaymentReminder(order=order, due_at=cls.due_at(order))
+                for order in orders
+            ],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def claimable(now):
+        """
+        Return the reminders which are due and not claimed by a running worker.
+        """
+        stale = now - timezone.timedelta(
+            seconds=settings.PAYMENT_REMINDER_CLAIM_TIMEOUT
+        )
+        return PaymentReminder.objects.filter(
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale),
+            sent_at__isnull=True,
+            due_at__lte=now,
+        )
+
+    @classmethod
+    def claim_due(cls, batch_size=None, now=None):
+        """
+        Claim a batch of due reminders for the current worker.
+
+        The claim is a single `UPDATE` guarded by the same conditions as the
+        selection, so concurrent workers never claim the same reminder twice.
+
+        Parameters:
+        - `batch_size` (int): Maximum number of reminders, defaults to
+          `PAYMENT_REMINDER_BATCH_SIZE`.
+        - `now` (datetime): The current time, used in tests.
+
+        Returns:
+        - `Dict[int, int]`: Order ids of the claimed reminders by reminder id.
+        """
+        now = now or timezone.now()
+        batch_size = batch_size or settings.PAYMENT_REMINDER_BATCH_SIZE
+        token = uuid.uuid4()
+
+        candidate_ids = list(
+            cls.claimable(now)
+            .order_by("due_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not candidate_ids:
+            return {}
+        cls.claimable(now).filter(pk__in=candidate_ids).update(
+            claimed_at=now, claim_token=token
+        )
+        return dict(
+            PaymentReminder.objects.filter(
+                claim_token=token, sent_at__isnull=True
+            ).values_list("pk", "order_id")
+        )
+
+    @staticmethod
+    def mark_sent(reminder_ids, now=None):
+        """
+        Mark claimed reminders as sent. Reminders already sent are left untouched.
+
+        Returns:
+        - int: The number of reminders marked as sent.
+        """
+        return PaymentReminder.objects.filter(
+            pk__in=reminder_ids, sent_at__isnull=True
+        ).update(sent_at=now or timezone.now())
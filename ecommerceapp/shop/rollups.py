@@ -0,0 +1,97 @@
+from collections import defaultdict
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import OrderItem, ProductSalesDaily
+
+
+class SalesRollup:
+    """
+    Maintenance of the `ProductSalesDaily` rollup table.
+
+    Days are calendar days in the current time zone (`TIME_ZONE`). Orders deleted
+    after creation are not subtracted from the rollups, `rebuild` reconciles the
+    table with the order history.
+    """
+
+    batch_size = 1000
+
+    upsert_sql = (
+        "INSERT INTO {table} (product_id, day, order_count, units, revenue) "
+        "VALUES (%s, %s, %s, %s, %s) "
+        "ON CONFLICT (day, product_id) DO UPDATE SET "
+        "order_count = {table}.order_count + excluded.order_count, "
+        "units = {table}.units + excluded.units, "
+        "revenue = {table}.revenue + excluded.revenue"
+    )
+
+    @classmethod
+    def record_order_items(cls, order_items):
+        """
+        Add freshly created order items to the daily rollups.
+
+        The rows are upserted with atomic increments, so concurrent orders for
+        the same product and day do not overwrite each other. Call it inside the
+        transaction creating the orders to keep both in sync.
+
+        Parameters:
+        - `order_items` (Iterable[OrderItem]): Items with their `order` loaded.
+
+        Returns:
+        - None
+        """
+        totals = defaultdict(lambda: [set(), 0, 0])
+        for order_item in order_items:
+            day = timezone.localdate(order_item.order.order_date)
+            entry = totals[(order_item.product_id, day)]
+            entry[0].add(order_item.order_id)
+            entry[1] += order_item.quantity
+            entry[2] += order_item.line_total
+
+        if not totals:
+            return
+
+        sql = cls.upsert_sql.format(table=ProductSalesDaily._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                sql,
+                [
+                    (product_id, day, len(order_ids), units, revenue)
+                    for (product_id, day), (order_ids, units, revenue) in totals.items()
+                ],
+            )
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recompute the whole rollup table from the order history.
+
+        Returns:
+        - int: The number of rollup rows written.
+        """
+        rows = (
+            OrderItem.objects.annotate(day=TruncDate("order__order_date"))
+            .values("product_id", "day")
+            .annotate(
+                order_count=Count("order", distinct=True),
+                units=Sum("quantity"),
+                # the price snapshots of the items, no join of the products
+                revenue=Sum("line_total"),
+            )
+            .order_by()
+        )
+
+        written = 0
+        with transaction.atomic():
+            ProductSalesDaily.objects.all().delete()
+            batch = []
+            for row in rows.iterator(chunk_size=cls.batch_size):
+                batch.append(ProductSalesDaily(**row))
+                if len(batch) >= cls.batch_size:
+                    ProductSalesDaily.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            ProductSalesDaily.objects.bulk_create(batch)
+            written += len(batch)
+        return written
@@ -0,0 +1,538 @@
+"""
+Full-text search backends for the product catalog.
+
+Two backends are available:
+- `SQLiteFTSBackend` keeps an FTS5 inverted index next to `shop_product` in the
+  SQLite database and lets SQLite rank the matches with bm25.
+- `InMemorySearchBackend` is a pure-Python inverted index used when the database
+  is not SQLite or the SQLite build has no FTS5 support.
+
+Both backends are kept up to date by the signal receivers in `shop.signals`.
+
+Search terms are matched as text, numbers included (`iphone 15`). Prices are
+searched with an explicit `price:` term, e.g. `price:12` or `price:10-20`.
+Only the best `PRODUCT_SEARCH_MAX_RESULTS` matches of a search are returned.
+"""
+import math
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Case, FloatField, Value, When
+
+from .models import Product
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+PRICE_PREFIX = "price:"
+PRICE_PATTERN = re.compile(r"^\d+(?:\.(\d{1,2}))?$")
+PRICE_RANGE_PATTERN = re.compile(r"^(\d+(?:\.\d{1,2})?)-(\d+(?:\.\d{1,2})?)$")
+
+# Relative weights of the indexed columns: name, category name, description.
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def tokenize(text):
+    """
+    Split a text into lowercase word tokens.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def parse_price_term(term):
+    """
+    Translate a `price:` search term into a half-open `(low, high)` price range.
+
+    The width of the range follows the precision of the term, so `price:12`
+    matches prices from 12.00 to 12.99, `price:12.5` matches 12.50 to 12.59 and
+    `price:12.50` matches exactly 12.50. `price:10-20` matches 10.00 to 20.00.
+    Numbers without the prefix are not prices, they are matched as text.
+
+    Parameters:
+    - `term` (str): A single search term.
+
+    Returns:
+    - `Tuple[Decimal, Decimal]` or None if the term is not a price.
+    """
+    if not term.lower().startswith(PRICE_PREFIX):
+        return None
+    term = term[len(PRICE_PREFIX) :]
+
+    match = PRICE_RANGE_PATTERN.match(term)
+    if match:
+        low, high = sorted((Decimal(match.group(1)), Decimal(match.group(2))))
+        return low, high + Decimal("0.01")
+
+    match = PRICE_PATTERN.match(term)
+    if match:
+        decimals = len(match.group(1) or "")
+        low = Decimal(term)
+        return low, low + Decimal(1).scaleb(-decimals)
+
+    return None
+
+
+def parse_search_terms(terms):
+    """
+    Split search terms into text tokens and price ranges.
+
+    Parameters:
+    - `terms` (List[str]): Search terms as sent by the client.
+
+    Returns:
+    - `Tuple[List[str], List[Tuple[Decimal, Decimal]]]`: Text tokens and price ranges.
+    """
+    tokens = []
+    price_ranges = []
+    for term in terms:
+        price_range = parse_price_term(term)
+        if price_range is not None:
+            price_ranges.append(price_range)
+        else:
+            tokens.extend(tokenize(term))
+    return tokens, price_ranges
+
+
+class BaseSearchBackend:
+    """
+    Interface shared by the product search backends.
+
+    Only the best `PRODUCT_SEARCH_MAX_RESULTS` matches of a query are returned,
+    which keeps the follow-up `Product` query bounded no matter how large the
+    catalog is. Further matches are left out of the results, also when they are
+    filtered or ordered by another field, e.g. the price.
+    """
+
+    @property
+    def max_results(self):
+        return settings.PRODUCT_SEARCH_MAX_RESULTS
+
+    def index_product(self, product, using="default"):
+        raise NotImplementedError
+
+    def index_products(self, product_ids, using="default"):
+        """
+        Add or refresh many products in the index, e.g. after a bulk import.
+        """
+        raise NotImplementedError
+
+    def remove_product(self, product_id, using="default"):
+        raise NotImplementedError
+
+    def reindex_category(self, category, using="default"):
+        raise NotImplementedError
+
+    def rebuild(self, using="default"):
+        raise NotImplementedError
+
+    def rank(self, tokens, using="default"):
+        """
+        Return `(product_id, score)` pairs of products matching every token as a
+        prefix, best match (highest score) first.
+        """
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, tokens):
+        """
+        Narrow `queryset` to the products matching every token and annotate each
+        row with its `search_rank`.
+        """
+        ranked = self.rank(tokens, using=queryset.db)
+        if not ranked:
+            return queryset.none().annotate(search_rank=Value(0.0))
+
+        return queryset.filter(
+            pk__in=[product_id for product_id, _ in ranked]
+        ).annotate(
+            search_rank=Case(
+                *[
+                    When(pk=product_id, then=Value(score))
+                    for product_id, score in ranked
+                ],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+    def search(self, terms, queryset=None):
+        """
+        Return products matching the search terms, best matches first.
+
+        Parameters:
+        - `terms` (List[str]): Search terms, text and numeric ones can be mixed.
+        - `queryset` (QuerySet): Optional base queryset, defaults to all products.
+
+        Returns:
+        - `QuerySet`: Matching products ordered by relevance.
+        """
+        if queryset is None:
+            queryset = Product.objects.all()
+
+        tokens, price_ranges = parse_search_terms(terms)
+        for low, high in price_ranges:
+            queryset = queryset.filter(price__gte=low, price__lt=high)
+
+        if not tokens:
+            return queryset
+        return self.filter_queryset(queryset, tokens).order_by("-search_rank", "pk")
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Search backend storing the inverted index in an SQLite FTS5 virtual table.
+
+    The virtual table is created by a migration. Databases created without
+    migrations (e.g. the test database) get it on first use of the primary;
+    replicas only receive it from the primary.
+    """
+
+    table = "shop_product_fts"
+
+    def __init__(self):
+        # aliases of the databases known to have the table
+        self._indexed = set()
+
+    @classmethod
+    def create_index(cls, cursor):
+        """
+        Create and populate the FTS5 table.
+        """
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {cls.table} USING fts5("
+            "name, category, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        cls._populate(cursor)
+
+    def ensure_index(self, using="default"):
+        """
+        Create and populate the FTS5 table of the primary if it does not exist yet.
+
+        The table is looked up once per database and process, not on every search.
+
+        Returns:
+        - `bool`: Whether the database has the table, False for a replica without
+          it. Writes to such a replica leave the index alone, it is replicated.
+        """
+        if using in self._indexed:
+            return True
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [self.table],
+            )
+            if not cursor.fetchone():
+                if using != DEFAULT_DB_ALIAS:
+                    return False
+                self.create_index(cursor)
+        # a table created by a transaction which is rolled back must be looked up again
+        transaction.on_commit(partial(self._indexed.add, using), using=using)
+        return True
+
+    @classmethod
+    def _populate(cls, cursor, product_ids=None):
+        sql = (
+            f"INSERT INTO {cls.table} (rowid, name, category, description) "
+            "SELECT p.id, p.name, c.name, p.description "
+            "FROM shop_product p JOIN shop_productcategory c ON c.id = p.category_id"
+        )
+        if product_ids is None:
+            cursor.execute(sql)
+        else:
+            placeholders = ", ".join(["%s"] * len(product_ids))
+            cursor.execute(f"{sql} WHERE p.id IN ({placeholders})", product_ids)
+
+    def index_product(self, product, using="default"):
+        if not self.ensure_index(using):
+            return
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, category, description) "
+                "VALUES (%s, %s, %s, %s)",
+                [product.pk, product.name, product.category.name, product.description],
+            )
+
+    def index_products(self, product_ids, using="default"):
+        if not product_ids:
+            return
+        if not self.ensure_index(using):
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})",
+                product_ids,
+            )
+            self._populate(cursor, product_ids)
+
+    def remove_product(self, product_id, using="default"):
+        if not self.ensure_index(using):
+            return
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def reindex_category(self, category, using="default"):
+        if not self.ensure_index(using):
+            return
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {self.table} SET category = %s WHERE rowid IN "
+                "(SELECT id FROM shop_product WHERE category_id = %s)",
+                [category.name, category.pk],
+            )
+
+    def rebuild(self, using="default"):
+        if not self.ensure_index(using):
+            return
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            self._populate(cursor)
+            cursor.execute(
+                f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')"
+            )
+
+    @staticmethod
+    def build_match_expression(tokens):
+        """
+        Build an FTS5 query requiring every token as a prefix, e.g. `"red"* "sh"*`.
+        """
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def rank(self, tokens, using="default"):
+        if not self.ensure_index(using):
+            # the ids of the primary also select the products of the replica
+            using = DEFAULT_DB_ALIAS
+            self.ensure_index(using)
+        weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, -bm25({self.table}, {weights}) AS score "
+                f"FROM {self.table} WHERE {self.table} MATCH %s "
+                "ORDER BY score DESC, rowid LIMIT %s",
+                [self.build_match_expression(tokens), self.max_results],
+            )
+            return cursor.fetchall()
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Pure-Python inverted index, used where SQLite FTS5 is not available.
+
+    The index is loaded from the database on first use and kept in process
+    memory, so every worker process holds its own copy. The copies are kept in
+    line by a version counter in the shared cache: every committed change bumps
+    it, the process making the change applies it to its own copy and the other
+    processes reload theirs on their next search. Matches are scored with
+    field-weighted TF-IDF.
+    """
+
+    version_key = "shop:search:version"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._vocabulary = []
+        self._loaded = False
+        self._version = None
+
+    def _shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # like `CatalogCache`, never restarts at a version used before
+            cache.add(self.version_key, int(time.time() * 1000), timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def _ensure_loaded(self, using="default"):
+        if not self._loaded or self._version != self._shared_version():
+            self.rebuild(using)
+
+    def _apply_on_commit(self, change, using):
+        """
+        Apply a change to the index of this process once it is committed and make
+        the other processes reload theirs.
+        """
+
+        def apply():
+            with self._lock:
+                try:
+                    version = cache.incr(self.version_key)
+                except ValueError:
+                    version = None
+                # without other changes in between, the copy stays current
+                if self._loaded and version == self._version + 1:
+                    change()
+                    self._version = version
+                else:
+                    self._loaded = False
+
+        transaction.on_commit(apply, using=using)
+
+    def _add(self, product_id, fields):
+        weights = defaultdict(float)
+        for text, weight in zip(fields, COLUMN_WEIGHTS):
+            for token in tokenize(text):
+                weights[token] += weight
+
+        for token, weight in weights.items():
+            if token not in self._postings:
+                insort(self._vocabulary, token)
+            self._postings[token][product_id] = weight
+        self._documents[product_id] = tuple(fields)
+
+    def _remove(self, product_id):
+        fields = self._documents.pop(product_id, None)
+        if fields is None:
+            return
+        for token in {token for text in fields for token in tokenize(text)}:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+
+    def index_product(self, product, using="default"):
+        fields = (product.name, product.category.name, product.description)
+
+        def change():
+            self._remove(product.pk)
+            self._add(product.pk, fields)
+
+        self._apply_on_commit(change, using)
+
+    def index_products(self, product_ids, using="default"):
+        def change():
+            rows = (
+                Product.objects.using(using)
+                .filter(pk__in=product_ids)
+                .values_list("pk", "name", "category__name", "description")
+            )
+            for product_id, name, category_name, description in rows:
+                self._remove(product_id)
+                self._add(product_id, (name, category_name, description))
+
+        self._apply_on_commit(change, using)
+
+    def remove_product(self, product_id, using="default"):
+        self._apply_on_commit(partial(self._remove, product_id), using)
+
+    def reindex_category(self, category, using="default"):
+        def change():
+            products = Product.objects.using(using).filter(category=category)
+            for product_id, name, description in products.values_list(
+                "pk", "name", "description"
+            ):
+                self._remove(product_id)
+                self._add(product_id, (name, category.name, description))
+
+        self._apply_on_commit(change, using)
+
+    def rebuild(self, using="default"):
+        with self._lock:
+            # changes committed while loading bump the version again
+            version = self._shared_version()
+            self._postings.clear()
+            self._documents.clear()
+            self._vocabulary.clear()
+            rows = (
+                Product.objects.using(using)
+                .values_list("pk", "name", "category__name", "description")
+                .iterator(chunk_size=2000)
+            )
+            for product_id, name, category_name, description in rows:
+                self._add(product_id, (name, category_name, description))
+            self._version = version
+            self._loaded = True
+
+    def _expand(self, prefix):
+        """
+        Yield every indexed token starting with `prefix`.
+        """
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary):
+            token = self._vocabulary[position]
+            if not token.startswith(prefix):
+                break
+            yield token
+            position += 1
+
+    def rank(self, tokens, using="default"):
+        with self._lock:
+            self._ensure_loaded(using)
+            document_count = max(len(self._documents), 1)
+            scores = None
+            for prefix in tokens:
+                token_scores = defaultdict(float)
+                for token in self._expand(prefix):
+                    postings = self._postings[token]
+                    idf = math.log(1 + document_count / len(postings))
+                    for product_id, weight in postings.items():
+                        token_scores[product_id] += weight * idf
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        product_id: score + token_scores[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[: self.max_results]
+
+
+def sqlite_supports_fts5():
+    """
+    Check whether the SQLite library Django is linked against was built with FTS5.
+    """
+    try:
+        with sqlite3.connect(":memory:") as probe:
+            probe.execute("CREATE VIRTUAL TABLE probe USING fts5(content)")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+    Return the process-wide search backend selected by `PRODUCT_SEARCH_BACKEND`.
+
+    - `fts5`: SQLite FTS5 index.
+    - `memory`: pure-Python inverted index.
+    - `auto` (default): FTS5 on SQLite builds that support it, otherwise `memory`.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                choice = getattr(settings, "PRODUCT_SEARCH_BACKEND", "auto")
+                if choice == "auto":
+                    choice = (
+                        "fts5"
+                        if connections["default"].vendor == "sqlite"
+                        and sqlite_supports_fts5()
+                        else "memory"
+                    )
+                if choice == "fts5":
+                    _backend = SQLiteFTSBackend()
+                else:
+                    _backend = InMemorySearchBackend()
+    return _backend
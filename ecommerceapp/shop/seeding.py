@@ -0,0 +1,317 @@
+"""
+Synthetic data for load testing, see the `seed_shop` management command.
+"""
+
+import random
+from dataclasses import dataclass
+from decimal import Decimal
+from io import BytesIO
+from itertools import accumulate
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+from users.models import UserRole
+from .models import Order, OrderItem, Product, ProductCategory
+
+ADJECTIVES = [
+    "Classic", "Compact", "Deluxe", "Eco", "Ergonomic", "Heavy-duty", "Light",
+    "Modern", "Organic", "Portable", "Premium", "Rustic", "Smart", "Vintage",
+    "Waterproof", "Wireless",
+]  # fmt: skip
+NOUNS = [
+    "backpack", "blender", "chair", "desk lamp", "headphones", "jacket", "kettle",
+    "keyboard", "mug", "notebook", "pan", "rug", "sneakers", "speaker", "tent",
+    "watch",
+]  # fmt: skip
+DEPARTMENTS = [
+    "Books", "Electronics", "Fashion", "Garden", "Home", "Kitchen", "Office",
+    "Outdoor", "Sports", "Toys",
+]  # fmt: skip
+
+# relative order volume by weekday (Monday first) and by hour of the day
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.1, 1.3, 1.25]
+HOUR_WEIGHTS = [
+    0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.4, 0.7, 0.9, 1.0, 1.0, 1.1,
+    1.2, 1.1, 1.0, 1.0, 1.1, 1.3, 1.6, 1.9, 2.0, 1.7, 1.1, 0.5,
+]  # fmt: skip
+PLACEHOLDER_DIRECTORY = "product_images/placeholders"
+
+
+@dataclass
+class SeedOptions:
+    """
+    Sizes and shape of the generated data.
+
+    - `zipf_exponent`: Skew of product popularity, the product of rank `r` is
+      ordered proportionally to `1 / r ** zipf_exponent`.
+    - `days`: Orders are spread over this many days back from today, with a
+      linear `growth` of the daily volume towards today and weekly and daily
+      seasonality.
+    """
+
+    categories: int = 50
+    products: int = 10_000
+    customers: int = 1_000
+    orders: int = 100_000
+    max_lines: int = 5
+    days: int = 365
+    growth: float = 1.0
+    zipf_exponent: float = 1.1
+    batch_size: int = 5_000
+    images: bool = False
+    seed: int = 0
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ShopSeeder:
+    """
+    Generator of categories, products, customers and orders.
+
+    Rows are produced lazily and written with `bulk_create` in batches of
+    `batch_size`, each batch in its own transaction, so memory use depends on
+    the batch size and the number of products, not on the number of orders.
+    The same seed produces the same data on an empty database.
+    """
+
+    def __init__(self, options, log=None):
+        self.options = options
+        self.random = random.Random(options.seed)
+        self.log = log or (lambda message: None)
+
+    def run(self):
+        """
+        Generate all rows.
+
+        Returns:
+        - `Dict[str, int]`: The number of created rows by model name.
+        """
+        categories = self.create_categories()
+        product_ids = self.create_products(categories)
+        customer_ids = self.create_customers()
+        orders, order_items = self.create_orders(product_ids, customer_ids)
+        return {
+            "categories": len(categories),
+            "products": len(product_ids),
+            "customers": len(customer_ids),
+            "orders": orders,
+            "order_items": order_items,
+        }
+
+    def bulk_create(self, model, objects):
+        """
+        Save objects in batches and return their primary keys.
+        """
+        pks = []
+        for batch in batched(objects, self.options.batch_size):
+            with transaction.atomic():
+                pks += [obj.pk for obj in model.objects.bulk_create(batch)]
+        return pks
+
+    def create_categories(self):
+        category_ids = self.bulk_create(
+            ProductCategory,
+            (
+                ProductCategory(
+                    name=f"{DEPARTMENTS[index % len(DEPARTMENTS)]} {index + 1}"
+                )
+                for index in range(self.options.categories)
+            ),
+        )
+        self.log(f"{len(category_ids)} categories created.")
+        categories = ProductCategory.objects.filter(pk__in=category_ids)
+        return list(categories.order_by("pk"))
+
+    def placeholder_images(self, categories):
+        """
+        Store one placeholder image per category and return their paths by category id.
+        """
+        paths = {}
+        for category in categories:
+            color = tuple(self.random.randrange(64, 224) for _ in range(3))
+            image = Image.new("RGB", (640, 480), color)
+            ImageDraw.Draw(image).text((24, 24), category.name, fill=(255, 255, 255))
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=80)
+            paths[category.id] = default_storage.save(
+                f"{PLACEHOLDER_DIRECTORY}/category_{category.id}.jpg",
+                ContentFile(buffer.getvalue()),
+            )
+        return paths
+
+    def generate_products(self, categories, images):
+        for index in range(self.options.products):
+            category = self.random.choice(categories)
+            # log-normal prices, most between 5 and 200
+            price = Decimal(min(self.random.lognormvariate(3.5, 1.0), 99_999))
+            price = max(price.quantize(Decimal("0.01")), Decimal("0.99"))
+            name = f"{self.random.choice(ADJECTIVES)} {self.random.choice(NOUNS)}"
+            yield Product(
+                name=f"{name} {index + 1}"[:64],
+                description=f"{name} from the {category.name} department.",
+                price=price,
+                category=category,
+                image=images.get(category.id),
+                thumbnail=images.get(category.id),
+            )
+
+    def create_products(self, categories):
+        images = self.placeholder_images(categories) if self.options.images else {}
+        product_ids = self.bulk_create(
+            Product, self.generate_products(categories, images)
+        )
+        self.log(f"{len(product_ids)} products created.")
+        return product_ids
+
+    def create_customers(self):
+        # hashing is deliberately slow, all customers share one password
+        password = make_password("seed-password")
+        first_index = UserRole.objects.filter(username__startswith="seed_").count()
+        customer_ids = self.bulk_create(
+            UserRole,
+            (
+                UserRole(
+                    username=f"seed_customer_{index}",
+                    email=f"seed_customer_{index}@example.com",
+                    first_name="Seed",
+                    last_name=f"Customer {index}",
+                    password=password,
+                    role="customer",
+                )
+                for index in range(first_index, first_index + self.options.customers)
+            ),
+        )
+        self.log(f"{len(customer_ids)} customers created.")
+        return customer_ids
+
+    def popularity_weights(self, product_ids):
+        """
+        Return products in a random popularity order with their cumulative Zipf weights.
+        """
+        ranked = list(product_ids)
+        self.random.shuffle(ranked)
+        weights = (
+            1 / rank**self.options.zipf_exponent for rank in range(1, len(ranked) + 1)
+        )
+        return ranked, list(accumulate(weights))
+
+    def order_date_weights(self):
+        """
+        Return candidate order hours with their cumulative weights.
+        """
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        total_hours = self.options.days * 24
+        hours, weights = [], []
+        for offset in range(total_hours):
+            hour = now - timezone.timedelta(hours=offset)
+            local = timezone.localtime(hour)
+            trend = 1 + self.options.growth * (total_hours - offset) / total_hours
+            hours.append(hour)
+            weights.append(
+                trend * WEEKDAY_WEIGHTS[local.weekday()] * HOUR_WEIGHTS[local.hour]
+            )
+        return hours, list(accumulate(weights))
+
+    def generate_orders(self, product_ids, customer_ids):
+        """
+        Yield batches of orders with their items as `(product_id, quantity, unit_price)`
+        tuples.
+        """
+        products, product_weights = self.popularity_weights(product_ids)
+        prices = dict(
+            Product.objects.filter(pk__in=product_ids).values_list("pk", "price")
+        )
+        hours, hour_weights = self.order_date_weights()
+        payment_period = timezone.timedelta(days=5)
+
+        for start in range(0, self.options.orders, self.options.batch_size):
+            size = min(self.options.batch_size, self.options.orders - start)
+            order_hours = self.random.choices(hours, cum_weights=hour_weights, k=size)
+            batch = []
+            for order_hour in order_hours:
+                lines = self.random.randint(1, self.options.max_lines)
+                # duplicates are dropped keeping the order, for reproducibility
+                line_products = dict.fromkeys(
+                    self.random.choices(products, cum_weights=product_weights, k=lines)
+                )
+                items = [
+                    (product_id, self.quantity(), prices[product_id])
+                    for product_id in line_products
+                ]
+                order_date = order_hour + timezone.timedelta(
+                    seconds=self.random.randrange(3600)
+                )
+                order = Order(
+                    customer_id=self.random.choice(customer_ids),
+                    delivery_address=f"{self.random.randint(1, 200)} Seed Street",
+                    order_date=order_date,
+                    payment_due_date=order_date + payment_period,
+                    aggregate_price=sum(
+                        unit_price * quantity for _, quantity, unit_price in items
+                    ),
+                )
+                batch.append((order, items))
+            yield batch
+
+    def quantity(self):
+        # mostly single units, occasionally a few more
+        return min(int(self.random.expovariate(1.2)) + 1, 20)
+
+    def create_orders(self, product_ids, customer_ids):
+        if not product_ids or not customer_ids:
+            return 0, 0
+
+        # order items are the bulk of the rows, they are inserted without
+        # instantiating models
+        insert_items_sql = (
+            f"INSERT INTO {OrderItem._meta.db_table} "
+            "(order_id, product_id, quantity, unit_price, line_total) "
+            "VALUES (%s, %s, %s, %s, %s)"
+        )
+        # `bulk_create` replaces `order_date` with the current time
+        # (`auto_now_add`), the generated dates are written afterwards
+        order_date_column = Order._meta.get_field("order_date").column
+        update_dates_sql = (
+            f"UPDATE {Order._meta.db_table} SET {order_date_column} = %s "
+            f"WHERE {Order._meta.pk.column} = %s"
+        )
+        order_count = item_count = 0
+        for batch in self.generate_orders(product_ids, customer_ids):
+            order_dates = [order.order_date for order, _ in batch]
+            with transaction.atomic(), connection.cursor() as cursor:
+                orders = Order.objects.bulk_create([order for order, _ in batch])
+                cursor.executemany(
+                    update_dates_sql,
+                    [
+                        (connection.ops.adapt_datetimefield_value(order_date), order.pk)
+                        for order, order_date in zip(orders, order_dates)
+                    ],
+                )
+                items = [
+                    (
+                        order.pk,
+                        product_id,
+                        quantity,
+                        unit_price,
+                        unit_price * quantity,
+                    )
+                    for order, (_, order_items) in zip(orders, batch)
+                    for product_id, quantity, unit_price in order_items
+                ]
+                cursor.executemany(insert_items_sql, items)
+            order_count += len(orders)
+            item_count += len(items)
+            self.log(f"{order_count} orders with {item_count} items created.")
+        return order_count, item_count
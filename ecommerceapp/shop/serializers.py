@@ -1,153 +1,281 @@
+from decimal import Decimal
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
-from .models import Product, Order, OrderItem
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
-import uuid
-from copy import deepcopy
-
-
-class ProductSerializer(serializers.ModelSerializer):
+from .fieldsets import SparseFieldsetSerializerMixin
+from .importing import FORMATS, guess_format
+from .inventory import Inventory
+from .models import Product, Order
+from .imaging import (
+    ImageTooLargeError,
+    delete_image_files_on_commit,
+    rename_upload,
+    schedule_variants,
+    validate_upload,
+)
+
+
+class ProductSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Product model, used for regular serialization.
+
+    The stock is left out, catalog responses are cached until the catalog
+    changes and orders do not change it. Lists default to the compact
+    `list_fields`, clients select other fields with `fields` and `omit` (see
+    `shop.fieldsets`).
     """
 
+    list_fields = ("id", "name", "price", "category", "thumbnail")
+
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("stock", "stock_shards")
+
+    def get_image_variants(self, product):
+        """
+        Return the URLs of the generated image variants by variant name.
+        """
+        request = self.context.get("request")
+        urls = {}
+        for name, path in product.image_variants.items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
 
 
-class ProductCreateSerializer(serializers.ModelSerializer):
+class ProductImageValidationMixin:
     """
-    Serializer for creating a Product instance, including thumbnail creation logic.
+    Reject uploaded images above the configured byte and pixel limits before they are decoded.
+    """
+
+    def validate_image(self, image):
+        if image:
+            try:
+                validate_upload(image)
+            except ImageTooLargeError as e:
+                raise serializers.ValidationError(str(e))
+        return image
+
+
+class ProductSkuValidationMixin:
+    """
+    Store blank SKUs as None, the unique constraint allows any number of those.
+    """
+
+    def validate_sku(self, sku):
+        return sku or None
+
+
+class ProductCreateSerializer(
+    ProductImageValidationMixin, ProductSkuValidationMixin, serializers.ModelSerializer
+):
+    """
+    Serializer for creating a Product instance.
+
+    The uploaded image is stored as it is, its variants (including the thumbnail)
+    are generated by a Celery task after the product is saved.
     """
 
     class Meta:
         model = Product
-        fields = ("name", "description", "price", "category", "image")
+        fields = (
+            "name",
+            "sku",
+            "description",
+            "price",
+            "category",
+            "image",
+            "stock",
+        )
 
     def create(self, validated_data):
         """
-        Create a new Product instance with the logic of 200x200 thumbnail generation.
+        Create a new Product instance and schedule the generation of its image variants.
         """
-        thumbnail_size = (200, 200)
         image = validated_data.pop("image", None)
+        if image:
+            validated_data["image"] = rename_upload(image)
 
         product = Product.objects.create(**validated_data)
-        if image:
-            image = Image.open(image)
-
-            image_copy = deepcopy(image)
-            image_copy.thumbnail(thumbnail_size)
-
-            unique_id = uuid.uuid4().hex
-
-            # Thumbnail save
-            thumbnail_io = BytesIO()
-            image_copy.save(thumbnail_io, format="JPEG")
-            thumbnail = InMemoryUploadedFile(
-                thumbnail_io,
-                None,
-                f"thumbnail_{unique_id}.jpg",
-                "image/jpeg",
-                thumbnail_io.tell(),
-                None,
-            )
-            product.thumbnail.save(f"thumbnail_{unique_id}.jpg", thumbnail)
-
-            # Original image save
-            image_io = BytesIO()
-            image.save(image_io, format="JPEG")
-            image = InMemoryUploadedFile(
-                image_io,
-                None,
-                f"image_{unique_id}.jpg",
-                "image/jpeg",
-                image_io.tell(),
-                None,
-            )
-            product.image.save(f"image_{unique_id}.jpg", image)
+        if product.image:
+            schedule_variants(product)
 
         return product
 
 
-class ProductRetrieveUpdateDestroySerializer(serializers.ModelSerializer):
+class ProductRetrieveUpdateDestroySerializer(
+    ProductImageValidationMixin, ProductSkuValidationMixin, serializers.ModelSerializer
+):
     """
-    Serializer for retrieving, updating, or destroying a Product instance, including image and thumbnail handling.
+    Serializer for retrieving, updating, or destroying a Product instance, including image handling.
     """
 
     class Meta:
         model = Product
-        fields = ("name", "description", "price", "category", "image")
+        fields = (
+            "name",
+            "sku",
+            "description",
+            "price",
+            "category",
+            "image",
+            "stock",
+        )
 
     def update(self, instance, validated_data):
         """
-        Update a Product instance with the functionality of updating image and generating new thumbnail.
+        Update a Product instance, replacing its image and image variants when a new image is uploaded.
+
+        A new stock level replaces the current one, spread over the stock shards
+        of the product if it has any. It is set after the product is saved, in the
+        same transaction, so a failed save leaves the stock as it was. The files
+        of a replaced image are deleted once that transaction commits.
         """
-        thumbnail_size = (200, 200)
         image = validated_data.pop("image", None)
-
-        old_image = instance.image
-        old_thumbnail = instance.thumbnail
-        if old_image:
-            old_image.delete()
-        if old_thumbnail:
-            old_thumbnail.delete()
+        stock_changed = "stock" in validated_data
+        stock = validated_data.pop("stock", None)
 
         # Model fields update
         instance.name = validated_data.get("name", instance.name)
+        instance.sku = validated_data.get("sku", instance.sku)
         instance.description = validated_data.get("description", instance.description)
         instance.price = validated_data.get("price", instance.price)
         instance.category = validated_data.get("category", instance.category)
 
+        with transaction.atomic():
+            if image:
+                # the old files are only deleted once the new image is committed
+                delete_image_files_on_commit(instance)
+                instance.image = rename_upload(image)
+                instance.thumbnail = None
+                instance.image_variants = {}
+            instance.save()
+            if stock_changed:
+                Inventory.set_stock(instance, stock)
         if image:
-            image = Image.open(image)
-
-            # Creating a copy before modification
-            image_copy = image.copy()
-            image_copy.thumbnail(thumbnail_size)
-
-            unique_id = uuid.uuid4().hex
-
-            # Thumbnail save
-            thumbnail_io = BytesIO()
-            image_copy.save(thumbnail_io, format="JPEG")
-            thumbnail = InMemoryUploadedFile(
-                thumbnail_io,
-                None,
-                f"thumbnail_{unique_id}.jpg",
-                "image/jpeg",
-                thumbnail_io.tell(),
-                None,
+            schedule_variants(instance)
+
+        return instance
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Serializer for a bulk product import upload.
+    """
+
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=FORMATS, required=False)
+
+    def validate(self, data):
+        data.setdefault("format", guess_format(data["file"].name))
+        if data["format"] is None:
+            raise serializers.ValidationError(
+                {"format": ["Unknown file format, must be one of csv, jsonl."]}
             )
-            instance.thumbnail.save(f"thumbnail_{unique_id}.jpg", thumbnail)
-
-            # Original image save
-            image_io = BytesIO()
-            image.save(image_io, format="JPEG")
-            image = InMemoryUploadedFile(
-                image_io,
-                None,
-                f"image_{unique_id}.jpg",
-                "image/jpeg",
-                image_io.tell(),
-                None,
+        return data
+
+
+class ExportSerializer(serializers.Serializer):
+    """
+    Serializer for the query parameters of an export.
+    """
+
+    format = serializers.ChoiceField(choices=FORMATS, default="csv")
+    gzip = serializers.BooleanField(default=False)
+
+
+class OrderExportSerializer(ExportSerializer):
+    """
+    Serializer for the query parameters of an order export.
+    """
+
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if data.get("start_date") and data.get("end_date"):
+            if data["start_date"] > data["end_date"]:
+                raise serializers.ValidationError(
+                    {"end_date": ["Must not be before start_date."]}
+                )
+        return data
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """
+    Serializer for the structured filters of product lists.
+    """
+
+    category = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+
+    def validate_category(self, value):
+        try:
+            return [int(pk) for pk in value.split(",") if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError(
+                "Expected comma separated category primary keys."
             )
-            instance.image.save(f"image_{unique_id}.jpg", image)
 
-        instance.save()
+    def validate(self, data):
+        if data.get("min_price") is not None and data.get("max_price") is not None:
+            if data["min_price"] > data["max_price"]:
+                raise serializers.ValidationError(
+                    {"max_price": ["Must not be below min_price."]}
+                )
+        return data
 
-        return instance
+
+class ProductFacetsQuerySerializer(ProductFilterSerializer):
+    """
+    Serializer for the query parameters of the product facets.
+    """
+
+    price_interval = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal("0.01"), required=False
+    )
+
+
+class CategoryFacetSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class PriceBandSerializer(serializers.Serializer):
+    min = serializers.DecimalField(max_digits=12, decimal_places=2)
+    max = serializers.DecimalField(max_digits=12, decimal_places=2)
+    count = serializers.IntegerField()
+
+
+class ProductFacetsSerializer(serializers.Serializer):
     """
-    Serializer for the OrderItem model.
+    Serializer for the product facets, see `shop.facets.ProductFacets`.
     """
 
-    class Meta:
-        model = OrderItem
-        fields = ["product", "quantity"]
+    count = serializers.IntegerField()
+    categories = CategoryFacetSerializer(many=True)
+    price_interval = serializers.DecimalField(max_digits=10, decimal_places=2)
+    price_histogram = PriceBandSerializer(many=True)
+
+
+class OrderItemSerializer(serializers.Serializer):
+    """
+    Serializer for a single order line.
+
+    Products are referenced by primary key only, they are resolved for all lines
+    at once by `OrderService` instead of one lookup per line.
+    """
+
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
 
 
 class OrderSerializer(serializers.Serializer):
@@ -159,12 +287,36 @@ class OrderSerializer(serializers.Serializer):
     last_name = serializers.CharField(max_length=32)
     delivery_address = serializers.CharField()
     products = OrderItemSerializer(many=True)
+    # token of a stock reservation of the customer, see `StockReservationSerializer`
+    reservation = serializers.UUIDField(required=False, write_only=True)
     aggregate_price = serializers.DecimalField(
         max_digits=10, decimal_places=2, read_only=True
     )
     payment_due_date = serializers.DateTimeField(read_only=True)
 
 
+class OrderBatchSerializer(serializers.Serializer):
+    """
+    Serializer for creating many orders in one request.
+    """
+
+    orders = OrderSerializer(many=True, allow_empty=False, max_length=100)
+    # a reservation is used for all orders together, not per order
+    reservation = serializers.UUIDField(required=False, write_only=True)
+
+
+class StockReservationSerializer(serializers.Serializer):
+    """
+    Serializer for reserving units of products ahead of an order.
+    """
+
+    products = OrderItemSerializer(
+        many=True, allow_empty=False, max_length=100, write_only=True
+    )
+    reservation = serializers.UUIDField(read_only=True)
+    expires_at = serializers.DateTimeField(read_only=True)
+
+
 class OrderListSerializer(serializers.ModelSerializer):
     """
     Serializer for listing Order instances.
@@ -0,0 +1,223 @@
+from collections import Counter
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .inventory import Inventory, StockReservations
+from .models import Product, Order, OrderItem
+from .rollups import SalesRollup
+
+
+class OrderService:
+    """
+    Set-based order intake.
+
+    All products referenced by the incoming orders are resolved with a single
+    `IN` query, orders and their items are written with `bulk_create` and the
+    aggregate prices are computed in memory from the price snapshots of the items
+    (`OrderItem.unit_price` and `line_total`) taken from the already loaded
+    products, so the number of queries does not depend on the number of order
+    lines. The daily sales rollups are updated in the same transaction, as is
+    the stock of the ordered products (see `shop.inventory.Inventory`).
+    """
+
+    payment_period = timezone.timedelta(days=5)
+
+    @staticmethod
+    def build_order_items(products_data, products):
+        """
+        Build the unsaved items of an order with the current prices of their products.
+
+        Parameters:
+        - `products_data` (List[Dict[str, int]]): Order lines with `product` and `quantity`.
+        - `products` (Dict[int, Product]): Products of the lines by primary key.
+
+        Returns:
+        - `List[OrderItem]`: Items with their `unit_price` and `line_total` set.
+        """
+        order_items = []
+        for product_data in products_data:
+            product = products[product_data["product"]]
+            order_items.append(
+                OrderItem(
+                    product=product,
+                    quantity=product_data["quantity"],
+                    unit_price=product.price,
+                    line_total=product.price * product_data["quantity"],
+                )
+            )
+        return order_items
+
+    @staticmethod
+    def calculate_aggregate_price(order_items):
+        """
+        Calculate the aggregate price of an order based on its items.
+
+        Parameters:
+        - `order_items` (List[OrderItem]): Items with their `line_total` set.
+
+        Returns:
+        - Decimal: The aggregate price of the order.
+        """
+        return sum(order_item.line_total for order_item in order_items)
+
+    @staticmethod
+    def resolve_products(orders_data):
+        """
+        Load every product referenced by the orders with one query, with their
+        price and stock fields.
+
+        Parameters:
+        - `orders_data` (List[Dict]): Validated orders with their `products` lines.
+
+        Returns:
+        - `Dict[int, Product]`: Products by primary key.
+
+        Raises:
+        - `ValidationError`: When any of the referenced products does not exist.
+        """
+        product_ids = {
+            product_data["product"]
+            for order_data in orders_data
+            for product_data in order_data["products"]
+        }
+        products = Product.objects.only("price", *Inventory.product_fields).in_bulk(
+            product_ids
+        )
+
+        missing_ids = sorted(product_ids - products.keys())
+        if missing_ids:
+            raise serializers.ValidationError(
+                {
+                    "products": [
+                        f'Invalid pk "{product_id}" - object does not exist.'
+                        for product_id in missing_ids
+                    ]
+                }
+            )
+        return products
+
+    @classmethod
+    def take_stock(cls, customer, orders_data, products, reservation=None):
+        """
+        Take the ordered units out of stock, using the units of a reservation first.
+
+        Reserved units not part of the orders are put back into stock.
+
+        Parameters:
+        - `customer` (UserRole): The customer placing the orders.
+        - `orders_data` (List[Dict]): Validated orders with their `products` lines.
+        - `products` (Dict[int, Product]): Products of the lines by primary key.
+        - `reservation` (UUID): Token of a reservation of the customer, if any.
+
+        Returns:
+        - None
+        """
+        ordered = Inventory.count_units(
+            product_data
+            for order_data in orders_data
+            for product_data in order_data["products"]
+        )
+        held = Counter()
+        if reservation:
+            held = StockReservations.consume(reservation, customer)
+
+        Inventory.take(ordered - held, products)
+        if held - ordered:
+            Inventory.restock(held - ordered)
+
+    @classmethod
+    def create_orders(cls, customer, orders_data, reservation=None):
+        """
+        Create orders with their items inside one transaction.
+
+        Parameters:
+        - `customer` (UserRole): The customer placing the orders.
+        - `orders_data` (List[Dict]): Validated orders with `delivery_address` and
+          `products` lines (`product` primary key and `quantity`).
+        - `reservation` (UUID): Token of a stock reservation made by the customer
+          with `reserve_stock`, if any.
+
+        Returns:
+        - `List[Order]`: The created orders, in the order of `orders_data`.
+
+        Raises:
+        - `ValidationError`: When a product does not exist or is out of stock,
+          nothing is created then.
+        """
+        payment_due_date = timezone.now() + cls.payment_period
+
+        with transaction.atomic():
+            products = cls.resolve_products(orders_data)
+            cls.take_stock(customer, orders_data, products, reservation)
+
+            items_by_order = [
+                cls.build_order_items(order_data["products"], products)
+                for order_data in orders_data
+            ]
+            orders = Order.objects.bulk_create(
+                [
+                    Order(
+                        # the id is enough, a token user is not loaded
+                        customer_id=customer.pk,
+                        delivery_address=order_data["delivery_address"],
+                        payment_due_date=payment_due_date,
+                        aggregate_price=cls.calculate_aggregate_price(order_items),
+                    )
+                    for order_data, order_items in zip(orders_data, items_by_order)
+                ]
+            )
+            for order, order_items in zip(orders, items_by_order):
+                for order_item in order_items:
+                    order_item.order = order
+            order_items = OrderItem.objects.bulk_create(
+                [
+                    order_item
+                    for order_items in items_by_order
+                    for order_item in order_items
+                ]
+            )
+            SalesRollup.record_order_items(order_items)
+
+        return orders
+
+    @classmethod
+    def create_order(cls, customer, delivery_address, products_data, reservation=None):
+        """
+        Create a single order, see `create_orders`.
+        """
+        (order,) = cls.create_orders(
+            customer,
+            [{"delivery_address": delivery_address, "products": products_data}],
+            reservation=reservation,
+        )
+        return order
+
+    @classmethod
+    def reserve_stock(cls, customer, products_data, ttl=None):
+        """
+        Hold units of products for a later order of the customer.
+
+        Parameters:
+        - `customer` (UserRole): The customer placing the order later.
+        - `products_data` (List[Dict[str, int]]): Lines with `product` and `quantity`.
+        - `ttl` (int): Lifetime in seconds, defaults to `STOCK_RESERVATION_TTL`.
+
+        Returns:
+        - `Tuple[UUID, datetime]`: The token and the expiry time of the reservation.
+
+        Raises:
+        - `ValidationError`: When a product does not exist or is out of stock.
+        """
+        with transaction.atomic():
+            products = cls.resolve_products([{"products": products_data}])
+            quantities = Inventory.count_units(products_data)
+            Inventory.take(quantities, products)
+            return StockReservations.hold(
+                customer,
+                {
+                    product_id: quantity
+                    for product_id, quantity in quantities.items()
+                    if Inventory.is_tracked(products[product_id])
+                },
+                ttl,
+            )
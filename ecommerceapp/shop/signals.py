@@ -0,0 +1,59 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import CatalogCache
+from .models import Product, ProductCategory
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, raw=False, **kwargs):
+    """
+    Add or refresh the saved product in the search index.
+    """
+    if raw:
+        return
+    get_search_backend().index_product(instance, using=using)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, using, **kwargs):
+    """
+    Remove the deleted product from the search index.
+    """
+    get_search_backend().remove_product(instance.pk, using=using)
+
+
+@receiver(post_save, sender=ProductCategory)
+def reindex_category(sender, instance, created, using, raw=False, **kwargs):
+    """
+    Propagate a category rename to the indexed products of that category.
+    """
+    if raw or created:
+        return
+    get_search_backend().reindex_category(instance, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_responses(sender, instance, using, **kwargs):
+    """
+    Invalidate cached catalog lists and the cached details of the changed product.
+
+    The versions are bumped once the change is committed, before that another
+    process could cache the previous rows under the new versions.
+    """
+    transaction.on_commit(CatalogCache.bump_catalog_version, using=using)
+    transaction.on_commit(
+        partial(CatalogCache.bump_product_version, instance.pk), using=using
+    )
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_category_responses(sender, instance, using, **kwargs):
+    """
+    Invalidate cached catalog lists, which are searchable and orderable by category.
+    """
+    transaction.on_commit(CatalogCache.bump_catalog_version, using=using)
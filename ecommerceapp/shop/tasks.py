@@ -1,14 +1,32 @@
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from django.conf import settings
 from django.core.mail import send_mail
+from django.core.files.storage import default_storage
+from common.mail import render_order_emails, send_batch
+from .cache import CatalogCache
+from .idempotency import IdempotentRequests
+from .inventory import StockReservations
+from .imaging import ImageProcessingReport, ImageTooLargeError, store_variants
+from .models import Product
+from .reminders import PaymentReminderScheduler
 
 logger = get_task_logger(__name__)
 
 
-@shared_task(name="send-email")
-def send_email_task(subject, plain_message, from_email, to_email, html_message=None):
+def email_retry_countdown(retries):
     """
-    Celery task to send an email.
+    Return the delay (in seconds) before the next delivery attempt of an email.
+    """
+    return settings.EMAIL_RETRY_BACKOFF * 2**retries
+
+
+@shared_task(name="send-email", bind=True)
+def send_email_task(
+    self, subject, plain_message, from_email, to_email, html_message=None
+):
+    """
+    Celery task to send an email, retried with exponential backoff on failure.
     """
     try:
         send_mail(
@@ -20,4 +38,150 @@ def send_email_task(subject, plain_message, from_email, to_email, html_message=N
         )
         logger.info("Email sent successfully.")
     except Exception as e:
-        logger.error(f"Error sending email: {e}")
+        if self.request.retries >= settings.EMAIL_MAX_RETRIES:
+            logger.error(f"Error sending email to {to_email}, giving up: {e}")
+            return
+        logger.warning(f"Error sending email to {to_email}, retrying: {e}")
+        raise self.retry(
+            exc=e,
+            countdown=email_retry_countdown(self.request.retries),
+            max_retries=settings.EMAIL_MAX_RETRIES,
+        )
+
+
+@shared_task(name="send-email-batch")
+def send_email_batch_task(messages):
+    """
+    Celery task to send many emails over one SMTP connection.
+
+    Emails which could not be delivered are handed over to `send_email_task`
+    one by one, so they are retried with backoff without resending the others.
+
+    Parameters:
+    - `messages` (List[dict]): Emails in the format accepted by `common.mail.build_message`.
+
+    Returns:
+    - int: The number of emails sent.
+    """
+    failed = send_batch(messages)
+    for message, error in failed:
+        logger.warning(f"Error sending email to {message['to_email']}: {error}")
+        send_email_task.apply_async(kwargs=message, countdown=email_retry_countdown(0))
+
+    sent = len(messages) - len(failed)
+    logger.info(f"{sent} of {len(messages)} emails sent.")
+    return sent
+
+
+@shared_task(name="send-order-emails")
+def send_order_emails_task(emails):
+    """
+    Celery task to render and send emails about orders.
+
+    Only order ids and template keys travel through the broker, the emails are
+    rendered here and sent like `send_email_batch_task`.
+
+    Parameters:
+    - `emails` (List[Tuple[int, str]]): Pairs of order id and template key.
+
+    Returns:
+    - int: The number of emails sent.
+    """
+    return send_email_batch_task(render_order_emails(emails))
+
+
+@shared_task(name="send-payment-reminders")
+def send_payment_reminders_task():
+    """
+    Periodic Celery beat task sending the payment reminders which are due.
+
+    Due reminders are claimed in batches of `PAYMENT_REMINDER_BATCH_SIZE`, sent
+    like `send_order_emails_task` and marked as sent. At most
+    `PAYMENT_REMINDER_MAX_BATCHES` batches are sent per run, the rest is left to
+    the next run.
+
+    Returns:
+    - int: The number of reminders handled.
+    """
+    handled = 0
+    for _ in range(settings.PAYMENT_REMINDER_MAX_BATCHES):
+        claimed = PaymentReminderScheduler.claim_due()
+        if not claimed:
+            break
+        send_order_emails_task(
+            [(order_id, "payment_reminder") for order_id in claimed.values()]
+        )
+        handled += PaymentReminderScheduler.mark_sent(claimed.keys())
+    return handled
+
+
+@shared_task(name="release-expired-stock-reservations")
+def release_expired_stock_reservations_task():
+    """
+    Periodic Celery beat task putting the units of expired stock reservations back into stock.
+
+    At most `STOCK_RESERVATION_MAX_BATCHES` batches of
+    `STOCK_RESERVATION_BATCH_SIZE` reservation rows are released per run, the
+    rest is left to the next run.
+
+    Returns:
+    - int: The number of reservation rows released.
+    """
+    released = 0
+    for _ in range(settings.STOCK_RESERVATION_MAX_BATCHES):
+        batch = StockReservations.release_expired()
+        released += batch
+        if not batch:
+            break
+    return released
+
+
+@shared_task(name="purge-idempotency-keys")
+def purge_idempotency_keys_task():
+    """
+    Periodic Celery beat task deleting expired idempotency keys in batches.
+
+    Returns:
+    - int: The number of keys deleted.
+    """
+    deleted = 0
+    while True:
+        batch = IdempotentRequests.purge_expired()
+        deleted += batch
+        if batch < settings.IDEMPOTENCY_PURGE_BATCH_SIZE:
+            return deleted
+
+
+@shared_task(name="generate-product-image-variants")
+def generate_product_image_variants(product_id):
+    """
+    Celery task rendering the configured image variants of a product.
+
+    The `thumbnail` variant also becomes the product thumbnail. If the product
+    image was replaced while the variants were rendered, they are discarded.
+    """
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not product.image:
+        return
+
+    report = ImageProcessingReport()
+    try:
+        variants = store_variants(product, report)
+    except ImageTooLargeError as e:
+        logger.error(f"Image of product {product_id} not processed: {e}")
+        return
+    updated = Product.objects.filter(pk=product_id, image=product.image.name).update(
+        image_variants=variants, thumbnail=variants.get("thumbnail", "")
+    )
+    stale_paths = product.image_variants.values() if updated else variants.values()
+    for path in stale_paths:
+        default_storage.delete(path)
+
+    if updated:
+        CatalogCache.bump_catalog_version()
+        CatalogCache.bump_product_version(product_id)
+        logger.info(
+            f"Image variants of product {product_id} generated: "
+            f"source {report.source_size}, decoded {report.decoded_size}, "
+            f"peak bitmap memory {report.peak_bitmap_bytes} bytes."
+        )
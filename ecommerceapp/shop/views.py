@@ -1,53 +1,146 @@
-from django.db.models import Count
-from django.utils import timezone
-from drf_spectacular.utils import extend_schema
+from django.db import router
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 from rest_framework import generics, permissions, filters, status, serializers
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Product, Order, OrderItem
+from .models import Product, Order, ProductSalesDaily
 from .serializers import (
     ProductSerializer,
     ProductCreateSerializer,
     ProductRetrieveUpdateDestroySerializer,
     OrderSerializer,
+    OrderBatchSerializer,
     ProductStatsInputSerializer,
     ProductStatsSerializer,
     OrderListSerializer,
+    StockReservationSerializer,
+    ProductImportSerializer,
+    ExportSerializer,
+    OrderExportSerializer,
+    ProductFacetsQuerySerializer,
+    ProductFacetsSerializer,
 )
 from .permissions import IsSellerOrAdmin
+from .filters import ProductFilter, ProductSearchFilter
+from .facets import ProductFacets
+from .pagination import KeysetPagination
+from .idempotency import IdempotentCreateMixin
+from .importing import ProductImporter
+from .exporting import OrderExport, ProductExport
+from .services import OrderService
+from .cache import CatalogCache, CachedResponseMixin
+from .fieldsets import SparseFieldsetMixin
 from rest_framework.parsers import MultiPartParser, FormParser
+from common.db_routing import ReplicaReadMixin
 from common.email_handler import EmailHandler
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(
+    ReplicaReadMixin, CachedResponseMixin, SparseFieldsetMixin, generics.ListAPIView
+):
     """
     List all products with search, ordering, and pagination capabilities.
 
     Parameters:
-    - `name` (str): Search for products by name.
-    - `category__name` (str): Search for products by category name.
-    - `description` (str): Search for products by description.
-    - `price` (str): Search for products by price.
+    - `search` (str): Full-text search over product name, category name and description.
+      Terms match as prefixes and results are ranked by relevance. Numbers are
+      matched as text, e.g. `iphone 15`. Prices are searched with a `price:` term,
+      e.g. `price:12` finds prices from 12.00 to 12.99 and `price:10-20` prices
+      from 10.00 to 20.00.
+    - `category` (str): Comma separated primary keys of the categories to list.
+    - `min_price` (decimal): Lowest price, inclusive.
+    - `max_price` (decimal): Highest price, inclusive.
+    - `ordering` (str): Order by `name`, `category__name` or `price` instead of relevance.
+    - `cursor` (str): Opaque cursor of the page, taken from the `next`/`previous` links.
+    - `page_size` (int): Number of products per page.
+    - `fields` (str): Comma separated fields of the products, `*` for all of them.
+      Defaults to `id`, `name`, `price`, `category` and `thumbnail`.
+    - `omit` (str): Comma separated fields left out of all fields of the products.
+
+    Responses are cached per query string until the catalog changes. Reads go
+    to a replica database (see `common.db_routing`).
 
     Returns:
-    - `List[ProductSerializer]`: A list of product details.
+    - `List[ProductSerializer]`: A page of products.
     """
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    pagination_class = PageNumberPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["name", "category__name", "description", "price"]
+    default_fields = ProductSerializer.list_fields
+    pagination_class = KeysetPagination
+    filter_backends = [ProductSearchFilter, ProductFilter, filters.OrderingFilter]
     ordering_fields = ["name", "category__name", "price"]
 
+    def get_response_cache_key(self, request):
+        return CatalogCache.list_key(request)
 
-class ProductDetailsView(generics.RetrieveAPIView):
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "search", str, description=ProductSearchFilter.search_description
+            ),
+            ProductFacetsQuerySerializer,
+        ]
+    )
+)
+class ProductFacetsView(
+    ReplicaReadMixin, CachedResponseMixin, generics.RetrieveAPIView
+):
+    """
+    Retrieve the facets of the product list: product counts per category and a
+    histogram of the prices.
+
+    Parameters:
+    - `search` (str): Full-text search, like in the product list.
+    - `category` (str): Comma separated primary keys of the selected categories.
+    - `min_price` (decimal): Lowest selected price, inclusive.
+    - `max_price` (decimal): Highest selected price, inclusive.
+    - `price_interval` (decimal): Width of the price bands, `FACET_PRICE_INTERVAL` by default.
+      A wider one is used when the prices would fall in more than `FACET_MAX_BANDS` bands.
+
+    The category counts ignore the category filter and the histogram ignores
+    the price filter, so the other choices of each filter stay visible (see
+    `shop.facets`). Responses are cached per query string until the catalog
+    changes. Reads go to a replica database (see `common.db_routing`).
+
+    Returns:
+    - `ProductFacetsSerializer`: The product count, the categories and the price bands.
+    """
+
+    queryset = Product.objects.all()
+    serializer_class = ProductFacetsSerializer
+    filter_backends = [ProductSearchFilter]
+
+    def get_response_cache_key(self, request):
+        return CatalogCache.list_key(request)
+
+    def get_object(self):
+        params = ProductFacetsQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return ProductFacets(
+            self.filter_queryset(self.get_queryset()), **params.validated_data
+        ).compute()
+
+
+class ProductDetailsView(
+    ReplicaReadMixin, CachedResponseMixin, SparseFieldsetMixin, generics.RetrieveAPIView
+):
     """
     Retrieve details of a specific product.
 
+    Responses are cached until the product changes. Reads go to a replica
+    database (see `common.db_routing`).
+
     Parameters:
     - `pk` (int): The primary key of the product.
+    - `fields` (str): Comma separated fields of the product, all by default.
+    - `omit` (str): Comma separated fields left out.
 
     Returns:
     - `ProductSerializer`: Details of the specified product.
@@ -56,6 +149,29 @@ class ProductDetailsView(generics.RetrieveAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
+    def get_response_cache_key(self, request):
+        return CatalogCache.detail_key(self.kwargs["pk"], self.get_fieldset())
+
+
+class CatalogCacheStatsView(APIView):
+    """
+    Retrieve the hit and miss counters of the catalog response cache, accessible to sellers and admins only.
+
+    Returns:
+    - `Response`: {
+        "hits": (int) Responses served from the cache,
+        "misses": (int) Responses computed from the database,
+        "hit_ratio": (float) Share of hits among all lookups,
+        "catalog_version": (int) Current catalog version,
+    }
+    """
+
+    permission_classes = [IsSellerOrAdmin]
+
+    @extend_schema(responses={200: dict})
+    def get(self, request):
+        return Response(CatalogCache.stats(), status=status.HTTP_200_OK)
+
 
 class ProductCreateView(generics.CreateAPIView):
     """
@@ -93,6 +209,35 @@ class ProductCreateView(generics.CreateAPIView):
         )
 
 
+class ProductImportView(generics.GenericAPIView):
+    """
+    Create or update products in bulk from a CSV or JSON Lines file, accessible to
+    sellers and admins only.
+
+    Parameters:
+    - `file` (file): Rows with `sku`, `name`, `description`, `price` and `category`
+      (the category name, created when missing). Products are matched by `sku`.
+    - `format` (str): `csv` or `jsonl`, guessed from the file name by default.
+
+    Invalid rows are skipped and reported, the other rows are imported.
+
+    Returns:
+    - `Response`: {"imported": int, "error_count": int, "errors": [{"line": int, "errors": {...}}]}
+    """
+
+    serializer_class = ProductImportSerializer
+    permission_classes = [IsSellerOrAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = ProductImporter().run(
+            serializer.validated_data["file"], serializer.validated_data["format"]
+        )
+        return Response(report.as_dict())
+
+
 class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete a product, accessible to sellers and admins only.
@@ -125,7 +270,7 @@ class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         )
 
 
-class OrderCreateView(generics.CreateAPIView):
+class OrderCreateView(IdempotentCreateMixin, generics.CreateAPIView):
     """
     Create a new order, accessible to authenticated users.
 
@@ -133,8 +278,13 @@ class OrderCreateView(generics.CreateAPIView):
     - `first_name` (str): The first name of the customer.
     - `last_name` (str): The last name of the customer.
     - `delivery_address` (str): The delivery address for the order.
-    - `products` (List[Dict[str, Union[int, Product]]]): List of products and quantities. Example products input:
-    [{"products": 2, "quantity": 1}, {"products": 1, "quantity":2}]
+    - `products` (List[Dict[str, int]]): List of product primary keys and quantities. Example products input:
+    [{"product": 2, "quantity": 1}, {"product": 1, "quantity":2}]
+    - `reservation` (str): Optional token of a stock reservation made with `StockReservationView`.
+
+    Orders of products which are out of stock are rejected. Retries sent with the
+    same `Idempotency-Key` header and body get the response of the first request
+    instead of creating the order again.
 
     Returns:
     - `Response`: Order creation status and details.
@@ -143,25 +293,35 @@ class OrderCreateView(generics.CreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    @staticmethod
-    def calculate_aggregate_price(order):
+    def validate_customer_name(self, order_data):
         """
-        Calculate the aggregate price of an order based on its items.
+        Check that the order was placed with the name of the authenticated user.
 
         Parameters:
-        - `order` (Order): The order instance.
+        - `order_data` (dict): Validated order data.
 
         Returns:
-        - float: The aggregate price of the order.
+        - None
         """
-        total_price = 0
-        order_items = OrderItem.objects.filter(order=order)
+        if (
+            order_data["first_name"] != self.request.user.first_name
+            or order_data["last_name"] != self.request.user.last_name
+        ):
+            raise serializers.ValidationError("Incorrect first name or last name.")
 
-        for order_item in order_items:
-            product_price = order_item.product.price
-            total_price += product_price * order_item.quantity
+    @staticmethod
+    def send_order_emails(order):
+        """
+        Set up Celery tasks sending the confirmation and payment reminder emails.
 
-        return total_price
+        Parameters:
+        - `order` (Order): The created order.
+
+        Returns:
+        - None
+        """
+        EmailHandler.send_confirmation_email(order)
+        EmailHandler.send_payment_reminder_email(order)
 
     def create(self, request, *args, **kwargs):
         """
@@ -179,49 +339,15 @@ class OrderCreateView(generics.CreateAPIView):
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        self.validate_customer_name(serializer.validated_data)
 
-        delivery_address = serializer.validated_data["delivery_address"]
-        products_data = serializer.validated_data["products"]
-        user_first_name = serializer.validated_data["first_name"]
-        user_last_name = serializer.validated_data["last_name"]
-
-        payment_due_date = timezone.now() + timezone.timedelta(days=5)
-
-        if (
-            user_first_name == self.request.user.first_name
-            and user_last_name == self.request.user.last_name
-        ):
-            order = Order.objects.create(
-                customer=self.request.user,
-                delivery_address=delivery_address,
-                payment_due_date=payment_due_date,
-            )
-
-            for product_data in products_data:
-                product = product_data["product"]
-                quantity = product_data["quantity"]
-
-                if isinstance(product, Product):
-                    product_instance = product
-                else:
-                    product_instance = Product.objects.get(pk=product)
-
-                OrderItem.objects.create(
-                    order=order, product=product_instance, quantity=quantity
-                )
-
-            order.aggregate_price = self.calculate_aggregate_price(order)
-            order.save()
-        else:
-            raise serializers.ValidationError("Incorrect first name or last name.")
-
-        # Email management - setting up Celery tasks
-        EmailHandler.send_confirmation_email(
-            to_email=self.request.user.email, order=order
-        )
-        EmailHandler.send_payment_reminder_email(
-            to_email=self.request.user.email, order=order
+        order = OrderService.create_order(
+            customer=self.request.user,
+            delivery_address=serializer.validated_data["delivery_address"],
+            products_data=serializer.validated_data["products"],
+            reservation=serializer.validated_data.get("reservation"),
         )
+        self.send_order_emails(order)
 
         headers = self.get_success_headers(serializer.data)
         return Response(
@@ -235,26 +361,206 @@ class OrderCreateView(generics.CreateAPIView):
         )
 
 
+class OrderBatchCreateView(OrderCreateView):
+    """
+    Create many orders in one request, accessible to authenticated users.
+
+    All orders are created in a single transaction: if any of them is invalid,
+    none is created. Supports the `Idempotency-Key` header like `OrderCreateView`.
+
+    Parameters:
+    - `orders` (List[OrderSerializer]): Up to 100 orders in the format accepted by
+      `OrderCreateView`.
+
+    Returns:
+    - `Response`: Order creation status and details of every created order.
+    """
+
+    serializer_class = OrderBatchSerializer
+
+    def create(self, request, *args, **kwargs):
+        """
+        Create the orders and send confirmation emails for each of them.
+
+        Parameters:
+        - `request` (Request): The HTTP request.
+
+        Returns:
+        - `Response`: {
+                "status": "Orders created successfully",
+                "orders": [
+                    {"id": order.id, "aggregate_price": ..., "payment_due_date": ...},
+                ],
+            }
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        orders_data = serializer.validated_data["orders"]
+        for order_data in orders_data:
+            self.validate_customer_name(order_data)
+
+        orders = OrderService.create_orders(
+            customer=self.request.user,
+            orders_data=orders_data,
+            reservation=serializer.validated_data.get("reservation"),
+        )
+        # One Celery task confirms all orders of the batch.
+        EmailHandler.send_confirmation_emails(orders)
+        EmailHandler.send_payment_reminder_emails(orders)
+
+        return Response(
+            {
+                "status": "Orders created successfully",
+                "orders": [
+                    {
+                        "id": order.id,
+                        "aggregate_price": order.aggregate_price,
+                        "payment_due_date": order.payment_due_date,
+                    }
+                    for order in orders
+                ],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class StockReservationView(generics.CreateAPIView):
+    """
+    Reserve units of products for a later order, accessible to authenticated users.
+
+    The units are taken out of stock until the order is created with the
+    returned token or the reservation expires.
+
+    Parameters:
+    - `products` (List[Dict[str, int]]): Product primary keys and quantities, like for
+      `OrderCreateView`.
+
+    Returns:
+    - `Response`: {"reservation": token, "expires_at": expiry time}
+    """
+
+    serializer_class = StockReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_create(self, serializer):
+        token, expires_at = OrderService.reserve_stock(
+            self.request.user, serializer.validated_data["products"]
+        )
+        serializer.instance = {"reservation": token, "expires_at": expires_at}
+
+
 class OrderListView(generics.ListAPIView):
     """
-    List all orders, accessible to sellers and admins only.
+    List all orders, newest first, accessible to sellers and admins only.
+
+    Parameters:
+    - `cursor` (str): Opaque cursor of the page, taken from the `next`/`previous` links.
+    - `page_size` (int): Number of orders per page.
 
     Returns:
-    - `OrderListSerializer`: A list of order details.
+    - `OrderListSerializer`: A page of order details.
     """
 
     serializer_class = OrderListSerializer
     permission_classes = [IsSellerOrAdmin]
-    queryset = Order.objects.all()
+    pagination_class = KeysetPagination
+    queryset = Order.objects.prefetch_related("products").order_by("-pk")
+
+
+class ExportView(ReplicaReadMixin, APIView):
+    """
+    Base view streaming an `Export` as a file download, accessible to sellers and admins only.
+
+    The response starts before the whole export is read, so its size is not
+    limited by memory, under WSGI and ASGI alike. Reads go to a replica database
+    (see `common.db_routing`).
+    """
+
+    permission_classes = [IsSellerOrAdmin]
+    serializer_class = ExportSerializer
+    export_class = None
+
+    def perform_content_negotiation(self, request, force=False):
+        # the `format` query parameter selects the file format, not a renderer
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        options = dict(serializer.validated_data)
+        # the rows are read after the view returned, outside of the routing of
+        # the request, so the database is chosen now
+        export = self.export_class(
+            file_format=options.pop("format"),
+            using=router.db_for_read(self.export_class.model),
+            **options,
+        )
+        # the ASGI handler only streams async iterators
+        if isinstance(request._request, ASGIRequest):
+            content = export.astream()
+        else:
+            content = export.stream()
+        response = StreamingHttpResponse(content, content_type=export.content_type)
+        response["Content-Disposition"] = f'attachment; filename="{export.filename}"'
+        return response
+
+
+class OrderExportView(ExportView):
+    """
+    Export orders with their line items and totals as CSV or JSON Lines.
+
+    Parameters:
+    - `format` (str): `csv` (one line per order item, the default) or `jsonl`
+      (one object per order).
+    - `start_date` (date): Only orders placed on or after this day.
+    - `end_date` (date): Only orders placed on or before this day.
+    - `gzip` (bool): Compress the file with gzip.
+
+    Returns:
+    - `StreamingHttpResponse`: The `orders.csv` or `orders.jsonl` file.
+    """
+
+    serializer_class = OrderExportSerializer
+    export_class = OrderExport
 
+    @extend_schema(
+        parameters=[OrderExportSerializer], responses={200: OpenApiTypes.BINARY}
+    )
+    def get(self, request):
+        return super().get(request)
+
+
+class ProductExportView(ExportView):
+    """
+    Export the product catalog as CSV or JSON Lines, in the format accepted by
+    `ProductImportView`.
 
-class OrderProductsStatisticsView(APIView):
+    Parameters:
+    - `format` (str): `csv` (the default) or `jsonl`.
+    - `gzip` (bool): Compress the file with gzip.
+
+    Returns:
+    - `StreamingHttpResponse`: The `products.csv` or `products.jsonl` file.
+    """
+
+    export_class = ProductExport
+
+    @extend_schema(parameters=[ExportSerializer], responses={200: OpenApiTypes.BINARY})
+    def get(self, request):
+        return super().get(request)
+
+
+class OrderProductsStatisticsView(ReplicaReadMixin, APIView):
     """
     Calculate and retrieve statistics on the most ordered products within a specified date range.
 
+    The statistics are read from the `ProductSalesDaily` rollups, so the cost depends
+    on the number of days and products in the range, not on the number of orders.
+    Reads go to a replica database (see `common.db_routing`).
+
     Parameters:
-    - `start_date` (date): The start date of the analysis period.
-    - `end_date` (date): The end date of the analysis period.
+    - `start_date` (date): The first day of the analysis period.
+    - `end_date` (date): The last day of the analysis period (inclusive).
     - `number_of_products` (int): The number of top products to retrieve.
 
     Returns:
@@ -267,6 +573,20 @@ class OrderProductsStatisticsView(APIView):
     permission_classes = [IsSellerOrAdmin]
     serializer_class = ProductStatsInputSerializer
     parser_classes = [MultiPartParser, FormParser]
+    # the statistics are read-only despite the POST method
+    replica_methods = ("POST",)
+
+    @staticmethod
+    def most_ordered_products(start_date, end_date, number_of_products):
+        """
+        Return the rollup query of the most ordered products, also used by the async view.
+        """
+        return (
+            ProductSalesDaily.objects.filter(day__range=(start_date, end_date))
+            .values("product_id", "product__name")
+            .annotate(total_orders=Sum("order_count"))
+            .order_by("-total_orders", "product_id")[:number_of_products]
+        )
 
     @extend_schema(
         request=ProductStatsInputSerializer,
@@ -280,11 +600,8 @@ class OrderProductsStatisticsView(APIView):
         end_date = input_serializer.validated_data["end_date"]
         number_of_products = input_serializer.validated_data["number_of_products"]
 
-        most_ordered_products = (
-            OrderItem.objects.filter(order__order_date__range=(start_date, end_date))
-            .values("product__name")
-            .annotate(total_orders=Count("product"))
-            .order_by("-total_orders")[:number_of_products]
+        most_ordered_products = self.most_ordered_products(
+            start_date, end_date, number_of_products
         )
         result_data = [
             {
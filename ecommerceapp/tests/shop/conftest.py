@@ -1,15 +1,39 @@
 from datetime import timedelta
 import pytest
+from django.core.cache import cache
 from django.utils import timezone
 from users.models import UserRole
 from shop.models import ProductCategory, Product, Order, OrderItem
+from shop.search import SQLiteFTSBackend, get_search_backend
 from shop.serializers import ProductSerializer
 from rest_framework.test import APIClient
-from rest_framework_simplejwt.tokens import RefreshToken
+from users.tokens import RoleRefreshToken
+
+
+@pytest.fixture(scope="session")
+def django_db_setup(django_db_setup, django_db_blocker):
+    # the test database is created without migrations, the search index with them
+    backend = get_search_backend()
+    if isinstance(backend, SQLiteFTSBackend):
+        with django_db_blocker.unblock():
+            backend.ensure_index()
+
+
+@pytest.fixture(autouse=True)
+def read_from_primary(settings):
+    # tests get only the default database unless they ask for the replica
+    settings.DATABASE_REPLICAS = []
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
 
 
 def create_authenticated_client(user):
-    refresh = RefreshToken.for_user(user)
+    refresh = RoleRefreshToken.for_user(user)
     access_token = str(refresh.access_token)
     client = APIClient()
     client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
@@ -0,0 +1,189 @@
+import pytest
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+from common import authentication
+from users.tokens import RoleRefreshToken
+from shop.services import OrderService
+
+
+@pytest.fixture
+def statistics_payload(user_customer, product, product2):
+    OrderService.create_orders(
+        user_customer,
+        [
+            {
+                "delivery_address": "address",
+                "products": [{"product": product2.id, "quantity": 1}],
+            }
+        ],
+    )
+    today = timezone.localdate().isoformat()
+    return {"start_date": today, "end_date": today, "number_of_products": 5}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "params",
+    [{}, {"ordering": "-price"}, {"search": "test"}],
+)
+def test_async_product_list_matches_sync_view(
+    client_unauthenticated, product, product2, params
+):
+    sync_response = client_unauthenticated.get(reverse("product-list"), params)
+    async_response = client_unauthenticated.get(reverse("async-product-list"), params)
+
+    assert async_response.status_code == status.HTTP_200_OK
+    assert async_response.json()["results"] == sync_response.json()["results"]
+
+
+@pytest.mark.django_db
+def test_async_product_list_follows_cursors(client_unauthenticated, product, product2):
+    url = reverse("async-product-list")
+
+    first = client_unauthenticated.get(url, {"page_size": 1}).json()
+    second = client_unauthenticated.get(first["next"]).json()
+
+    assert [item["id"] for item in first["results"] + second["results"]] == [1, 2]
+    assert second["next"] is None
+    assert second["previous"] is not None
+
+
+@pytest.mark.django_db
+def test_async_product_list_follows_cursors_of_related_orderings(
+    client_unauthenticated, product, product2
+):
+    url = reverse("async-product-list")
+    params = {"page_size": 1, "ordering": "category__name"}
+
+    first = client_unauthenticated.get(url, params)
+    second = client_unauthenticated.get(first.json()["next"])
+
+    assert first.status_code == status.HTTP_200_OK
+    assert second.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in first.json()["results"]] == [1]
+    assert [item["id"] for item in second.json()["results"]] == [2]
+
+
+@pytest.mark.django_db
+def test_async_product_list_is_served_from_cache(
+    client_unauthenticated, product, django_assert_num_queries
+):
+    url = reverse("async-product-list")
+    first = client_unauthenticated.get(url)
+
+    with django_assert_num_queries(0):
+        second = client_unauthenticated.get(url)
+
+    assert first["X-Cache"] == "MISS"
+    assert second["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+
+
+@pytest.mark.django_db
+def test_async_product_details(client_unauthenticated, product):
+    response = client_unauthenticated.get(
+        reverse("async-product-details", kwargs={"pk": product.id})
+    )
+    missing = client_unauthenticated.get(
+        reverse("async-product-details", kwargs={"pk": 404})
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["name"] == product.name
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_async_and_sync_product_details_share_the_cache(
+    client_unauthenticated, product
+):
+    client_unauthenticated.get(reverse("product-details", kwargs={"pk": product.id}))
+    response = client_unauthenticated.get(
+        reverse("async-product-details", kwargs={"pk": product.id})
+    )
+
+    assert response["X-Cache"] == "HIT"
+
+
+@pytest.mark.django_db
+def test_async_order_statistics_match_sync_view(client_seller, statistics_payload):
+    sync_response = client_seller.post(
+        reverse("order-statistics"), data=statistics_payload
+    )
+    async_response = client_seller.post(
+        reverse("async-order-statistics"), data=statistics_payload
+    )
+
+    assert async_response.status_code == status.HTTP_200_OK
+    assert async_response.json() == sync_response.json()
+
+
+@pytest.mark.django_db
+def test_async_order_statistics_permissions(
+    client_unauthenticated, client_customer, statistics_payload
+):
+    url = reverse("async-order-statistics")
+
+    unauthenticated = client_unauthenticated.post(url, data=statistics_payload)
+    customer = client_customer.post(url, data=statistics_payload)
+
+    assert unauthenticated.status_code == status.HTTP_401_UNAUTHORIZED
+    assert "WWW-Authenticate" in unauthenticated
+    assert customer.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_async_order_statistics_validates_input(client_seller):
+    response = client_seller.post(
+        reverse("async-order-statistics"), data={"number_of_products": 5}
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "start_date" in response.json()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", ["order-statistics", "async-order-statistics"])
+def test_bearer_tokens_are_not_subject_to_csrf(user_seller, statistics_payload, name):
+    client = APIClient(enforce_csrf_checks=True)
+    token = RoleRefreshToken.for_user(user_seller).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    response = client.post(reverse(name), data=statistics_payload)
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", ["order-statistics", "async-order-statistics"])
+def test_cookie_tokens_are_subject_to_csrf(user_seller, statistics_payload, name):
+    client = APIClient(enforce_csrf_checks=True)
+    client.cookies[authentication.api_settings.JWT_AUTH_COOKIE] = str(
+        RoleRefreshToken.for_user(user_seller).access_token
+    )
+
+    response = client.post(reverse(name), data=statistics_payload)
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert response.json()["detail"].startswith("CSRF Failed")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", ["order-statistics", "async-order-statistics"])
+def test_cookie_tokens_with_a_csrf_token_are_accepted(
+    user_seller, statistics_payload, name
+):
+    client = APIClient(enforce_csrf_checks=True)
+    client.cookies[authentication.api_settings.JWT_AUTH_COOKIE] = str(
+        RoleRefreshToken.for_user(user_seller).access_token
+    )
+    client.cookies[settings.CSRF_COOKIE_NAME] = "x" * 32
+
+    response = client.post(
+        reverse(name), data=statistics_payload, HTTP_X_CSRFTOKEN="x" * 32
+    )
+
+    assert response.status_code == status.HTTP_200_OK
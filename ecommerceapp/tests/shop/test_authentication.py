@@ -0,0 +1,147 @@
+import pytest
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from users.models import UserRole
+from users.tokens import RoleRefreshToken, TokenUserRole
+
+
+@pytest.mark.django_db
+def test_login_issues_role_tokens(user_seller):
+    response = APIClient().post(
+        reverse("rest_login"), {"username": "testseller", "password": "test12345"}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    token = AccessToken(response.data["access"])
+    assert token["role"] == "seller"
+    assert token["is_superuser"] is False
+    assert token["token_version"] == 0
+
+
+@pytest.mark.django_db
+def test_role_token_skips_user_query(client_seller, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        response = client_seller.get(reverse("catalog-cache-stats"))
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_token_user_loads_user_lazily(user_seller, django_assert_num_queries):
+    user = TokenUserRole(RoleRefreshToken.for_user(user_seller).access_token)
+
+    with django_assert_num_queries(0):
+        assert (user.pk, user.role, user.first_name) == (
+            user_seller.pk,
+            "seller",
+            "test",
+        )
+        assert user.is_authenticated
+
+    with django_assert_num_queries(1):
+        assert user.email == user_seller.email
+        assert isinstance(user, UserRole)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "field, value",
+    [("role", "customer"), ("is_active", False), ("first_name", "renamed")],
+)
+def test_claim_changes_revoke_tokens(
+    client_seller, user_seller, field, value, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        setattr(user_seller, field, value)
+        user_seller.save()
+
+    response = client_seller.get(reverse("catalog-cache-stats"))
+    async_response = client_seller.post(reverse("async-order-statistics"))
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert async_response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_saving_a_stale_user_keeps_the_revocation(
+    client_seller, user_seller, django_capture_on_commit_callbacks
+):
+    stale = UserRole.objects.get(pk=user_seller.pk)
+    with django_capture_on_commit_callbacks(execute=True):
+        user_seller.role = "customer"
+        user_seller.save()
+
+    stale.email = "new@example.com"
+    stale.save()
+
+    assert UserRole.objects.get(pk=user_seller.pk).token_version == 1
+    response = client_seller.get(reverse("catalog-cache-stats"))
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_password_change_revokes_tokens(
+    client_seller, user_seller, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks() as callbacks:
+        user_seller.set_password("new-password")
+        user_seller.save()
+    # until the commit, the previous version stays cached
+    uncommitted = client_seller.get(reverse("catalog-cache-stats"))
+    for callback in callbacks:
+        callback()
+
+    response = client_seller.get(reverse("catalog-cache-stats"))
+
+    assert uncommitted.status_code == status.HTTP_200_OK
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_signup_issues_customer_tokens(settings, django_capture_on_commit_callbacks):
+    settings.ACCOUNT_EMAIL_VERIFICATION = "none"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = APIClient().post(
+            reverse("rest_register"),
+            {
+                "username": "newcustomer",
+                "email": "newcustomer@example.com",
+                "password1": "Sup3r-secret-pass",
+                "password2": "Sup3r-secret-pass",
+            },
+        )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    token = AccessToken(response.data["access"])
+    assert token["role"] == "customer"
+    # the token is not revoked by setting the role afterwards
+    user = UserRole.objects.get(username="newcustomer")
+    assert (user.role, user.token_version) == ("customer", token["token_version"])
+
+
+@pytest.mark.django_db
+def test_other_changes_keep_tokens(client_seller, user_seller):
+    user_seller.email = "new@example.com"
+    user_seller.save()
+    UserRole.objects.get(pk=user_seller.pk).save(update_fields=["last_login"])
+
+    response = client_seller.get(reverse("catalog-cache-stats"))
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_tokens_without_role_claims_load_the_user(
+    user_seller, django_assert_num_queries
+):
+    client = APIClient()
+    access_token = RefreshToken.for_user(user_seller).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+
+    with django_assert_num_queries(1):
+        response = client.get(reverse("catalog-cache-stats"))
+
+    assert response.status_code == status.HTTP_200_OK
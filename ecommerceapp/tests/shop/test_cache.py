@@ -0,0 +1,110 @@
+import pytest
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.cache import CatalogCache
+
+
+@pytest.mark.django_db
+def test_product_list_is_served_from_cache(
+    client_unauthenticated, product, django_assert_num_queries
+):
+    url = reverse("product-list")
+    first = client_unauthenticated.get(url, {"ordering": "price"})
+
+    with django_assert_num_queries(0):
+        second = client_unauthenticated.get(url, {"ordering": "price"})
+
+    assert first["X-Cache"] == "MISS"
+    assert second["X-Cache"] == "HIT"
+    assert second.data == first.data
+    assert client_unauthenticated.get(url, {"ordering": "name"})["X-Cache"] == "MISS"
+    assert CatalogCache.stats()["hits"] == 1
+    assert CatalogCache.stats()["misses"] == 2
+
+
+@pytest.mark.django_db
+def test_catalog_changes_invalidate_cached_lists(
+    client_unauthenticated, product, django_capture_on_commit_callbacks
+):
+    url = reverse("product-list")
+    client_unauthenticated.get(url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.category.name = "Renamed"
+        product.category.save()
+    assert client_unauthenticated.get(url)["X-Cache"] == "MISS"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.price = "1.00"
+        product.save()
+    response = client_unauthenticated.get(url)
+    assert response["X-Cache"] == "MISS"
+    assert response.data["results"][0]["price"] == "1.00"
+
+
+@pytest.mark.django_db
+def test_product_detail_cache_is_per_product(
+    client_unauthenticated,
+    client_seller,
+    product,
+    product2,
+    django_capture_on_commit_callbacks,
+):
+    url = reverse("product-details", kwargs={"pk": product.id})
+    other_url = reverse("product-details", kwargs={"pk": product2.id})
+    client_unauthenticated.get(url)
+    client_unauthenticated.get(other_url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product2.name = "Changed"
+        product2.save()
+
+    assert client_unauthenticated.get(url)["X-Cache"] == "HIT"
+    response = client_unauthenticated.get(other_url)
+    assert response["X-Cache"] == "MISS"
+    assert response.data["name"] == "Changed"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client_seller.delete(
+            reverse("retrieve-update-delete-product", kwargs={"pk": product.id})
+        )
+    assert client_unauthenticated.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_versions_are_bumped_once_committed(
+    product, django_capture_on_commit_callbacks
+):
+    list_version = CatalogCache.catalog_version()
+    detail_key = CatalogCache.detail_key(product.pk)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        product.price = "1.00"
+        product.save()
+        # until the commit, other processes still read the previous rows
+        assert CatalogCache.catalog_version() == list_version
+        assert CatalogCache.detail_key(product.pk) == detail_key
+
+    for callback in callbacks:
+        callback()
+    assert CatalogCache.catalog_version() != list_version
+    assert CatalogCache.detail_key(product.pk) != detail_key
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "client_fixture, expected_status_code",
+    [
+        ("client_customer", status.HTTP_403_FORBIDDEN),
+        ("client_seller", status.HTTP_200_OK),
+        ("client_unauthenticated", status.HTTP_401_UNAUTHORIZED),
+    ],
+)
+def test_catalog_cache_stats_view(request, client_fixture, expected_status_code):
+    client = request.getfixturevalue(client_fixture)
+
+    response = client.get(reverse("catalog-cache-stats"))
+
+    assert response.status_code == expected_status_code
+    if expected_status_code == status.HTTP_200_OK:
+        assert set(response.data) == {"hits", "misses", "hit_ratio", "catalog_version"}
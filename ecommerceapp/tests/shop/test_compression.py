@@ -0,0 +1,156 @@
+import datetime
+import gzip
+import json
+import uuid
+from decimal import Decimal
+import pytest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+from common.compression import CompressionMiddleware, choose_encoding
+from common.renderers import ORJSONRenderer
+
+BODY = json.dumps([{"name": "Test Product", "price": "123.12"}] * 100).encode()
+
+
+def compress(accept_encoding, response):
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+def json_response(content=BODY, **headers):
+    response = HttpResponse(content, content_type="application/json")
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"price": Decimal("123.12"), "aggregate_price": Decimal("0.10")},
+        {"order_date": datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.UTC)},
+        {"order_date": datetime.datetime(2024, 1, 2, 3, 4, 5, 678901)},
+        {"start": datetime.time(3, 4, 5, 678901)},
+        {"payment_due_date": datetime.date(2024, 1, 2), "id": uuid.UUID(int=1)},
+        {"name": "line paragraph ünïcode", "nested": [{"a": None}]},
+    ],
+)
+def test_orjson_renderer_matches_json_renderer(data):
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+@pytest.mark.django_db
+def test_orjson_renderer_matches_json_renderer_for_models(order):
+    order.payment_due_date = datetime.datetime(
+        2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.UTC
+    )
+    order.save()
+    order.refresh_from_db()
+    data = {
+        "id": order.id,
+        "order_date": order.order_date,
+        "payment_due_date": order.payment_due_date,
+        "aggregate_price": order.aggregate_price,
+    }
+
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+def test_orjson_renderer_indents():
+    rendered = ORJSONRenderer().render({"a": [1]}, "application/json; indent=2", {})
+
+    assert rendered == b'{\n  "a": [\n    1\n  ]\n}'
+
+
+@pytest.mark.django_db
+def test_orjson_parser_rejects_invalid_json(client_customer):
+    response = client_customer.post(
+        reverse("create-order"),
+        b'{"delivery_address": NaN}',
+        content_type="application/json",
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"].startswith("JSON parse error")
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, deflate, br, zstd", "zstd"),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("br;q=0, *;q=0.1", "zstd"),
+        ("identity", None),
+        ("zstd;q=0, br;q=0, gzip;q=0", None),
+        ("", None),
+    ],
+)
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, ["zstd", "br", "gzip"]) == expected
+
+
+def test_gzip_compression():
+    response = compress("gzip", json_response(ETag='"abc"'))
+
+    assert response["Content-Encoding"] == "gzip"
+    assert response["Vary"] == "Accept-Encoding"
+    assert response["ETag"] == 'W/"abc"'
+    assert int(response["Content-Length"]) == len(response.content) < len(BODY)
+    assert gzip.decompress(response.content) == BODY
+
+
+@pytest.mark.parametrize("module, encoding", [("brotli", "br"), ("zstandard", "zstd")])
+def test_optional_encodings(module, encoding):
+    package = pytest.importorskip(module)
+
+    response = compress(encoding, json_response())
+
+    assert response["Content-Encoding"] == encoding
+    assert package.decompress(response.content) == BODY
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        json_response(b"{}"),
+        json_response(**{"Content-Encoding": "gzip"}),
+        HttpResponse(BODY, content_type="image/png"),
+        # pages with CSRF tokens, see BREACH
+        HttpResponse(BODY, content_type="text/html; charset=utf-8"),
+        StreamingHttpResponse(iter([BODY]), content_type="application/json"),
+    ],
+    ids=["small", "encoded", "image", "html", "streaming"],
+)
+def test_responses_which_are_not_compressed(response):
+    response = compress("gzip", response)
+
+    # the content does not depend on Accept-Encoding
+    assert not response.has_header("Vary")
+
+
+@pytest.mark.django_db
+def test_api_responses_are_compressed(settings, product, product2):
+    settings.COMPRESSION_MIN_SIZE = 100
+    # a new client loads the middleware with the current settings
+    client = APIClient()
+
+    response = client.get(reverse("product-list"), HTTP_ACCEPT_ENCODING="gzip")
+    plain = client.get(reverse("product-list"))
+
+    assert response["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.content) == plain.content
+    assert json.loads(plain.content)["results"][0]["price"] == "123.12"
+
+
+@pytest.mark.django_db
+def test_html_pages_are_not_compressed(settings, client):
+    settings.COMPRESSION_MIN_SIZE = 100
+
+    response = client.get("/admin/login/", HTTP_ACCEPT_ENCODING="gzip")
+
+    assert b"csrfmiddlewaretoken" in response.content
+    assert not response.has_header("Content-Encoding")
@@ -0,0 +1,138 @@
+import pytest
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.cache import CatalogCache
+from shop.models import Product, ProductCategory
+
+# The replica is a separate SQLite file which is not replicated, so rows created
+# there directly show which database a view read from.
+pytestmark = pytest.mark.django_db(transaction=True, databases=["default", "replica"])
+
+
+@pytest.fixture(autouse=True)
+def read_from_replica(settings):
+    settings.DATABASE_REPLICAS = ["replica"]
+    settings.REPLICA_LAG_PIN_SECONDS = 60
+
+
+@pytest.fixture
+def replica_product():
+    category = ProductCategory.objects.using("replica").create(name="Replica")
+    return Product.objects.using("replica").create(
+        name="Replica product",
+        description="Only in the replica",
+        price="1.00",
+        category=category,
+    )
+
+
+def product_names(response):
+    return [product["name"] for product in response.data["results"]]
+
+
+def test_read_only_views_read_from_replica(
+    client_unauthenticated, product, replica_product
+):
+    response = client_unauthenticated.get(reverse("product-list"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert product_names(response) == ["Replica product"]
+
+    response = client_unauthenticated.get(
+        reverse("product-details", args=[replica_product.id])
+    )
+    assert response.data["name"] == "Replica product"
+
+
+def test_async_views_read_from_replica(
+    client_unauthenticated, product, replica_product
+):
+    response = client_unauthenticated.get(reverse("async-product-list"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["name"] for item in response.json()["results"]] == ["Replica product"]
+
+
+def test_other_views_read_from_primary(client_seller, product, replica_product):
+    response = client_seller.get(
+        reverse("retrieve-update-delete-product", args=[product.id])
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["name"] == product.name
+
+
+def test_reads_without_replicas_go_to_primary(
+    client_unauthenticated, product, replica_product, settings
+):
+    settings.DATABASE_REPLICAS = []
+
+    response = client_unauthenticated.get(reverse("product-list"))
+
+    assert product_names(response) == [product.name]
+
+
+def test_writes_pin_user_to_primary(client_seller, product, replica_product):
+    url = reverse("product-list")
+    assert product_names(client_seller.get(url)) == ["Replica product"]
+
+    response = client_seller.patch(
+        reverse("retrieve-update-delete-product", args=[product.id]),
+        {"price": "2.00"},
+        format="multipart",
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert Product.objects.using("replica").filter(pk=product.id).count() == 0
+
+    # the seller now reads own writes from the primary, others still use the replica
+    assert product_names(client_seller.get(url, {"page_size": 10})) == [product.name]
+
+
+def test_pin_expires(client_seller, product, replica_product, settings):
+    settings.REPLICA_LAG_PIN_SECONDS = 0
+    client_seller.patch(
+        reverse("retrieve-update-delete-product", args=[product.id]),
+        {"price": "2.00"},
+        format="multipart",
+    )
+
+    response = client_seller.get(reverse("product-list"), {"page_size": 10})
+
+    assert product_names(response) == ["Replica product"]
+
+
+@pytest.mark.parametrize("name", ["product-list", "async-product-list"])
+def test_replica_reads_are_not_cached_right_after_a_change(
+    client_unauthenticated, product, replica_product, name
+):
+    CatalogCache.bump_catalog_version()
+
+    first = client_unauthenticated.get(reverse(name))
+    second = client_unauthenticated.get(reverse(name))
+
+    assert first["X-Cache"] == second["X-Cache"] == "MISS"
+
+
+@pytest.mark.parametrize("name", ["product-list", "async-product-list"])
+def test_replica_reads_are_cached_once_replicas_caught_up(
+    client_unauthenticated, product, replica_product, name
+):
+    cache.delete(CatalogCache.changed_key)
+
+    client_unauthenticated.get(reverse(name))
+    response = client_unauthenticated.get(reverse(name))
+
+    assert response["X-Cache"] == "HIT"
+
+
+def test_primary_reads_are_cached_right_after_a_change(
+    client_unauthenticated, product, settings
+):
+    settings.DATABASE_REPLICAS = []
+    CatalogCache.bump_catalog_version()
+
+    client_unauthenticated.get(reverse("product-list"))
+    response = client_unauthenticated.get(reverse("product-list"))
+
+    assert response["X-Cache"] == "HIT"
@@ -0,0 +1,118 @@
+import smtplib
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from common.email_handler import EmailHandler
+from common.mail import send_batch
+from shop.tasks import send_email_batch_task, send_email_task, send_order_emails_task
+
+
+def email_message(recipient):
+    return {
+        "subject": "Subject",
+        "plain_message": "Plain",
+        "from_email": "shop@example.com",
+        "to_email": [recipient],
+        "html_message": "<p>Plain</p>",
+    }
+
+
+class FlakyBackend(EmailBackend):
+    """
+    Local memory backend dropping the connection when sending to `broken@example.com`.
+    """
+
+    def send_messages(self, messages):
+        if any("broken@example.com" in message.to for message in messages):
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def flaky_backend(settings):
+    settings.EMAIL_BACKEND = "tests.shop.test_emails.FlakyBackend"
+
+
+def test_send_batch_uses_one_connection(mocker):
+    get_connection = mocker.patch(
+        "common.mail.get_connection", wraps=mail.get_connection
+    )
+    messages = [email_message(f"customer{index}@example.com") for index in range(5)]
+
+    failed = send_batch(messages)
+
+    assert failed == []
+    get_connection.assert_called_once()
+    assert [message.to for message in mail.outbox] == [
+        message["to_email"] for message in messages
+    ]
+    assert mail.outbox[0].alternatives == [("<p>Plain</p>", "text/html")]
+
+
+def test_send_batch_reports_failed_recipients(flaky_backend):
+    messages = [
+        email_message("first@example.com"),
+        email_message("broken@example.com"),
+        email_message("last@example.com"),
+    ]
+
+    failed = send_batch(messages)
+
+    assert [message["to_email"] for message, _ in failed] == [["broken@example.com"]]
+    assert [message.to for message in mail.outbox] == [
+        ["first@example.com"],
+        ["last@example.com"],
+    ]
+
+
+def test_send_email_batch_task_retries_failed_emails_individually(
+    flaky_backend, mocker
+):
+    apply_async = mocker.patch("shop.tasks.send_email_task.apply_async")
+    messages = [email_message("first@example.com"), email_message("broken@example.com")]
+
+    sent = send_email_batch_task(messages)
+
+    assert sent == 1
+    apply_async.assert_called_once_with(kwargs=messages[1], countdown=30)
+
+
+def test_send_email_task_retries_with_backoff(mocker):
+    mocker.patch("shop.tasks.send_mail", side_effect=smtplib.SMTPException("busy"))
+    retry = mocker.patch.object(send_email_task, "retry", side_effect=RuntimeError)
+
+    with pytest.raises(RuntimeError):
+        send_email_task(**email_message("customer@example.com"))
+
+    assert retry.call_args.kwargs["countdown"] == 30
+
+
+@pytest.mark.django_db
+def test_send_order_emails_task_renders_in_worker(order, user_customer):
+    sent = send_order_emails_task(
+        [[order.id, "confirmation"], [order.id, "payment_reminder"]]
+    )
+
+    assert sent == 2
+    confirmation, reminder = mail.outbox
+    assert confirmation.subject == "Order Confirmation"
+    assert reminder.subject == "Payment reminder"
+    assert confirmation.to == [user_customer.email]
+    assert "Test Product - Quantity: 1" in confirmation.body
+    assert "<h1>Order Confirmation</h1>" in confirmation.alternatives[0][0]
+
+
+@pytest.mark.django_db
+def test_email_handler_enqueues_only_order_ids(
+    order, mocker, django_capture_on_commit_callbacks
+):
+    delay = mocker.patch("shop.tasks.send_order_emails_task.delay")
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        EmailHandler.send_confirmation_email(order)
+    # the orders may not be committed before
+    delay.assert_not_called()
+    for callback in callbacks:
+        callback()
+
+    delay.assert_called_once_with([(order.id, "confirmation")])
@@ -0,0 +1,175 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.exporting import OrderExport, ProductExport
+from shop.models import Order
+from shop.services import OrderService
+from users.tokens import RoleRefreshToken
+
+
+@pytest.fixture
+def orders(user_customer, product, product2):
+    orders = OrderService.create_orders(
+        user_customer,
+        [
+            {
+                "delivery_address": f"address {index}",
+                "products": [
+                    {"product": product.pk, "quantity": 1},
+                    {"product": product2.pk, "quantity": index + 1},
+                ],
+            }
+            for index in range(5)
+        ],
+    )
+    # the first order was placed ten days ago
+    Order.objects.filter(pk=orders[0].pk).update(
+        order_date=timezone.now() - timezone.timedelta(days=10)
+    )
+    return orders
+
+
+def content(export):
+    return b"".join(export.stream())
+
+
+def download(client, name, **params):
+    response = client.get(reverse(name), params)
+    return response, b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_order_csv_has_a_line_per_item(orders):
+    rows = list(csv.DictReader(io.StringIO(content(OrderExport()).decode())))
+
+    assert len(rows) == 10
+    assert rows[0]["order_id"] == str(orders[0].pk)
+    assert rows[3]["product_id"] == "2"
+    assert rows[3]["quantity"] == "2"
+    assert rows[3]["unit_price"] == "3.29"
+    assert rows[3]["line_total"] == "6.58"
+    assert rows[3]["aggregate_price"] == str(orders[1].aggregate_price)
+
+
+@pytest.mark.django_db
+def test_order_csv_keeps_orders_without_items(orders):
+    orders[2].orderitem_set.all().delete()
+
+    rows = list(csv.DictReader(io.StringIO(content(OrderExport()).decode())))
+
+    assert [row["order_id"] for row in rows].count(str(orders[2].pk)) == 1
+    empty = next(row for row in rows if row["order_id"] == str(orders[2].pk))
+    assert empty["delivery_address"] == "address 2"
+    assert [empty[column] for column in OrderExport.item_columns] == [""] * 6
+    assert len(rows) == 9
+
+
+@pytest.mark.django_db
+def test_order_jsonl_nests_items(orders):
+    records = [
+        json.loads(line)
+        for line in content(OrderExport(file_format="jsonl")).splitlines()
+    ]
+
+    assert [record["order_id"] for record in records] == [o.pk for o in orders]
+    assert [item["product_id"] for item in records[0]["items"]] == [1, 2]
+    assert records[0]["items"][0]["product_name"] == "Test Product"
+
+
+@pytest.mark.django_db
+def test_orders_are_filtered_by_date(orders):
+    today = timezone.localdate()
+    recent = OrderExport(file_format="jsonl", start_date=today, end_date=today)
+    old = OrderExport(file_format="jsonl", end_date=today - timezone.timedelta(days=1))
+
+    assert len(content(recent).splitlines()) == 4
+    assert json.loads(content(old))["order_id"] == orders[0].pk
+
+
+@pytest.mark.django_db
+def test_items_are_prefetched_per_chunk(orders, settings):
+    settings.EXPORT_CHUNK_SIZE = 2
+
+    with CaptureQueriesContext(connection) as queries:
+        content(OrderExport())
+
+    # one cursor over the orders, read in three chunks with their items
+    assert len(queries) == 4
+
+
+@pytest.mark.django_db
+def test_gzip_export(orders):
+    plain = content(OrderExport())
+    compressed = list(OrderExport(gzip=True).stream())
+
+    # the header is sent before the orders are read
+    assert gzip.decompress(b"".join(compressed)) == plain
+    assert len(compressed) == 2
+
+
+@pytest.mark.django_db
+def test_product_export_can_be_imported_again(product, product2):
+    product.sku = "A-1"
+    product.save()
+
+    rows = list(csv.DictReader(io.StringIO(content(ProductExport()).decode())))
+
+    assert rows[0] == {
+        "id": "1",
+        "sku": "A-1",
+        "name": "Test Product",
+        "description": "Test Description",
+        "price": "123.12",
+        "category": "Test Category",
+    }
+    assert rows[1]["sku"] == ""
+
+
+@pytest.mark.django_db
+def test_export_views(client_seller, client_customer, orders):
+    response, body = download(
+        client_seller, "export-orders", format="jsonl", gzip="true"
+    )
+    forbidden = client_customer.get(reverse("export-products"))
+    invalid = client_seller.get(reverse("export-orders"), {"format": "xml"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "application/gzip"
+    assert response["Content-Disposition"] == 'attachment; filename="orders.jsonl.gz"'
+    assert len(gzip.decompress(body).splitlines()) == 5
+    assert forbidden.status_code == status.HTTP_403_FORBIDDEN
+    assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+    assert "format" in invalid.json()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("gzip_export", ["false", "true"])
+def test_export_views_stream_async_iterators_over_asgi(
+    client_seller, user_seller, orders, gzip_export
+):
+    token = RoleRefreshToken.for_user(user_seller).access_token
+    params = {"format": "jsonl", "gzip": gzip_export}
+
+    async def download_over_asgi():
+        response = await AsyncClient().get(
+            reverse("export-orders"),
+            params,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        blocks = [block async for block in response.streaming_content]
+        return response, b"".join(blocks)
+
+    response, body = async_to_sync(download_over_asgi)()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.is_async
+    assert body == download(client_seller, "export-orders", **params)[1]
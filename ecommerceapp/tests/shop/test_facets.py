@@ -0,0 +1,151 @@
+import pytest
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.models import Product, ProductCategory
+
+
+@pytest.fixture
+def catalog(product, product2):
+    books = ProductCategory.objects.create(id=2, name="Books")
+    for price in ["9.99", "10.00", "55.50"]:
+        Product.objects.create(
+            name="Novel", description="Paperback", price=price, category=books
+        )
+    return books
+
+
+def facets(client, **params):
+    response = client.get(reverse("product-facets"), params)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def ids(response):
+    return [entry["id"] for entry in response.json()["results"]]
+
+
+@pytest.mark.django_db
+def test_facets_of_the_catalog(client_unauthenticated, catalog):
+    data = facets(client_unauthenticated, price_interval="10")
+
+    assert data == {
+        "count": 5,
+        "categories": [
+            {"id": 2, "name": "Books", "count": 3},
+            {"id": 1, "name": "Test Category", "count": 2},
+        ],
+        "price_interval": "10.00",
+        "price_histogram": [
+            {"min": "0.00", "max": "10.00", "count": 2},
+            {"min": "10.00", "max": "20.00", "count": 1},
+            {"min": "50.00", "max": "60.00", "count": 1},
+            {"min": "120.00", "max": "130.00", "count": 1},
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_narrow_price_intervals_are_widened_to_cap_the_bands(
+    client_unauthenticated, catalog, settings
+):
+    settings.FACET_MAX_BANDS = 4
+
+    data = facets(client_unauthenticated, price_interval="0.01")
+
+    # prices from 3.29 to 123.12 span 119.83, in bands of at least 119.83 / 3
+    assert data["price_interval"] == "39.95"
+    assert data["price_histogram"] == [
+        {"min": "0.00", "max": "39.95", "count": 3},
+        {"min": "39.95", "max": "79.90", "count": 1},
+        {"min": "119.85", "max": "159.80", "count": 1},
+    ]
+    # wider intervals are kept
+    wide = facets(client_unauthenticated, price_interval="40")
+    assert wide["price_interval"] == "40.00"
+
+
+@pytest.mark.django_db
+def test_each_facet_ignores_its_own_filter(client_unauthenticated, catalog):
+    data = facets(client_unauthenticated, category="2", min_price="5", max_price="60")
+
+    # the categories count their products in the price range, if they have any
+    assert data["categories"] == [{"id": 2, "name": "Books", "count": 3}]
+    # the histogram covers every price of the selected category
+    assert [band["count"] for band in data["price_histogram"]] == [2, 1]
+    assert data["count"] == 3
+
+
+@pytest.mark.django_db
+def test_facets_of_search_results(client_unauthenticated, catalog):
+    data = facets(client_unauthenticated, search="novel")
+
+    assert data["count"] == 3
+    assert [entry["name"] for entry in data["categories"]] == ["Books"]
+
+
+@pytest.mark.django_db
+def test_facets_are_one_cached_query(
+    client_unauthenticated,
+    catalog,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    url = reverse("product-facets")
+
+    with django_assert_num_queries(1):
+        first = client_unauthenticated.get(url)
+    with django_assert_num_queries(0):
+        second = client_unauthenticated.get(url)
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.filter(category=catalog).first().delete()
+    third = client_unauthenticated.get(url)
+
+    assert [first["X-Cache"], second["X-Cache"]] == ["MISS", "HIT"]
+    assert third["X-Cache"] == "MISS"
+    assert third.json()["count"] == 4
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "params, field",
+    [
+        ({"category": "1,books"}, "category"),
+        ({"min_price": "20", "max_price": "10"}, "max_price"),
+        ({"min_price": "-1"}, "min_price"),
+        ({"price_interval": "0"}, "price_interval"),
+    ],
+)
+def test_invalid_facet_filters(client_unauthenticated, params, field):
+    response = client_unauthenticated.get(reverse("product-facets"), params)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert field in response.json()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("prefix", ["", "async-"])
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ({"category": "2"}, [3, 4, 5]),
+        ({"category": "1,2", "min_price": "10", "ordering": "price"}, [4, 5, 1]),
+        ({"max_price": "10", "ordering": "-price"}, [4, 3, 2]),
+    ],
+)
+def test_product_list_filters(
+    client_unauthenticated, catalog, prefix, params, expected
+):
+    response = client_unauthenticated.get(reverse(f"{prefix}product-list"), params)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert ids(response) == expected
+
+
+@pytest.mark.django_db
+def test_invalid_product_list_filters(client_unauthenticated):
+    response = client_unauthenticated.get(reverse("product-list"), {"category": "x"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {
+        "category": ["Expected comma separated category primary keys."]
+    }
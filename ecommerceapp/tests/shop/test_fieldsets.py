@@ -0,0 +1,98 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+FULL = {
+    "id",
+    "sku",
+    "name",
+    "description",
+    "price",
+    "category",
+    "image",
+    "thumbnail",
+    "image_variants",
+}
+
+
+def product_keys(response):
+    data = response.json()
+    return [set(entry) for entry in data.get("results", [data])]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("prefix", ["", "async-"])
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ({}, {"id", "name", "price", "category", "thumbnail"}),
+        ({"fields": "name,price"}, {"name", "price"}),
+        ({"fields": "*"}, FULL),
+        (
+            {"omit": "description,image_variants"},
+            FULL - {"description", "image_variants"},
+        ),
+        ({"fields": "id, name,sku", "omit": "sku"}, {"id", "name"}),
+    ],
+)
+def test_product_list_fieldsets(
+    client_unauthenticated, product, product2, prefix, params, expected
+):
+    response = client_unauthenticated.get(reverse(f"{prefix}product-list"), params)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert product_keys(response) == [expected, expected]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("prefix", ["", "async-"])
+def test_product_details_fieldsets_are_cached_separately(
+    client_unauthenticated, product, prefix
+):
+    url = reverse(f"{prefix}product-details", kwargs={"pk": product.pk})
+
+    sparse = client_unauthenticated.get(url, {"fields": "name"})
+    full = client_unauthenticated.get(url)
+
+    assert product_keys(sparse) == [{"name"}]
+    assert product_keys(full) == [FULL]
+    assert full["X-Cache"] == "MISS"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("prefix", ["", "async-"])
+def test_unknown_fields_are_rejected(client_unauthenticated, product, prefix):
+    url = reverse(f"{prefix}product-list")
+
+    response = client_unauthenticated.get(url, {"fields": "name,secret"})
+    omitted = client_unauthenticated.get(url, {"omit": "secret"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"fields": ['Unknown field "secret".']}
+    assert omitted.json() == {"omit": ['Unknown field "secret".']}
+
+
+@pytest.mark.django_db
+def test_unselected_columns_are_not_read(client_unauthenticated, product):
+    with CaptureQueriesContext(connection) as queries:
+        client_unauthenticated.get(reverse("product-list"))
+
+    (select,) = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+    assert '"shop_product"."description"' not in select
+    assert '"shop_product"."thumbnail"' in select
+
+
+@pytest.mark.django_db
+def test_ordering_fields_stay_loaded_for_cursors(
+    client_unauthenticated, product, product2, django_assert_num_queries
+):
+    url = reverse("product-list")
+    params = {"fields": "id", "ordering": "-price", "page_size": 1}
+
+    with django_assert_num_queries(1):
+        first = client_unauthenticated.get(url, params).json()
+    second = client_unauthenticated.get(first["next"]).json()
+
+    assert [first["results"], second["results"]] == [[{"id": 1}], [{"id": 2}]]
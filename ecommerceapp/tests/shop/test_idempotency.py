@@ -0,0 +1,227 @@
+import pytest
+from django.conf import settings as django_settings
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+from common import authentication
+from shop.idempotency import IdempotentRequests
+from shop.inventory import Inventory
+from shop.models import IdempotencyKey, Order
+from shop.tasks import purge_idempotency_keys_task
+from users.tokens import RoleRefreshToken
+
+
+@pytest.fixture
+def mocked_emails(mocker):
+    return mocker.patch("shop.views.OrderCreateView.send_order_emails")
+
+
+@pytest.fixture
+def payload(product):
+    return {
+        "first_name": "test",
+        "last_name": "test",
+        "delivery_address": "address",
+        "products": [{"product": product.id, "quantity": 2}],
+    }
+
+
+def post_order(client, payload, key="key-1", url="create-order", **headers):
+    return client.post(
+        reverse(url), payload, format="json", HTTP_IDEMPOTENCY_KEY=key, **headers
+    )
+
+
+@pytest.mark.django_db
+def test_retries_replay_the_first_response(
+    client_customer, payload, mocked_emails, django_assert_max_num_queries
+):
+    first = post_order(client_customer, payload)
+    # including the savepoints of the claim and of the transaction around it
+    with django_assert_max_num_queries(7):
+        retry = post_order(client_customer, payload)
+
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry.content == first.content
+    assert retry["Idempotent-Replayed"] == "true"
+    assert Order.objects.count() == 1
+    mocked_emails.assert_called_once()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("accept", ["application/json", "application/json; indent=4"])
+@pytest.mark.parametrize("url", ["create-order", "create-order-batch"])
+def test_replays_are_byte_identical(
+    client_customer, payload, mocked_emails, mocker, accept, url
+):
+    mocker.patch("shop.views.EmailHandler")
+    if url == "create-order-batch":
+        payload = {"orders": [payload, payload]}
+
+    first = post_order(client_customer, payload, url=url, HTTP_ACCEPT=accept)
+    retry = post_order(client_customer, payload, url=url, HTTP_ACCEPT=accept)
+
+    assert retry["Idempotent-Replayed"] == "true"
+    assert retry.content == first.content
+    assert retry["Content-Type"] == first["Content-Type"]
+    assert IdempotencyKey.objects.get().response.encode() == first.content
+
+
+@pytest.mark.django_db
+def test_form_requests_with_cookie_tokens_are_replayed(
+    user_customer, product, mocked_emails
+):
+    client = APIClient(enforce_csrf_checks=True)
+    client.cookies[authentication.api_settings.JWT_AUTH_COOKIE] = str(
+        RoleRefreshToken.for_user(user_customer).access_token
+    )
+    client.cookies[django_settings.CSRF_COOKIE_NAME] = "x" * 32
+    payload = {
+        "first_name": "test",
+        "last_name": "test",
+        "delivery_address": "address",
+        "products[0]product": product.id,
+        "products[0]quantity": 2,
+    }
+
+    def post():
+        return client.post(
+            reverse("create-order"),
+            payload,
+            format="multipart",
+            HTTP_IDEMPOTENCY_KEY="key-1",
+            HTTP_X_CSRFTOKEN="x" * 32,
+        )
+
+    first, retry = post(), post()
+
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry["Idempotent-Replayed"] == "true"
+    assert Order.objects.count() == 1
+
+
+def test_fingerprints_of_parsed_form_data():
+    def parsed(**data):
+        request = RequestFactory().post("/order/create/", data)
+        # parsing the form data makes the body unreadable
+        request.POST
+        return request
+
+    first = IdempotentRequests.fingerprint(parsed(delivery_address="a", quantity=1))
+    same = IdempotentRequests.fingerprint(parsed(quantity=1, delivery_address="a"))
+    other = IdempotentRequests.fingerprint(parsed(delivery_address="b", quantity=1))
+
+    assert first == same != other
+
+
+@pytest.mark.django_db
+def test_keys_are_independent(client_customer, client_seller, payload, mocked_emails):
+    post_order(client_customer, payload)
+    post_order(client_customer, payload, key="key-2")
+    post_order(client_seller, payload)
+    post_order(client_customer, payload, key=None)
+
+    assert Order.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_reusing_a_key_for_another_request_is_rejected(
+    client_customer, payload, mocked_emails
+):
+    post_order(client_customer, payload)
+    changed = post_order(client_customer, {**payload, "delivery_address": "other"})
+    other_endpoint = post_order(
+        client_customer, {"orders": [payload]}, url="create-order-batch"
+    )
+
+    assert changed.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert other_endpoint.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_duplicates_of_a_running_request_conflict(
+    client_customer, user_customer, payload, mocked_emails
+):
+    record, claimed = IdempotentRequests.claim(user_customer, "key-1", "running")
+    assert claimed
+
+    response = post_order(client_customer, payload)
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert not Order.objects.exists()
+
+
+@pytest.mark.django_db
+def test_stale_locks_and_expired_keys_are_taken_over(user_customer, settings):
+    now = timezone.now()
+    IdempotentRequests.claim(user_customer, "key-1", "first", now=now)
+
+    soon = now + timezone.timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT - 1)
+    stale = now + timezone.timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT + 1)
+    assert not IdempotentRequests.claim(user_customer, "key-1", "second", now=soon)[1]
+    record, claimed = IdempotentRequests.claim(
+        user_customer, "key-1", "second", now=stale
+    )
+    assert claimed and record.fingerprint == "second"
+
+
+@pytest.mark.django_db
+def test_requests_whose_key_was_taken_over_are_rolled_back(
+    client_customer, payload, mocked_emails, mocker, settings
+):
+    claim = IdempotentRequests.claim
+
+    def claim_then_lose_the_key(customer, key, fingerprint):
+        record, claimed = claim(customer, key, fingerprint)
+        # a duplicate takes the key over while the order is created
+        later = timezone.now() + timezone.timedelta(
+            seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT + 1
+        )
+        assert claim(customer, key, fingerprint, now=later)[1]
+        return record, claimed
+
+    mocker.patch.object(IdempotentRequests, "claim", claim_then_lose_the_key)
+
+    response = post_order(client_customer, payload)
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert not Order.objects.exists()
+    assert not IdempotencyKey.objects.exists()
+
+
+@pytest.mark.django_db
+def test_failed_requests_can_be_retried(
+    client_customer, product, payload, mocked_emails
+):
+    Inventory.set_stock(product, 1)
+
+    sold_out = post_order(client_customer, payload)
+    Inventory.set_stock(product, 2)
+    retry = post_order(client_customer, payload)
+
+    assert sold_out.status_code == status.HTTP_400_BAD_REQUEST
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert "Idempotent-Replayed" not in retry
+
+
+@pytest.mark.django_db
+def test_invalid_keys_are_rejected(client_customer, payload):
+    response = post_order(client_customer, payload, key="k" * 256)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "Idempotency-Key" in response.json()
+
+
+@pytest.mark.django_db
+def test_purge_task_deletes_expired_keys(user_customer, settings):
+    settings.IDEMPOTENCY_PURGE_BATCH_SIZE = 2
+    past = timezone.now() - timezone.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    for index in range(3):
+        IdempotentRequests.claim(user_customer, f"old-{index}", "old", now=past)
+    IdempotentRequests.claim(user_customer, "new", "new")
+
+    assert purge_idempotency_keys_task() == 3
+    assert list(IdempotencyKey.objects.values_list("key", flat=True)) == ["new"]
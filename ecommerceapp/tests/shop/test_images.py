@@ -0,0 +1,180 @@
+from io import BytesIO
+import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.imaging import ImageProcessingReport, ImageTooLargeError, render_variants
+from shop.models import Product
+from shop.tasks import generate_product_image_variants
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def image_upload(size=(1200, 800), name="upload.png"):
+    buffer = BytesIO()
+    Image.new("RGB", size, color=(200, 30, 30)).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+@pytest.mark.django_db
+def test_product_create_stores_upload_and_schedules_variants(
+    client_seller, product_category, django_capture_on_commit_callbacks, mocker
+):
+    delay = mocker.patch("shop.tasks.generate_product_image_variants.delay")
+    payload = {
+        "name": "Pictured Product",
+        "description": "Product description",
+        "price": "29.99",
+        "category": product_category.id,
+        "image": image_upload(),
+    }
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client_seller.post(reverse("create-product"), data=payload)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    product = Product.objects.get(name="Pictured Product")
+    assert product.image.name.startswith("product_images/image_")
+    assert product.image_variants == {}
+    delay.assert_called_once_with(product.id)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("image_format", ["JPEG", "WEBP"])
+def test_generate_product_image_variants(settings, product, image_format):
+    settings.PRODUCT_IMAGE_FORMAT = image_format
+    product.image = image_upload()
+    product.save()
+
+    generate_product_image_variants(product.id)
+
+    product.refresh_from_db()
+    assert set(product.image_variants) == set(settings.PRODUCT_IMAGE_VARIANTS)
+    assert product.thumbnail.name == product.image_variants["thumbnail"]
+    for name, path in product.image_variants.items():
+        with default_storage.open(path) as variant_file, Image.open(
+            variant_file
+        ) as variant:
+            assert variant.format == image_format
+            bounding_box = settings.PRODUCT_IMAGE_VARIANTS[name]
+            assert variant.width <= bounding_box[0]
+            assert variant.height <= bounding_box[1]
+
+
+@pytest.mark.django_db
+def test_product_update_replaces_image_variants(
+    client_seller, product, product_category, django_capture_on_commit_callbacks, mocker
+):
+    mocker.patch("shop.tasks.generate_product_image_variants.delay")
+    product.image = image_upload()
+    product.save()
+    generate_product_image_variants(product.id)
+    product.refresh_from_db()
+    old_paths = [product.image.name, *product.image_variants.values()]
+
+    payload = {
+        "name": "New Product",
+        "description": "Product description",
+        "price": "29.99",
+        "category": product_category.id,
+        "image": image_upload(),
+    }
+    url = reverse("retrieve-update-delete-product", kwargs={"pk": product.id})
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client_seller.put(url, data=payload)
+
+    assert response.status_code == status.HTTP_200_OK
+    product.refresh_from_db()
+    assert product.image_variants == {}
+    assert not product.thumbnail
+    assert not any(default_storage.exists(path) for path in old_paths)
+
+
+@pytest.mark.django_db
+def test_failed_product_update_keeps_image_files(
+    client_seller, product, product_category, django_capture_on_commit_callbacks, mocker
+):
+    mocker.patch("shop.tasks.generate_product_image_variants.delay")
+    mocker.patch("shop.serializers.Inventory.set_stock", side_effect=RuntimeError)
+    product.image = image_upload()
+    product.save()
+    generate_product_image_variants(product.id)
+    product.refresh_from_db()
+    old_paths = [product.image.name, *product.image_variants.values()]
+
+    payload = {
+        "name": "New Product",
+        "description": "Product description",
+        "price": "29.99",
+        "category": product_category.id,
+        "image": image_upload(),
+        "stock": 5,
+    }
+    url = reverse("retrieve-update-delete-product", kwargs={"pk": product.id})
+    with django_capture_on_commit_callbacks(execute=True), pytest.raises(RuntimeError):
+        client_seller.put(url, data=payload)
+
+    product.refresh_from_db()
+    assert [product.image.name, *product.image_variants.values()] == old_paths
+    assert all(default_storage.exists(path) for path in old_paths)
+
+
+def jpeg_bytes(size):
+    buffer = BytesIO()
+    Image.new("RGB", size, color=(10, 120, 10)).save(buffer, format="JPEG")
+    buffer.seek(0)
+    return buffer
+
+
+def test_render_variants_decodes_jpeg_at_reduced_scale(settings):
+    report = ImageProcessingReport()
+
+    variants = dict(
+        render_variants(
+            jpeg_bytes((4000, 3000)), settings.PRODUCT_IMAGE_VARIANTS, "JPEG", report
+        )
+    )
+
+    assert set(variants) == set(settings.PRODUCT_IMAGE_VARIANTS)
+    assert report.source_size == (4000, 3000)
+    assert report.decoded_size == (2000, 1500)
+    assert report.variant_sizes["zoom"] == (1600, 1200)
+    assert report.variant_sizes["thumbnail"] == (200, 150)
+    assert report.peak_bitmap_bytes < 4000 * 3000 * 3
+
+
+def test_render_variants_rejects_images_above_pixel_limit(settings):
+    settings.PRODUCT_IMAGE_MAX_PIXELS = 1000 * 1000
+
+    with pytest.raises(ImageTooLargeError):
+        list(render_variants(jpeg_bytes((1200, 1000)), {"card": (600, 600)}, "JPEG"))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "limit_setting, limit",
+    [("PRODUCT_IMAGE_MAX_PIXELS", 1000), ("PRODUCT_IMAGE_MAX_BYTES", 100)],
+)
+def test_product_create_rejects_oversized_images(
+    settings, client_seller, product_category, limit_setting, limit
+):
+    setattr(settings, limit_setting, limit)
+    payload = {
+        "name": "Huge Product",
+        "description": "Product description",
+        "price": "29.99",
+        "category": product_category.id,
+        "image": image_upload(),
+    }
+
+    response = client_seller.post(reverse("create-product"), data=payload)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "image" in response.data
+    assert not Product.objects.filter(name="Huge Product").exists()
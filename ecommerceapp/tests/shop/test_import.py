@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.cache import CatalogCache
+from shop.importing import ProductImporter
+from shop.models import Product, ProductCategory
+from shop.search import get_search_backend
+
+CSV = (
+    "sku,name,description,price,category\n"
+    "A-1,Red shoe,Leather,19.99,Test Category\n"
+    "A-2,Blue hat,,5,Hats\n"
+    "A-3,,Nameless,1.00,Hats\n"
+    "A-4,Green scarf,,1.001,Hats\n"
+    "A-2,Blue cap,,6.50,Hats\n"
+)
+
+
+def run_import(content, file_format="csv", **options):
+    return ProductImporter(**options).run(io.BytesIO(content.encode()), file_format)
+
+
+@pytest.mark.django_db
+def test_import_creates_products_and_reports_invalid_rows(product_category):
+    report = run_import(CSV)
+
+    assert report.imported == 2
+    assert report.error_count == 2
+    assert [error["line"] for error in report.errors] == [4, 5]
+    assert set(report.errors[0]["errors"]) == {"name"}
+    assert set(report.errors[1]["errors"]) == {"price"}
+    assert dict(Product.objects.values_list("sku", "name")) == {
+        "A-1": "Red shoe",
+        "A-2": "Blue cap",
+    }
+    assert Product.objects.get(sku="A-1").category == product_category
+    assert ProductCategory.objects.filter(name="Hats").count() == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("file_format", ["csv", "jsonl"])
+def test_import_reports_undecodable_rows(product_category, file_format):
+    rows = [
+        {"sku": "A-1", "name": "Red shoe", "price": "1", "category": "Hats"},
+        {"sku": "A-2", "name": "Caf\xe9", "price": "2", "category": "Hats"},
+        {"sku": "A-3", "name": "Blue hat", "price": "3", "category": "Hats"},
+    ]
+    if file_format == "csv":
+        lines = ["sku,name,price,category"] + [",".join(row.values()) for row in rows]
+    else:
+        lines = [json.dumps(row, ensure_ascii=False) for row in rows]
+    # the second row is encoded as Latin-1, the others as UTF-8
+    content = b"".join(
+        (line + "\n").encode("latin-1" if "Caf" in line else "utf-8") for line in lines
+    )
+
+    report = ProductImporter(batch_size=1).run(io.BytesIO(content), file_format)
+
+    assert report.imported == 2
+    assert report.errors == [
+        {"line": len(lines) - 1, "errors": {"row": ["Invalid UTF-8 text."]}}
+    ]
+    assert sorted(Product.objects.values_list("sku", flat=True)) == ["A-1", "A-3"]
+
+
+@pytest.mark.django_db
+def test_import_reports_invalid_csv_rows(product_category):
+    report = run_import(
+        "sku,name,price,category\n"
+        f"A-1,{'x' * (csv.field_size_limit() + 1)},1,Hats\n"
+        "A-2,Blue hat,2,Hats\n"
+    )
+
+    assert report.imported == 1
+    assert report.errors[0]["line"] == 2
+    assert report.errors[0]["errors"]["row"][0].startswith("Invalid CSV row")
+
+
+@pytest.mark.django_db
+def test_import_reports_unknown_fields(product_category):
+    report = run_import(
+        "id,sku,name,price,category,colour\n"
+        "1,A-1,Red shoe,1,Hats,red\n"
+        "2,A-2,Blue hat,2,Hats\n"
+        "3,A-3,Green scarf,3,Hats,,4\n"
+    )
+    jsonl_report = run_import(
+        json.dumps({"sku": "A-4", "name": "Cap", "price": 1, "category": "Hats"})
+        + "\n"
+        + json.dumps(
+            {"sku": "A-5", "name": "Cap", "price": 1, "category": "Hats", "size": 2}
+        ),
+        file_format="jsonl",
+    )
+
+    assert report.imported == 0
+    assert [error["errors"]["row"] for error in report.errors] == [
+        ['Unknown fields: "colour".'],
+        ['Unknown fields: "colour".'],
+        [
+            "The row has more values than the header has columns.",
+            'Unknown fields: "colour".',
+        ],
+    ]
+    assert jsonl_report.imported == 1
+    assert jsonl_report.errors == [
+        {"line": 2, "errors": {"row": ['Unknown fields: "size".']}}
+    ]
+
+
+@pytest.mark.django_db
+def test_import_updates_products_by_sku(
+    product_category, django_capture_on_commit_callbacks
+):
+    run_import(CSV)
+    product = Product.objects.get(sku="A-1")
+    detail_key = CatalogCache.detail_key(product.pk)
+    list_version = CatalogCache.catalog_version()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        run_import(
+            "\n".join(
+                json.dumps(row)
+                for row in [
+                    {"sku": "A-1", "name": "Red boot", "price": 25, "category": "Hats"},
+                    {"sku": "A-9"},
+                ]
+            )
+            + "\nnot json\n",
+            file_format="jsonl",
+        )
+
+    product.refresh_from_db()
+    assert (product.name, product.price, product.category.name) == (
+        "Red boot",
+        25,
+        "Hats",
+    )
+    assert Product.objects.count() == 2
+    assert CatalogCache.detail_key(product.pk) != detail_key
+    assert CatalogCache.catalog_version() != list_version
+
+
+@pytest.mark.django_db
+def test_imported_products_are_searchable(product_category):
+    run_import(CSV, batch_size=1)
+    run_import("sku,name,price,category\nA-1,Purple shoe,1,Hats\n")
+
+    assert list(
+        get_search_backend().search(["shoe"]).values_list("name", flat=True)
+    ) == ["Purple shoe"]
+
+
+@pytest.mark.django_db
+def test_import_products_command(tmp_path, product_category):
+    path = tmp_path / "products.csv"
+    path.write_text(CSV)
+    stdout, stderr = io.StringIO(), io.StringIO()
+
+    call_command("import_products", str(path), stdout=stdout, stderr=stderr)
+
+    assert "Imported 2 products" in stdout.getvalue()
+    assert "Line 4" in stderr.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_view(client_seller, client_customer, product_category):
+    url = reverse("import-products")
+
+    def upload(client, name="products.csv"):
+        return client.post(
+            url,
+            {"file": SimpleUploadedFile(name, CSV.encode())},
+            format="multipart",
+        )
+
+    response = upload(client_seller)
+    unknown_format = upload(client_seller, name="products.xlsx")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["imported"] == 2
+    assert response.json()["error_count"] == 2
+    assert unknown_format.status_code == status.HTTP_400_BAD_REQUEST
+    assert upload(client_customer).status_code == status.HTTP_403_FORBIDDEN
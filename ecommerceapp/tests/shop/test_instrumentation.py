@@ -0,0 +1,103 @@
+import logging
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+from common.instrumentation import RequestProfile, span
+
+
+@pytest.fixture
+def instrumented_client(settings):
+    settings.REQUEST_INSTRUMENTATION = True
+    # a new client loads the middleware with the current settings
+    return APIClient()
+
+
+def server_timing(response):
+    return dict(
+        metric.split(";", 1) for metric in response["Server-Timing"].split(", ")
+    )
+
+
+def test_span_is_a_no_op_outside_of_requests():
+    with span("image"):
+        pass
+
+
+def test_request_profile_keeps_slowest_queries():
+    profile = RequestProfile(max_slow_queries=2)
+    for index, duration in enumerate([0.3, 0.1, 0.5, 0.2]):
+        profile.record_query(f"SELECT {index}", duration)
+
+    assert profile.queries == 4
+    assert profile.sql_time == pytest.approx(1.1)
+    assert sorted(profile.slow_queries, reverse=True) == [
+        (0.5, "SELECT 2"),
+        (0.3, "SELECT 0"),
+    ]
+
+
+@pytest.mark.django_db
+def test_server_timing_header(instrumented_client, product):
+    response = instrumented_client.get(reverse("product-details", args=[product.id]))
+
+    assert response.status_code == status.HTTP_200_OK
+    metrics = server_timing(response)
+    assert metrics["db"].endswith('desc="1 queries"')
+    assert {"serialize", "total"} <= metrics.keys()
+
+
+@pytest.mark.django_db
+def test_server_timing_header_of_async_views(settings, product):
+    settings.REQUEST_INSTRUMENTATION = True
+    url = reverse("async-product-details", args=[product.id])
+
+    async def get():
+        # queries of the async ORM run in a worker thread
+        return await AsyncClient().get(url)
+
+    response = async_to_sync(get)()
+
+    assert response.status_code == status.HTTP_200_OK
+    metrics = server_timing(response)
+    assert metrics["db"].endswith('desc="1 queries"')
+    assert {"serialize", "total"} <= metrics.keys()
+
+
+@pytest.mark.django_db
+def test_order_create_spans(client_customer, product, settings, mocker):
+    settings.REQUEST_INSTRUMENTATION = True
+    mocker.patch("shop.tasks.send_order_emails_task.delay")
+    payload = {
+        "first_name": "test",
+        "last_name": "test",
+        "delivery_address": "address",
+        "products": [{"product": product.id, "quantity": 1}],
+    }
+
+    response = client_customer.post(reverse("create-order"), payload, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert "email" in server_timing(response)
+
+
+@pytest.mark.django_db
+def test_slow_requests_are_logged(instrumented_client, product, settings, caplog):
+    settings.SLOW_REQUEST_THRESHOLD = 0
+
+    with caplog.at_level(logging.WARNING, logger="ecommerceapp.requests"):
+        instrumented_client.get(reverse("product-details", args=[product.id]))
+
+    (record,) = caplog.records
+    assert record.request_profile["path"] == f"/product/{product.id}/"
+    assert record.request_profile["queries"] == 1
+    assert len(record.request_profile["slowest_queries"]) == 1
+
+
+@pytest.mark.django_db
+def test_middleware_is_not_used_when_disabled(client_unauthenticated, product):
+    response = client_unauthenticated.get(reverse("product-details", args=[product.id]))
+
+    assert "Server-Timing" not in response
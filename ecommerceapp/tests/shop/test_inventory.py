@@ -0,0 +1,263 @@
+import threading
+import pytest
+from django.db import DatabaseError, OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.reverse import reverse
+from rest_framework.utils import json
+from shop.inventory import Inventory, StockReservations
+from shop.models import Order, Product, ProductStockShard, StockReservation
+from shop.serializers import ProductRetrieveUpdateDestroySerializer
+from shop.services import OrderService
+from shop.tasks import release_expired_stock_reservations_task
+
+
+@pytest.fixture(autouse=True)
+def mocked_emails(mocker):
+    mocker.patch("common.email_handler.EmailHandler.send_confirmation_email")
+    mocker.patch("common.email_handler.EmailHandler.send_payment_reminder_email")
+
+
+@pytest.fixture
+def stocked(product, product2):
+    Inventory.set_stock(product, 5)
+    Inventory.set_stock(product2, 3)
+    return product, product2
+
+
+def lines(*quantities):
+    return [
+        {"product": product_id, "quantity": quantity}
+        for product_id, quantity in quantities
+    ]
+
+
+def order(customer, *quantities, reservation=None):
+    return OrderService.create_order(
+        customer, "address", lines(*quantities), reservation=reservation
+    )
+
+
+def stock(product):
+    return Inventory.available(Product.objects.get(pk=product.pk))
+
+
+@pytest.mark.django_db
+def test_orders_take_units_with_one_update(user_customer, stocked):
+    product, product2 = stocked
+
+    with CaptureQueriesContext(connection) as queries:
+        order(user_customer, (product.pk, 2), (product2.pk, 3))
+
+    updates = [
+        q["sql"] for q in queries if q["sql"].startswith('UPDATE "shop_product"')
+    ]
+    assert len(updates) == 1
+    assert (stock(product), stock(product2)) == (3, 0)
+
+
+@pytest.mark.django_db
+def test_sold_out_orders_are_rejected_and_take_nothing(user_customer, stocked):
+    product, product2 = stocked
+
+    with pytest.raises(ValidationError) as error:
+        order(user_customer, (product.pk, 2), (product2.pk, 4))
+
+    assert error.value.detail == {
+        "products": [f'Product "{product2.pk}" is out of stock.']
+    }
+    assert (stock(product), stock(product2)) == (5, 3)
+    assert not Order.objects.exists()
+
+
+@pytest.mark.django_db
+def test_untracked_products_never_run_out(user_customer, product):
+    order(user_customer, (product.pk, 1000))
+
+    assert stock(product) is None
+
+
+@pytest.mark.django_db
+def test_order_view_rejects_sold_out_products(client_customer, stocked):
+    product, _ = stocked
+    payload = {
+        "first_name": "test",
+        "last_name": "test",
+        "delivery_address": "address",
+        "products": lines((product.pk, 6)),
+    }
+
+    response = client_customer.post(
+        reverse("create-order"), json.dumps(payload), content_type="application/json"
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "out of stock" in response.json()["products"][0]
+
+
+@pytest.mark.django_db
+def test_saving_a_product_keeps_its_stock(user_customer, stocked):
+    product, _ = stocked
+    loaded = Product.objects.get(pk=product.pk)
+    order(user_customer, (product.pk, 2))
+
+    loaded.name = "Renamed"
+    loaded.save()
+
+    assert stock(product) == 3
+
+
+@pytest.mark.django_db
+def test_product_update_sets_the_stock_with_the_product(stocked, mocker):
+    product, _ = stocked
+    units = stock(product)
+
+    def update(**data):
+        serializer = ProductRetrieveUpdateDestroySerializer(
+            Product.objects.get(pk=product.pk), data=data, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    mocker.patch.object(Product, "save", side_effect=DatabaseError)
+    with pytest.raises(DatabaseError):
+        update(name="Renamed", stock=units + 10)
+    assert stock(product) == units
+
+    mocker.stopall()
+    updated = update(name="Renamed", stock=units + 10)
+    assert (updated.name, stock(product)) == ("Renamed", units + 10)
+
+
+@pytest.mark.django_db
+def test_sharded_stock(user_customer, product):
+    Inventory.set_stock(product, 10, shards=4)
+    assert list(
+        ProductStockShard.objects.order_by("shard").values_list("stock", flat=True)
+    ) == [3, 3, 2, 2]
+
+    # more units than any shard holds are collected from several shards
+    order(user_customer, (product.pk, 7))
+    assert stock(product) == 3
+    with pytest.raises(ValidationError):
+        order(user_customer, (product.pk, 4))
+    order(user_customer, (product.pk, 3))
+    assert stock(product) == 0
+
+    Inventory.restock({product.pk: 2})
+    assert stock(product) == 2
+
+
+@pytest.mark.django_db
+def test_reserved_units_are_used_by_the_order(user_customer, stocked):
+    product, product2 = stocked
+    token, _ = OrderService.reserve_stock(user_customer, lines((product.pk, 4)))
+    assert stock(product) == 1
+
+    # one more unit than reserved is taken from the stock
+    order(user_customer, (product.pk, 5), reservation=token)
+
+    assert stock(product) == 0
+    assert not StockReservation.objects.exists()
+
+
+@pytest.mark.django_db
+def test_unused_reserved_units_are_put_back(user_customer, stocked):
+    product, product2 = stocked
+    token, _ = OrderService.reserve_stock(
+        user_customer, lines((product.pk, 2), (product2.pk, 1))
+    )
+
+    order(user_customer, (product.pk, 2), reservation=token)
+
+    assert (stock(product), stock(product2)) == (3, 3)
+
+
+@pytest.mark.django_db
+def test_reservations_of_other_customers_are_ignored(
+    user_customer, user_seller, stocked
+):
+    product, _ = stocked
+    token, _ = OrderService.reserve_stock(user_seller, lines((product.pk, 4)))
+
+    with pytest.raises(ValidationError):
+        order(user_customer, (product.pk, 4), reservation=token)
+
+    assert StockReservation.objects.filter(token=token).exists()
+
+
+@pytest.mark.django_db
+def test_expired_reservations_are_released(user_customer, stocked):
+    product, product2 = stocked
+    for _ in range(3):
+        OrderService.reserve_stock(user_customer, lines((product.pk, 1)), ttl=1)
+    OrderService.reserve_stock(user_customer, lines((product2.pk, 1)))
+    later = timezone.now() + timezone.timedelta(seconds=2)
+
+    assert StockReservations.release_expired(batch_size=2, now=later) == 2
+    assert StockReservations.release_expired(batch_size=2, now=later) == 1
+    assert StockReservations.release_expired(now=later) == 0
+    assert (stock(product), stock(product2)) == (5, 2)
+
+
+@pytest.mark.django_db
+def test_release_task(user_customer, stocked, settings):
+    product, _ = stocked
+    settings.STOCK_RESERVATION_BATCH_SIZE = 1
+    for _ in range(3):
+        OrderService.reserve_stock(user_customer, lines((product.pk, 1)))
+    StockReservation.objects.update(expires_at=timezone.now())
+
+    assert release_expired_stock_reservations_task() == 3
+    assert stock(product) == 5
+
+
+@pytest.mark.django_db
+def test_reserve_stock_view(client_customer, user_customer, stocked):
+    product, _ = stocked
+    url = reverse("reserve-stock")
+
+    response = client_customer.post(
+        url, {"products": lines((product.pk, 5))}, format="json"
+    )
+    sold_out = client_customer.post(
+        url, {"products": lines((product.pk, 1))}, format="json"
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    reservation = StockReservation.objects.get()
+    assert response.json()["reservation"] == str(reservation.token)
+    assert sold_out.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("shards", [0, 4])
+def test_parallel_orders_do_not_oversell(user_customer, product, shards):
+    Inventory.set_stock(product, 20, shards=shards)
+    results = []
+
+    def place_orders():
+        for _ in range(5):
+            while True:
+                try:
+                    order(user_customer, (product.pk, 1))
+                    results.append(True)
+                except ValidationError:
+                    results.append(False)
+                except OperationalError:
+                    # the SQLite test database is locked by another thread
+                    continue
+                break
+        connection.close()
+
+    threads = [threading.Thread(target=place_orders) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 20
+    assert Order.objects.count() == 20
+    assert stock(product) == 0
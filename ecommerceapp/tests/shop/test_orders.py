@@ -0,0 +1,123 @@
+from decimal import Decimal
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.utils import json
+from shop.models import Order, OrderItem, Product
+
+
+@pytest.fixture
+def mocked_emails(mocker):
+    return {
+        "confirmation": mocker.patch(
+            "common.email_handler.EmailHandler.send_confirmation_email"
+        ),
+        "batch_confirmation": mocker.patch(
+            "common.email_handler.EmailHandler.send_confirmation_emails"
+        ),
+        "reminder": mocker.patch(
+            "common.email_handler.EmailHandler.send_payment_reminder_email"
+        ),
+        "batch_reminder": mocker.patch(
+            "common.email_handler.EmailHandler.send_payment_reminder_emails"
+        ),
+    }
+
+
+@pytest.fixture
+def many_products(product_category):
+    return Product.objects.bulk_create(
+        [
+            Product(
+                name=f"Product {index}",
+                description="Description",
+                price="2.50",
+                category=product_category,
+            )
+            for index in range(100)
+        ]
+    )
+
+
+def order_payload(products, quantity=2):
+    return {
+        "first_name": "test",
+        "last_name": "test",
+        "delivery_address": "test delivery address",
+        "products": [
+            {"product": product.id, "quantity": quantity} for product in products
+        ],
+    }
+
+
+def post_json(client, url, payload):
+    return client.post(url, data=json.dumps(payload), content_type="application/json")
+
+
+@pytest.mark.django_db
+def test_order_create_query_count_does_not_depend_on_lines(
+    client_customer, many_products, mocked_emails
+):
+    url = reverse("create-order")
+    query_counts = []
+    for line_count in (1, 100):
+        with CaptureQueriesContext(connection) as queries:
+            response = post_json(
+                client_customer, url, order_payload(many_products[:line_count])
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        query_counts.append(len(queries))
+
+    assert query_counts[0] == query_counts[1]
+    order = Order.objects.latest("pk")
+    assert order.aggregate_price == Decimal("500.00")
+    assert OrderItem.objects.filter(order=order).count() == 100
+
+
+@pytest.mark.django_db
+def test_order_create_rejects_unknown_products(client_customer, product, mocked_emails):
+    payload = order_payload([product])
+    payload["products"].append({"product": 999, "quantity": 1})
+
+    response = post_json(client_customer, reverse("create-order"), payload)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "products" in response.data
+    assert not Order.objects.exists()
+    mocked_emails["confirmation"].assert_not_called()
+
+
+@pytest.mark.django_db
+def test_order_batch_create_view(client_customer, product, product2, mocked_emails):
+    payload = {
+        "orders": [
+            order_payload([product], quantity=1),
+            order_payload([product, product2], quantity=3),
+        ]
+    }
+
+    response = post_json(client_customer, reverse("create-order-batch"), payload)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [order["aggregate_price"] for order in response.data["orders"]] == [
+        Decimal("123.12"),
+        Decimal("379.23"),
+    ]
+    assert Order.objects.count() == 2
+    assert OrderItem.objects.count() == 3
+    mocked_emails["batch_confirmation"].assert_called_once()
+    mocked_emails["batch_reminder"].assert_called_once()
+
+
+@pytest.mark.django_db
+def test_order_batch_create_is_atomic(client_customer, product, mocked_emails):
+    invalid_order = order_payload([product])
+    invalid_order["products"][0]["product"] = 999
+    payload = {"orders": [order_payload([product]), invalid_order]}
+
+    response = post_json(client_customer, reverse("create-order-batch"), payload)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not Order.objects.exists()
@@ -0,0 +1,134 @@
+import base64
+import json
+import pytest
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.models import Product, ProductCategory
+
+
+@pytest.fixture
+def many_products(product_category):
+    other_category = ProductCategory.objects.create(name="Another Category")
+    return [
+        Product.objects.create(
+            name=f"Product {index % 4}",
+            description="Description",
+            price=f"{index % 3}.99",
+            category=product_category if index % 2 else other_category,
+        )
+        for index in range(11)
+    ]
+
+
+def collect_pages(client, url, params, direction="next"):
+    pages = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        pages.append([entry["id"] for entry in response.data["results"]])
+        link = response.data[direction]
+        if link is None:
+            return pages
+        response = client.get(link)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "ordering",
+    [None, "name", "-price", "category__name", "category__name,-price", "price,name"],
+)
+def test_product_list_keyset_pages_follow_ordering(
+    client_unauthenticated, many_products, ordering
+):
+    url = reverse("product-list")
+    params = {"page_size": 3}
+    expected = Product.objects.all()
+    if ordering:
+        params["ordering"] = ordering
+        fields = ordering.split(",")
+        # the primary key tiebreaker follows the direction of the last field
+        tiebreaker = "-pk" if fields[-1].startswith("-") else "pk"
+        expected = expected.order_by(*fields, tiebreaker)
+    else:
+        expected = expected.order_by("pk")
+    expected_ids = list(expected.values_list("pk", flat=True))
+
+    pages = collect_pages(client_unauthenticated, url, params)
+
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+    assert [product_id for page in pages for product_id in page] == expected_ids
+
+
+@pytest.mark.django_db
+def test_product_list_keyset_pages_over_search_results(
+    client_unauthenticated, many_products
+):
+    url = reverse("product-list")
+
+    pages = collect_pages(
+        client_unauthenticated, url, {"search": "prod", "page_size": 5}
+    )
+
+    product_ids = [product_id for page in pages for product_id in page]
+    assert sorted(product_ids) == sorted(product.id for product in many_products)
+
+
+@pytest.mark.django_db
+def test_product_list_keyset_previous_links(client_unauthenticated, many_products):
+    url = reverse("product-list")
+    response = client_unauthenticated.get(url, {"page_size": 4, "ordering": "-price"})
+    first_page = response.data["results"]
+    response = client_unauthenticated.get(response.data["next"])
+    assert response.data["previous"] is not None
+
+    response = client_unauthenticated.get(response.data["previous"])
+
+    assert response.data["results"] == first_page
+    assert response.data["previous"] is None
+
+
+@pytest.mark.django_db
+def test_product_list_rejects_invalid_cursor(client_unauthenticated, many_products):
+    url = reverse("product-list")
+    response = client_unauthenticated.get(url, {"page_size": 4, "ordering": "name"})
+
+    assert client_unauthenticated.get(url, {"cursor": "garbage"}).status_code == (
+        status.HTTP_404_NOT_FOUND
+    )
+    # A cursor issued for one ordering cannot be reused with another one.
+    cursor = response.data["next"].split("cursor=")[1].split("&")[0]
+    response = client_unauthenticated.get(url, {"cursor": cursor, "ordering": "price"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "ordering, payload",
+    [
+        (None, {"o": ["pk"], "v": ["x"], "r": False}),
+        ("price", {"o": ["price", "pk"], "v": [None, None], "r": False}),
+        ("price", {"o": ["price", "pk"], "v": ["cheap", 1], "r": False}),
+        ("price", {"o": ["price", "pk"], "v": [[1], {"a": 1}], "r": False}),
+        ("price", {"o": ["pk"], "v": [1], "r": False}),
+    ],
+)
+def test_product_list_rejects_forged_cursor(
+    client_unauthenticated, many_products, ordering, payload
+):
+    cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    params = {"cursor": cursor, **({"ordering": ordering} if ordering else {})}
+
+    response = client_unauthenticated.get(reverse("product-list"), params)
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+@pytest.mark.django_db
+def test_order_list_is_paginated_newest_first(client_admin, order, order_data):
+    url = reverse("order-list")
+    response = client_admin.get(url, {"page_size": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [entry["id"] for entry in response.data["results"]] == [order.id]
+    assert response.data["next"] is None
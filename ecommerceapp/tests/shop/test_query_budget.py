@@ -0,0 +1,390 @@
+"""
+Query budget regression suite.
+
+Every route of `ecommerceapp/urls.py` is called against catalogs and order
+histories of growing size (`SIZES`). The suite fails when the number of SQL
+queries of an endpoint grows with the input size or exceeds the budget checked
+in to `query_budgets.json`.
+
+Set `QUERY_BUDGET_REPORT` to a file path to also write a JSON report with the
+query count, total SQL time and wall time of every endpoint and size, e.g.
+`QUERY_BUDGET_REPORT=report.json pytest tests/shop/test_query_budget.py`.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from django.utils import timezone
+from rest_framework.reverse import reverse
+from ecommerceapp import urls
+from shop.models import Order, Product
+from shop.search import get_search_backend
+from shop.services import OrderService
+from users.models import UserRole
+from users.tokens import TokenVersions
+
+BUDGET_FILE = Path(__file__).with_name("query_budgets.json")
+SIZES = (3, 30)
+
+# Routes provided by third party apps, not covered by the budgets.
+EXCLUDED_ROUTES = ("admin/", "accounts/", "accounts/register/")
+
+
+@dataclass
+class Endpoint:
+    """
+    A request to a route, built for a seeded database of a given size.
+    """
+
+    name: str
+    method: str = "get"
+    client: str = "client_unauthenticated"
+    url_kwargs: Callable[[dict], dict] = lambda seeded: {}
+    data: Callable[[dict], dict] = lambda seeded: None
+    format: str = "json"
+    status_code: int = 200
+    # distinguishes several requests to the same route and method
+    variant: str = ""
+
+    @property
+    def key(self):
+        return " ".join(filter(None, [self.name, self.method.upper(), self.variant]))
+
+
+def order_payload(products):
+    return {
+        "first_name": "test",
+        "last_name": "test",
+        "delivery_address": "address",
+        "products": [{"product": product.id, "quantity": 2} for product in products],
+    }
+
+
+def products_csv(size):
+    # rows of the seeded category, updated by the second size
+    rows = "".join(
+        f"SKU-{index},Imported,1.50,Test Category\n" for index in range(size)
+    )
+    return SimpleUploadedFile(
+        "products.csv", f"sku,name,price,category\n{rows}".encode()
+    )
+
+
+ENDPOINTS = [
+    Endpoint(
+        "product-list",
+        data=lambda seeded: {"page_size": seeded["size"]},
+        format=None,
+    ),
+    Endpoint(
+        "product-list",
+        data=lambda seeded: {"page_size": seeded["size"], "search": "product"},
+        format=None,
+        variant="search",
+    ),
+    Endpoint(
+        "product-list",
+        data=lambda seeded: {
+            "page_size": seeded["size"],
+            "fields": "name,description",
+            "ordering": "-price",
+        },
+        format=None,
+        variant="fields",
+    ),
+    Endpoint(
+        "product-list",
+        data=lambda seeded: {
+            "page_size": seeded["size"],
+            "category": seeded["products"][0].category_id,
+            "min_price": "1",
+            "max_price": "100",
+            "ordering": "price",
+        },
+        format=None,
+        variant="filters",
+    ),
+    Endpoint("product-facets", format=None),
+    Endpoint(
+        "product-facets",
+        data=lambda seeded: {
+            "search": "product",
+            "category": seeded["products"][0].category_id,
+            "max_price": "100",
+        },
+        format=None,
+        variant="filters",
+    ),
+    Endpoint(
+        "product-details",
+        url_kwargs=lambda seeded: {"pk": seeded["products"][-1].pk},
+    ),
+    Endpoint("catalog-cache-stats", client="client_seller"),
+    Endpoint(
+        "create-product",
+        method="post",
+        client="client_seller",
+        data=lambda seeded: {
+            "name": "New product",
+            "description": "Description",
+            "price": "10.00",
+            "category": seeded["products"][0].category_id,
+        },
+        format="multipart",
+        status_code=201,
+    ),
+    Endpoint(
+        "import-products",
+        method="post",
+        client="client_seller",
+        data=lambda seeded: {"file": products_csv(seeded["size"])},
+        format="multipart",
+    ),
+    Endpoint(
+        "retrieve-update-delete-product",
+        client="client_seller",
+        url_kwargs=lambda seeded: {"pk": seeded["products"][-1].pk},
+    ),
+    Endpoint(
+        "retrieve-update-delete-product",
+        method="patch",
+        client="client_seller",
+        url_kwargs=lambda seeded: {"pk": seeded["products"][-1].pk},
+        data=lambda seeded: {"price": "11.00"},
+        format="multipart",
+    ),
+    Endpoint(
+        "retrieve-update-delete-product",
+        method="delete",
+        client="client_seller",
+        url_kwargs=lambda seeded: {"pk": seeded["products"][-1].pk},
+        status_code=204,
+    ),
+    Endpoint(
+        "create-order",
+        method="post",
+        client="client_customer",
+        data=lambda seeded: order_payload(seeded["products"]),
+        status_code=201,
+    ),
+    Endpoint(
+        "create-order-batch",
+        method="post",
+        client="client_customer",
+        data=lambda seeded: {
+            "orders": [order_payload(seeded["products"][:2])] * seeded["size"]
+        },
+        status_code=201,
+    ),
+    Endpoint(
+        "reserve-stock",
+        method="post",
+        client="client_customer",
+        data=lambda seeded: {"products": order_payload(seeded["products"])["products"]},
+        status_code=201,
+    ),
+    Endpoint(
+        "order-statistics",
+        method="post",
+        client="client_seller",
+        data=lambda seeded: {
+            "start_date": timezone.localdate() - timezone.timedelta(days=7),
+            "end_date": timezone.localdate(),
+            "number_of_products": seeded["size"],
+        },
+        format="multipart",
+    ),
+    Endpoint(
+        "order-list",
+        client="client_seller",
+        data=lambda seeded: {"page_size": seeded["size"]},
+        format=None,
+    ),
+    Endpoint(
+        "export-orders",
+        client="client_seller",
+        data=lambda seeded: {
+            "start_date": timezone.localdate() - timezone.timedelta(days=7),
+            "format": "jsonl",
+            "gzip": "true",
+        },
+        format=None,
+    ),
+    Endpoint("export-products", client="client_seller", format=None),
+    Endpoint(
+        "async-product-list",
+        data=lambda seeded: {"page_size": seeded["size"]},
+        format=None,
+    ),
+    Endpoint(
+        "async-product-list",
+        data=lambda seeded: {"page_size": seeded["size"], "search": "product"},
+        format=None,
+        variant="search",
+    ),
+    Endpoint(
+        "async-product-details",
+        url_kwargs=lambda seeded: {"pk": seeded["products"][-1].pk},
+    ),
+    Endpoint(
+        "async-order-statistics",
+        method="post",
+        client="client_seller",
+        data=lambda seeded: {
+            "start_date": timezone.localdate() - timezone.timedelta(days=7),
+            "end_date": timezone.localdate(),
+            "number_of_products": seeded["size"],
+        },
+        format="multipart",
+    ),
+    Endpoint("schema"),
+    Endpoint("swagger-documentation"),
+]
+
+
+def route_names(patterns, prefix=""):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if route not in EXCLUDED_ROUTES:
+                yield from route_names(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+def seed(customer, category, size):
+    """
+    Grow the database to `size` products and `size` orders of two lines each.
+    """
+    existing = Product.objects.count()
+    Product.objects.bulk_create(
+        [
+            Product(
+                name=f"Product {index}",
+                description="Seeded product",
+                price="9.99",
+                category=category,
+            )
+            for index in range(existing, size)
+        ]
+    )
+    products = list(Product.objects.order_by("pk"))[:size]
+
+    missing_orders = size - Order.objects.count()
+    if missing_orders > 0:
+        OrderService.create_orders(
+            customer,
+            [
+                {
+                    "delivery_address": "address",
+                    "products": [
+                        {"product": products[index % size].id, "quantity": 1},
+                        {"product": products[(index + 1) % size].id, "quantity": 2},
+                    ],
+                }
+                for index in range(missing_orders)
+            ],
+        )
+    # Bulk inserts bypass the signals maintaining the search index.
+    get_search_backend().rebuild()
+    return {"size": size, "products": products}
+
+
+@dataclass
+class Measurement:
+    queries: int
+    sql_time: float
+    wall_time: float
+    statements: list = field(default_factory=list)
+
+
+def measure(client, endpoint, seeded):
+    url = reverse(endpoint.name, kwargs=endpoint.url_kwargs(seeded))
+    request = getattr(client, endpoint.method)
+    kwargs = {"format": endpoint.format} if endpoint.format else {}
+
+    with CaptureQueriesContext(connection) as context:
+        started = time.perf_counter()
+        response = request(url, endpoint.data(seeded), **kwargs)
+        # streamed responses run their queries while the content is read
+        if response.streaming:
+            b"".join(response.streaming_content)
+        wall_time = time.perf_counter() - started
+
+    assert response.status_code == endpoint.status_code, response.content[:500]
+    return Measurement(
+        queries=len(context.captured_queries),
+        sql_time=sum(float(query["time"]) for query in context.captured_queries),
+        wall_time=wall_time,
+        statements=[query["sql"] for query in context.captured_queries],
+    )
+
+
+@pytest.fixture(scope="module")
+def budgets():
+    return json.loads(BUDGET_FILE.read_text())
+
+
+@pytest.fixture(scope="module")
+def report():
+    report: Dict[str, dict] = {}
+    yield report
+
+    path = os.environ.get("QUERY_BUDGET_REPORT")
+    if path:
+        Path(path).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def test_every_route_has_an_endpoint_and_a_budget(budgets):
+    covered = {endpoint.name for endpoint in ENDPOINTS}
+    assert set(route_names(urls.urlpatterns)) == covered
+    assert {endpoint.key for endpoint in ENDPOINTS} == set(budgets)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "endpoint", ENDPOINTS, ids=[endpoint.key for endpoint in ENDPOINTS]
+)
+def test_endpoint_query_budget(
+    request, endpoint, budgets, report, user_customer, product_category, mocker
+):
+    mocker.patch("shop.tasks.send_order_emails_task.delay")
+    client = request.getfixturevalue(endpoint.client)
+    budget = budgets[endpoint.key]
+
+    measurements = {}
+    for size in SIZES:
+        seeded = seed(user_customer, product_category, size)
+        cache.clear()
+        # token versions of signed in users are cached between their requests
+        for user in UserRole.objects.all():
+            TokenVersions.remember(user.pk, user.token_version)
+        measurements[size] = measure(client, endpoint, seeded)
+
+    report[endpoint.key] = {
+        f"size={size}": {
+            "queries": measurement.queries,
+            "sql_time": round(measurement.sql_time, 6),
+            "wall_time": round(measurement.wall_time, 6),
+            "budget": budget,
+        }
+        for size, measurement in measurements.items()
+    }
+
+    smallest, largest = measurements[SIZES[0]], measurements[SIZES[-1]]
+    assert largest.queries == smallest.queries, (
+        f"{endpoint.key} runs {smallest.queries} queries for size {SIZES[0]} and "
+        f"{largest.queries} for size {SIZES[-1]}:\n" + "\n".join(largest.statements)
+    )
+    assert largest.queries <= budget, (
+        f"{endpoint.key} runs {largest.queries} queries, budget {budget}:\n"
+        + "\n".join(largest.statements)
+    )
@@ -0,0 +1,84 @@
+import pytest
+from django.core.management import CommandError, call_command
+from shop.models import Product
+from shop.query_plans import HotPath, QueryPlanChecker
+
+
+@pytest.fixture
+def many_products(product_category):
+    return Product.objects.bulk_create(
+        [
+            Product(
+                id=index,
+                name=f"Product {index}",
+                description="Description",
+                price=index % 50,
+                category=product_category,
+            )
+            for index in range(10, 40)
+        ]
+    )
+
+
+@pytest.mark.django_db
+def test_hot_paths_use_indexes(many_products, order, tmp_path):
+    # every hot query has to be served by an index even for tiny tables
+    call_command(
+        "check_query_plans", max_scan_rows=0, stdout=open(tmp_path / "out.txt", "w")
+    )
+
+
+@pytest.mark.django_db
+def test_full_scans_above_threshold_are_reported(many_products):
+    hot_path = HotPath(
+        "description filter",
+        lambda: list(Product.objects.filter(description__contains="Desc")),
+    )
+
+    (report,) = QueryPlanChecker(max_scan_rows=10).check([hot_path])
+    assert report.scans == [("shop_product", 30)]
+
+    (report,) = QueryPlanChecker(max_scan_rows=100).check([hot_path])
+    assert report.scans == []
+
+
+@pytest.mark.django_db
+def test_scans_of_subquery_aliases_are_reported_by_table(many_products):
+    described = Product.objects.filter(description__contains="Desc").values("pk")
+    hot_path = HotPath(
+        "subquery", lambda: list(Product.objects.filter(pk__in=described))
+    )
+
+    (report,) = QueryPlanChecker(max_scan_rows=10).check([hot_path])
+    assert report.scans == [("shop_product", 30)]
+
+
+@pytest.mark.django_db
+def test_limited_scans_in_index_order_are_not_reported(many_products):
+    ordered = HotPath("first page", lambda: list(Product.objects.order_by("pk")[:5]))
+    sorted_page = HotPath(
+        "first page by description",
+        lambda: list(Product.objects.order_by("description")[:5]),
+    )
+
+    (ordered_report,) = QueryPlanChecker(max_scan_rows=0).check([ordered])
+    (sorted_report,) = QueryPlanChecker(max_scan_rows=0).check([sorted_page])
+
+    assert ordered_report.scans == []
+    assert sorted_report.scans == [("shop_product", 30)]
+
+
+@pytest.mark.django_db
+def test_check_query_plans_command_fails_on_full_scans(many_products, mocker):
+    mocker.patch(
+        "shop.query_plans.get_hot_paths",
+        return_value=[
+            HotPath(
+                "unindexed",
+                lambda: list(Product.objects.filter(description__contains="x")),
+            )
+        ],
+    )
+
+    with pytest.raises(CommandError, match="1 full table scans"):
+        call_command("check_query_plans", max_scan_rows=0)
@@ -0,0 +1,73 @@
+import pytest
+from django.core import mail
+from django.utils import timezone
+from common.email_handler import EmailHandler
+from shop.models import Order, PaymentReminder
+from shop.reminders import PaymentReminderScheduler
+from shop.tasks import send_payment_reminders_task
+
+
+@pytest.fixture
+def orders(order_data):
+    order_data = {**order_data, "id": None}
+    return [Order.objects.create(**order_data) for _ in range(5)]
+
+
+def make_due(*orders):
+    PaymentReminder.objects.filter(order__in=orders).update(
+        due_at=timezone.now() - timezone.timedelta(minutes=1)
+    )
+
+
+@pytest.mark.django_db
+def test_email_handler_stores_reminder_without_enqueuing(order, mocker):
+    apply_async = mocker.patch("shop.tasks.send_order_emails_task.apply_async")
+
+    EmailHandler.send_payment_reminder_email(order)
+    EmailHandler.send_payment_reminder_email(order)
+
+    apply_async.assert_not_called()
+    reminder = PaymentReminder.objects.get()
+    assert reminder.order == order
+    assert reminder.due_at == order.payment_due_date - timezone.timedelta(days=1)
+    assert reminder.sent_at is None
+
+
+@pytest.mark.django_db
+def test_claim_due_only_claims_due_reminders_once(orders):
+    PaymentReminderScheduler.schedule(orders)
+    make_due(*orders[:3])
+
+    first = PaymentReminderScheduler.claim_due(batch_size=2)
+    second = PaymentReminderScheduler.claim_due(batch_size=2)
+
+    assert len(first) == 2 and len(second) == 1
+    assert set(first.values()) | set(second.values()) == {o.id for o in orders[:3]}
+    assert PaymentReminderScheduler.claim_due() == {}
+
+
+@pytest.mark.django_db
+def test_claim_due_takes_over_stale_claims(orders, settings):
+    PaymentReminderScheduler.schedule(orders[:1])
+    make_due(orders[0])
+    assert PaymentReminderScheduler.claim_due()
+
+    later = timezone.now() + timezone.timedelta(
+        seconds=settings.PAYMENT_REMINDER_CLAIM_TIMEOUT + 1
+    )
+    assert list(PaymentReminderScheduler.claim_due(now=later).values()) == [
+        orders[0].id
+    ]
+
+
+@pytest.mark.django_db
+def test_send_payment_reminders_task_sends_each_reminder_once(order, orders):
+    EmailHandler.send_payment_reminder_emails([order, *orders])
+    make_due(order)
+
+    assert send_payment_reminders_task() == 1
+    assert send_payment_reminders_task() == 0
+
+    assert [email.subject for email in mail.outbox] == ["Payment reminder"]
+    assert PaymentReminder.objects.get(order=order).sent_at is not None
+    assert PaymentReminder.objects.filter(sent_at__isnull=True).count() == 5
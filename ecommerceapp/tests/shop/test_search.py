@@ -0,0 +1,177 @@
+from decimal import Decimal
+import pytest
+from django.db import connections
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.models import Product, ProductCategory
+from shop.search import (
+    InMemorySearchBackend,
+    SQLiteFTSBackend,
+    parse_price_term,
+)
+
+
+@pytest.fixture
+def catalog(product_category):
+    shoes = ProductCategory.objects.create(name="Running Shoes")
+    return {
+        "jacket": Product.objects.create(
+            name="Rain jacket",
+            description="Waterproof shell for hiking",
+            price="120.00",
+            category=product_category,
+        ),
+        "trainer": Product.objects.create(
+            name="Trail trainer",
+            description="Light shoe with a grippy sole, good for rain",
+            price="89.99",
+            category=shoes,
+        ),
+        "socks": Product.objects.create(
+            name="Wool socks",
+            description="Warm socks",
+            price="12.50",
+            category=shoes,
+        ),
+    }
+
+
+@pytest.mark.parametrize(
+    "term, expected",
+    [
+        ("price:12", (Decimal("12"), Decimal("13"))),
+        ("price:12.5", (Decimal("12.5"), Decimal("12.6"))),
+        ("Price:12.50", (Decimal("12.50"), Decimal("12.51"))),
+        ("price:20-10", (Decimal("10"), Decimal("20.01"))),
+        ("12", None),
+        ("price:cheap", None),
+        ("jacket", None),
+    ],
+)
+def test_parse_price_term(term, expected):
+    assert parse_price_term(term) == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("backend_class", [SQLiteFTSBackend, InMemorySearchBackend])
+def test_search_backend_ranking_and_prefixes(backend_class, catalog):
+    backend = backend_class()
+
+    results = list(backend.search(["rain"]))
+    assert results == [catalog["jacket"], catalog["trainer"]]
+
+    assert set(backend.search(["runn"])) == {catalog["trainer"], catalog["socks"]}
+    assert list(backend.search(["wo", "so"])) == [catalog["socks"]]
+    assert list(backend.search(["price:12"])) == [catalog["socks"]]
+    assert list(backend.search(["price:80-130", "trail"])) == [catalog["trainer"]]
+    assert list(backend.search(["missing"])) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("backend_class", [SQLiteFTSBackend, InMemorySearchBackend])
+def test_search_backend_matches_numbers_as_text(backend_class, catalog):
+    phone = Product.objects.create(
+        name="iPhone 15",
+        description="Smartphone",
+        price="999.00",
+        category=catalog["jacket"].category,
+    )
+
+    assert list(backend_class().search(["iphone", "15"])) == [phone]
+    assert list(backend_class().search(["12"])) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("backend_class", [SQLiteFTSBackend, InMemorySearchBackend])
+def test_search_backend_returns_the_best_matches_only(backend_class, catalog, settings):
+    settings.PRODUCT_SEARCH_MAX_RESULTS = 1
+
+    assert list(backend_class().search(["rain"])) == [catalog["jacket"]]
+
+
+@pytest.mark.django_db
+def test_fts_index_is_looked_up_once(catalog, django_assert_num_queries):
+    backend = SQLiteFTSBackend()
+    backend.ensure_index()
+    # the test transaction is never committed, like a rolled back one
+    assert backend._indexed == set()
+
+    backend._indexed.add("default")
+    # the matches and the products
+    with django_assert_num_queries(2):
+        backend.search(["rain"]).exists()
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_fts_index_is_not_created_on_replicas(catalog, settings):
+    settings.DATABASE_REPLICAS = ["replica"]
+    backend = SQLiteFTSBackend()
+
+    assert not backend.ensure_index("replica")
+    # the matches are read from the primary
+    assert backend.rank(["rain"], using="replica")
+    with connections["replica"].cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = %s", [SQLiteFTSBackend.table]
+        )
+        assert cursor.fetchone() is None
+
+
+@pytest.mark.django_db
+def test_in_memory_index_follows_changes_of_other_processes(
+    catalog, django_capture_on_commit_callbacks
+):
+    backend, other_process = InMemorySearchBackend(), InMemorySearchBackend()
+    assert list(backend.search(["rain"])) == [catalog["jacket"], catalog["trainer"]]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        other_process.index_product(catalog["jacket"])
+        catalog["jacket"].name = "Storm parka"
+        catalog["jacket"].save()
+        other_process.index_product(catalog["jacket"])
+
+    assert list(backend.search(["parka"])) == [catalog["jacket"]]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("backend_class", [SQLiteFTSBackend, InMemorySearchBackend])
+def test_search_backend_index_updates(
+    backend_class, catalog, mocker, django_capture_on_commit_callbacks
+):
+    backend = backend_class()
+    mocker.patch("shop.signals.get_search_backend", return_value=backend)
+    backend.rebuild()
+
+    jacket = catalog["jacket"]
+    with django_capture_on_commit_callbacks(execute=True):
+        jacket.name = "Storm parka"
+        jacket.save()
+    assert list(backend.search(["parka"])) == [jacket]
+
+    category = jacket.category
+    with django_capture_on_commit_callbacks(execute=True):
+        category.name = "Outerwear"
+        category.save()
+    assert list(backend.search(["outerwear"])) == [jacket]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        jacket.delete()
+    assert list(backend.search(["parka"])) == []
+
+
+@pytest.mark.django_db
+def test_product_list_view_search(client_unauthenticated, catalog):
+    url = reverse("product-list")
+
+    response = client_unauthenticated.get(url, {"search": "rain"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [entry["id"] for entry in response.data["results"]] == [
+        catalog["jacket"].id,
+        catalog["trainer"].id,
+    ]
+
+    response = client_unauthenticated.get(url, {"search": "rain", "ordering": "price"})
+    assert [entry["id"] for entry in response.data["results"]] == [
+        catalog["trainer"].id,
+        catalog["jacket"].id,
+    ]
@@ -0,0 +1,107 @@
+from collections import Counter
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from shop.models import Order, OrderItem, Product, ProductCategory, ProductSalesDaily
+from shop.seeding import SeedOptions, ShopSeeder
+from users.models import UserRole
+
+
+def seed_options(**overrides):
+    options = {
+        "categories": 3,
+        "products": 40,
+        "customers": 5,
+        "orders": 300,
+        "days": 30,
+        "batch_size": 64,
+        "seed": 7,
+    }
+    return SeedOptions(**{**options, **overrides})
+
+
+def order_lines():
+    return list(
+        OrderItem.objects.order_by("pk").values_list(
+            "order__order_date", "product__name", "quantity"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_seed_shop_command(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+    call_command(
+        "seed_shop",
+        categories=2,
+        products=10,
+        customers=3,
+        orders=50,
+        batch_size=16,
+        images=True,
+        stdout=open(tmp_path / "output.txt", "w"),
+    )
+
+    assert ProductCategory.objects.count() == 2
+    assert Product.objects.count() == 10
+    assert UserRole.objects.filter(role="customer").count() == 3
+    assert Order.objects.count() == 50
+    assert ProductSalesDaily.objects.exists()
+    product = Product.objects.first()
+    assert (tmp_path / product.image.name).exists()
+
+
+@pytest.mark.django_db
+def test_seeded_orders_are_consistent():
+    counts = ShopSeeder(seed_options()).run()
+
+    assert OrderItem.objects.count() == counts["order_items"]
+    order = Order.objects.prefetch_related("orderitem_set__product").first()
+    assert order.aggregate_price == sum(
+        item.product.price * item.quantity for item in order.orderitem_set.all()
+    )
+    assert (order.payment_due_date - order.order_date).days == 5
+    assert len({order.order_date.date() for order in Order.objects.all()}) > 10
+
+
+@pytest.mark.django_db
+def test_orders_created_while_seeding_are_dated_now(user_customer):
+    created = []
+
+    def place_order(message):
+        if "orders" in message and not created:
+            created.append(
+                Order.objects.create(
+                    customer=user_customer,
+                    delivery_address="1 Test Street",
+                    payment_due_date=timezone.now(),
+                )
+            )
+
+    start = timezone.now()
+    ShopSeeder(seed_options(), log=place_order).run()
+
+    created[0].refresh_from_db()
+    assert created[0].order_date >= start
+
+
+@pytest.mark.django_db
+def test_product_popularity_is_skewed():
+    ShopSeeder(seed_options(zipf_exponent=1.2)).run()
+
+    popularity = Counter(OrderItem.objects.values_list("product_id", flat=True))
+    (_, top), *_ = popularity.most_common()
+    assert top > 4 * OrderItem.objects.count() / Product.objects.count()
+
+
+@pytest.mark.django_db
+def test_same_seed_generates_same_data():
+    ShopSeeder(seed_options()).run()
+    first = order_lines()
+    for model in (Order, Product, ProductCategory, UserRole):
+        model.objects.all().delete()
+
+    ShopSeeder(seed_options()).run()
+
+    assert [line[1:] for line in order_lines()] == [line[1:] for line in first]
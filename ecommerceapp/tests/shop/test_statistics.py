@@ -0,0 +1,112 @@
+from decimal import Decimal
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from shop.models import OrderItem, ProductSalesDaily
+from shop.services import OrderService
+
+
+@pytest.fixture
+def service_orders(user_customer, product, product2):
+    return OrderService.create_orders(
+        user_customer,
+        [
+            {
+                "delivery_address": "address",
+                "products": [
+                    {"product": product.id, "quantity": 2},
+                    {"product": product2.id, "quantity": 1},
+                ],
+            },
+            {
+                "delivery_address": "address",
+                "products": [{"product": product2.id, "quantity": 4}],
+            },
+        ],
+    )
+
+
+def rollup_rows():
+    return list(
+        ProductSalesDaily.objects.order_by("product_id").values(
+            "product_id", "day", "order_count", "units", "revenue"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_order_creation_updates_daily_rollups(service_orders, product, product2):
+    today = timezone.localdate()
+
+    assert rollup_rows() == [
+        {
+            "product_id": product.id,
+            "day": today,
+            "order_count": 1,
+            "units": 2,
+            "revenue": Decimal("246.24"),
+        },
+        {
+            "product_id": product2.id,
+            "day": today,
+            "order_count": 2,
+            "units": 5,
+            "revenue": Decimal("16.45"),
+        },
+    ]
+
+
+@pytest.mark.django_db
+def test_rebuild_sales_rollups_matches_incremental_rows(service_orders):
+    incremental_rows = rollup_rows()
+    ProductSalesDaily.objects.update(units=0)
+
+    call_command("rebuild_sales_rollups")
+
+    assert rollup_rows() == incremental_rows
+
+
+@pytest.mark.django_db
+def test_order_items_keep_the_price_of_the_order_date(service_orders, product):
+    incremental_rows = rollup_rows()
+    product.price = "1.00"
+    product.save()
+
+    item = OrderItem.objects.get(order=service_orders[0], product=product)
+    call_command("rebuild_sales_rollups")
+
+    assert (item.unit_price, item.line_total) == (
+        Decimal("123.12"),
+        Decimal("246.24"),
+    )
+    assert service_orders[0].aggregate_price == Decimal("249.53")
+    assert rollup_rows() == incremental_rows
+
+
+@pytest.mark.django_db
+def test_rebuild_does_not_join_products(service_orders):
+    with CaptureQueriesContext(connection) as queries:
+        call_command("rebuild_sales_rollups")
+
+    assert not any('"shop_product"' in query["sql"] for query in queries)
+
+
+@pytest.mark.django_db
+def test_order_statistics_are_read_from_rollups(
+    client_seller, service_orders, product2
+):
+    today = timezone.localdate()
+    payload = {
+        "start_date": today.isoformat(),
+        "end_date": today.isoformat(),
+        "number_of_products": 1,
+    }
+
+    response = client_seller.post(reverse("order-statistics"), data=payload)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == [{"product_name": product2.name, "total_orders": 2}]
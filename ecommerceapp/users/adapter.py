@@ -0,0 +1,20 @@
+from allauth.account.adapter import DefaultAccountAdapter
+
+CUSTOMER_ROLE = "customer"
+
+
+class AccountAdapter(DefaultAccountAdapter):
+    """
+    Account adapter giving the customer role to users who sign up.
+
+    The role is set before the user is first saved, so the tokens issued by the
+    registration already carry it.
+    """
+
+    def save_user(self, request, user, form, commit=True):
+        user = super().save_user(request, user, form, commit=False)
+        if not user.role:
+            user.role = CUSTOMER_ROLE
+        if commit:
+            user.save()
+        return user
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_alter_userrole_groups_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userrole",
+            name="token_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
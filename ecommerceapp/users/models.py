@@ -14,6 +14,28 @@ class UserRole(AbstractUser):
         ("customer", "Customer"),
     ]
     role = models.CharField(choices=ROLE_CHOICES, max_length=20)
+    # bumped to revoke all issued tokens, see `users.tokens`
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        """
+        Save the user without `token_version`, unless it is new or it is listed
+        in `update_fields`.
+
+        The version is only bumped by `users.tokens.TokenVersions.revoke` with an
+        `F()` update, writing back a version loaded earlier would undo a
+        revocation made in the meantime and make revoked tokens valid again.
+        """
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.attname != "token_version"
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.username} - {self.role}"
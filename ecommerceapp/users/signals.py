@@ -1,8 +1,12 @@
 from allauth.account.signals import user_signed_up
+from django.db.models.signals import post_init, post_save
+from .adapter import CUSTOMER_ROLE
 from .models import UserRole
+from .tokens import ROLE_CLAIMS, TokenVersions
 from django.dispatch import receiver
 
-CUSTOMER_ROLE = "customer"
+# a change of any of these fields revokes the tokens of the user
+TOKEN_FIELDS = (*ROLE_CLAIMS, "password", "is_active")
 
 
 @receiver(user_signed_up)
@@ -10,8 +14,9 @@ def set_default_role(sender, user, request, **kwargs):
     """
     Signal receiver to set the default role for a newly registered user.
 
-    This function is connected to the `user_signed_up` signal and automatically
-    sets the user's role to the default customer role upon successful registration.
+    `users.adapter.AccountAdapter` sets the role before the user is saved, this
+    covers signups which do not go through it. The user is saved through the
+    model, so tokens issued without the role are revoked.
 
     Parameters:
     - `sender`: The sender of the signal.
@@ -20,4 +25,40 @@ def set_default_role(sender, user, request, **kwargs):
     - `kwargs`: Additional keyword arguments.
 
     """
-    UserRole.objects.filter(pk=user.pk).update(role=CUSTOMER_ROLE)
+    if not user.role:
+        user.role = CUSTOMER_ROLE
+        user.save(update_fields=["role"])
+
+
+@receiver(post_init, sender=UserRole)
+def remember_token_fields(sender, instance, **kwargs):
+    """
+    Keep the loaded values of `TOKEN_FIELDS`, deferred fields are skipped.
+    """
+    instance._token_fields = {
+        field: instance.__dict__[field]
+        for field in TOKEN_FIELDS
+        if field in instance.__dict__
+    }
+
+
+@receiver(post_save, sender=UserRole)
+def revoke_outdated_tokens(sender, instance, created, **kwargs):
+    """
+    Revoke the tokens of a user whose claims, password or status changed.
+
+    Parameters:
+    - `sender`: The sender of the signal.
+    - `instance` (UserRole): The saved user.
+    - `created` (bool): Whether the user was just created.
+    - `kwargs`: Additional keyword arguments.
+    """
+    changed = any(
+        instance.__dict__.get(field, value) != value
+        for field, value in instance._token_fields.items()
+    )
+    if not created and changed:
+        TokenVersions.revoke(instance.pk)
+        if "token_version" in instance.__dict__:
+            instance.token_version += 1
+    remember_token_fields(sender, instance)
@@ -0,0 +1,164 @@
+"""
+JSON web tokens carrying the role of the user.
+
+Tokens issued at login carry the claims permission checks need (`ROLE_CLAIMS`)
+and the `token_version` of the user, so
+`common.authentication.StatelessJWTCookieAuthentication` can authenticate
+requests without loading the user. Bumping `UserRole.token_version` (done by
+`users.signals` whenever a claim, the password or `is_active` changes) revokes
+all tokens issued before.
+"""
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import UserRole
+
+ROLE_CLAIMS = ("username", "first_name", "last_name", "role", "is_superuser")
+TOKEN_VERSION_CLAIM = "token_version"
+
+
+class TokenVersions:
+    """
+    Cached token versions of the users.
+
+    Versions are cached for `TOKEN_VERSION_CACHE_TIMEOUT` seconds. Revocations
+    are seen at once by processes sharing the cache (Redis), other processes
+    see them when their cached version expires.
+    """
+
+    @staticmethod
+    def cache_key(user_id):
+        return f"users:token-version:{user_id}"
+
+    @classmethod
+    def remember(cls, user_id, version):
+        cache.set(cls.cache_key(user_id), version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+
+    @classmethod
+    def get(cls, user_id):
+        """
+        Return the current token version of a user, None when the user does not exist.
+        """
+        version = cache.get(cls.cache_key(user_id))
+        if version is None:
+            version = (
+                UserRole.objects.filter(pk=user_id, is_active=True)
+                .values_list("token_version", flat=True)
+                .first()
+            )
+            if version is not None:
+                cls.remember(user_id, version)
+        return version
+
+    @classmethod
+    async def aget(cls, user_id):
+        version = await cache.aget(cls.cache_key(user_id))
+        if version is None:
+            version = await (
+                UserRole.objects.filter(pk=user_id, is_active=True)
+                .values_list("token_version", flat=True)
+                .afirst()
+            )
+            if version is not None:
+                await cache.aset(
+                    cls.cache_key(user_id),
+                    version,
+                    settings.TOKEN_VERSION_CACHE_TIMEOUT,
+                )
+        return version
+
+    @classmethod
+    def revoke(cls, user_id):
+        """
+        Invalidate all tokens issued to a user so far.
+
+        The cached version is dropped once the bump is committed, before that it
+        would be cached again from the previous row.
+        """
+        UserRole.objects.filter(pk=user_id).update(token_version=F("token_version") + 1)
+        transaction.on_commit(partial(cache.delete, cls.cache_key(user_id)))
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token with the role claims, copied to the access tokens made from it.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in ROLE_CLAIMS:
+            token[claim] = getattr(user, claim)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        TokenVersions.remember(user.pk, user.token_version)
+        return token
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues `RoleRefreshToken`s, used by `dj_rest_auth` at login.
+    """
+
+    token_class = RoleRefreshToken
+
+
+class TokenUserRole(SimpleLazyObject):
+    """
+    User authenticated by a role token.
+
+    The claims of the token (`pk`, `ROLE_CLAIMS`) are read from the token, any
+    other attribute loads the `UserRole` from the database on first use, e.g.
+    when the user is assigned to a foreign key. Async views must only read the
+    claims.
+    """
+
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: UserRole.objects.get(pk=user_id))
+        # bypasses `LazyObject.__setattr__`, which would load the user
+        self.__dict__["token"] = token
+
+    @property
+    def pk(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    id = pk
+
+    @property
+    def username(self):
+        return self.token["username"]
+
+    @property
+    def first_name(self):
+        return self.token["first_name"]
+
+    @property
+    def last_name(self):
+        return self.token["last_name"]
+
+    @property
+    def role(self):
+        return self.token["role"]
+
+    @property
+    def is_superuser(self):
+        return self.token["is_superuser"]
+
+    def __bool__(self):
+        return True
+
+    def __str__(self):
+        return f"{self.username} - {self.role}"
+
+    def __repr__(self):
+        return f"<TokenUserRole: {self.pk}>"